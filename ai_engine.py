@@ -1,13 +1,26 @@
+import json
 import pandas as pd
 import numpy as np
+import indicators as ind
+from profiler import profiled
+from database import execute_query, execute_batch, fetch_query
 from market_data import get_chart_history
+from scheduler import is_bar_complete
+from indicator_store import refresh_streaming_indicators
 from financial_analysis import get_advanced_fundamental_ratios
+from ratio_engine import F_MIN_AVAILABLE
+from strategies import latest_signals
+from tech_scores import tech_score_series
+from candlestick_patterns import PATTERNS, evidence_score_series
 
 # ============================================================
 # 📚 المحرك المعرفي: مبني على مراجع التحليل الفني والمالي
 # ============================================================
 
-def _analyze_vsa_art_of_trading(df):
+# غيّر الرقم عند أي تعديل في منطق التقييم لإبطال التقارير المحفوظة
+ENGINE_VERSION = "3"
+
+def _analyze_vsa_art_of_trading(df, latest=None):
     """
     تحليل الحجم والمدى (Volume Spread Analysis)
     المصدر: كتاب فن التداول (توم ويليامز)
@@ -23,8 +36,8 @@ def _analyze_vsa_art_of_trading(df):
     prev = df.iloc[-2]
     
     # حساب المتوسطات
-    avg_vol = df['Volume'].rolling(20).mean().iloc[-1]
-    avg_spread = (df['High'] - df['Low']).rolling(20).mean().iloc[-1]
+    avg_vol = latest['Vol_Avg_20'] if latest else ind.volume_avg(df['Volume'], 20).iloc[-1]
+    avg_spread = ind.sma(df['High'] - df['Low'], 20).iloc[-1]
     
     current_spread = curr['High'] - curr['Low']
     current_vol = curr['Volume']
@@ -59,7 +72,7 @@ def _analyze_vsa_art_of_trading(df):
 
     return score, obs
 
-def _analyze_dow_theory_murphy(df):
+def _analyze_dow_theory_murphy(df, latest=None):
     """
     تحليل الاتجاه العام
     المصدر: كتاب جون ميرفي للتحليل الفني
@@ -71,8 +84,8 @@ def _analyze_dow_theory_murphy(df):
     trend_status = "عرضي"
     
     last_close = df['Close'].iloc[-1]
-    sma_50 = df['Close'].rolling(50).mean().iloc[-1]
-    sma_200 = df['Close'].rolling(200).mean().iloc[-1]
+    if latest: sma_50, sma_200 = latest['SMA_50'], latest['SMA_200']
+    else: sma_50, sma_200 = ind.sma(df['Close'], 50).iloc[-1], ind.sma(df['Close'], 200).iloc[-1]
     
     # 1. تحديد الاتجاه الرئيسي (Primary Trend)
     if last_close > sma_200:
@@ -130,22 +143,32 @@ def _detect_candlestick_patterns(df):
         score -= 1
         patterns.append("شمعة الشهاب (Shooting Star) - انعكاسية سلبية")
 
+    # بقية النماذج: تُوزن بأدلتها التاريخية على نفس السهم (بلا نظر للمستقبل)
+    _, weights = evidence_score_series(df)
+    last = weights.iloc[-1]
+    for name, w in last[last != 0].items():
+        score += int(w)
+        patterns.append(f"{PATTERNS[name][2]} - {'إيجابي' if w > 0 else 'سلبي'} بحسب أدلته التاريخية على السهم")
+
     return score, patterns
 
-def _analyze_deep_financials(symbol):
+def _analyze_deep_financials(symbol, price=0, statements=None, snapshot=None):
     """
     التحليل المالي العميق
     المصدر: كتب القوائم المالية (تحليل جودة الأرباح والسيولة)
     """
-    metrics = get_advanced_fundamental_ratios(symbol) # تستدعي دالتك من financial_analysis.py
-    price = metrics.get('Current_Price', 0) # تأكد من تمرير السعر أو جلبه
+    metrics = get_advanced_fundamental_ratios(symbol, statements, snapshot) # تستدعي دالتك من financial_analysis.py
+    price = metrics.get('Current_Price') or price # السعر يُمرَّر من آخر إغلاق
     
     score = 0
     obs = []
     
     # 1. متانة المركز المالي (Piotroski F-Score)
+    # المعايير غير المحسوبة تُعد إخفاقاً، لذا لا يُحكم بالنتيجة إلا مع بيانات كافية
     f_score = metrics.get('Piotroski_Score', 0)
-    if f_score >= 8:
+    if metrics.get('F_Available', 0) < F_MIN_AVAILABLE:
+        if metrics.get('Basis'): obs.append(f"بيانات مالية غير كافية للحكم بـ F-Score ({metrics.get('F_Available', 0)}/9 معايير محسوبة)")
+    elif f_score >= 8:
         score += 3
         obs.append(f"مركز مالي ممتاز جداً (F-Score {f_score}/9)")
     elif f_score <= 3:
@@ -173,24 +196,87 @@ def _analyze_deep_financials(symbol):
     return score, obs, metrics
 
 def _calculate_rsi(df, period=14):
-    delta = df['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).ewm(alpha=1/period, adjust=False).mean()
-    loss = (-delta.where(delta < 0, 0)).ewm(alpha=1/period, adjust=False).mean()
-    rs = gain / loss
-    return 100 - (100 / (1 + rs))
+    return ind.rsi(df['Close'], period)
 
-def generate_ai_report(symbol):
+@profiled()
+def generate_ai_report(symbol, refresh=False):
     """
-    المعالج المركزي: يجمع التحليلات ويصدر التوصية
+    المعالج المركزي: يجمع التحليلات ويصدر التوصية.
+    النتيجة تُحفظ بمفتاح (آخر شمعة، نسخة القوائم المالية، نسخة المحرك)
+    ولا يُعاد الحساب إلا بوصول شمعة أو قائمة مالية جديدة.
+    أثناء الجلسة آخر شمعة جزئية وتتغير، لذا لا يُحفظ التقرير ولا يُقرأ المحفوظ حتى تكتمل.
     """
     # جلب البيانات
     df = get_chart_history(symbol, period='2y')
-    
+    if df is None or df.empty:
+        return build_ai_report(symbol, df)
+
+    last_bar = df.index[-1].strftime('%Y-%m-%d')
+    complete = is_bar_complete(last_bar)
+    fin_version = get_financials_version(symbol) if complete else None
+    if complete and not refresh:
+        cached = load_cached_report(symbol, last_bar, fin_version)
+        if cached: return cached
+
+    report = build_ai_report(symbol, df, latest=refresh_streaming_indicators(symbol, df))
+    report['last_bar'] = last_bar
+    if complete:
+        save_cached_report(symbol, last_bar, fin_version, report)
+        store_score_history(symbol, df)
+    return report
+
+# ==============================
+# 💾 ذاكرة التقارير (AIReports)
+# ==============================
+
+def get_financials_version(symbol):
+    """بصمة القوائم المالية ولقطة EPS/BVPS للسهم (تتغير مع أي إضافة أو تعديل) محسوبة داخل قاعدة البيانات"""
+    df = fetch_query(
+        """SELECT md5(
+               COALESCE((SELECT string_agg(t::text, '|' ORDER BY t.date, t.period_type)
+                         FROM "FinancialStatements" t WHERE t.symbol = %s), '') ||
+               COALESCE((SELECT concat_ws('|', f.eps, f.bvps, f.shares_outstanding, f.dividend_rate,
+                                          f.dividend_yield, f.payout_ratio, f.ex_dividend_date)
+                         FROM FundamentalsSnapshot f WHERE f.symbol = %s), '')) AS v""", (symbol, symbol))
+    return str(df.iloc[0]['v']) if not df.empty else ""
+
+def load_cached_report(symbol, last_bar, fin_version):
+    df = fetch_query(
+        """SELECT report FROM AIReports
+           WHERE symbol = %s AND last_bar = %s AND fin_version = %s AND engine_version = %s""",
+        (symbol, last_bar, fin_version, ENGINE_VERSION))
+    if df.empty: return None
+    try:
+        report = json.loads(df.iloc[0]['report'])
+        report['from_cache'] = True
+        return report
+    except Exception:
+        return None
+
+def save_cached_report(symbol, last_bar, fin_version, report):
+    payload = json.dumps(report, ensure_ascii=False, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+    return execute_query(
+        """INSERT INTO AIReports (symbol, last_bar, fin_version, engine_version, report, created_at)
+           VALUES (%s, %s, %s, %s, %s, NOW())
+           ON CONFLICT (symbol) DO UPDATE SET last_bar=EXCLUDED.last_bar, fin_version=EXCLUDED.fin_version,
+               engine_version=EXCLUDED.engine_version, report=EXCLUDED.report, created_at=EXCLUDED.created_at""",
+        (symbol, last_bar, fin_version, ENGINE_VERSION, payload))
+
+def build_ai_report(symbol, df, statements=None, snapshot=None, latest=None):
+    """
+    بناء التقرير من بيانات جاهزة (يستخدمه الماسح مع بيانات مشتركة محملة مسبقاً)
+    statements: جدول FinancialStatements كاملاً إن كان محملاً، لتفادي إعادة قراءته لكل سهم
+    snapshot: لقطة FundamentalsSnapshot للسهم إن كانت محملة
+    latest: آخر قيم المؤشرات المتدفقة عند آخر شمعة في df (indicator_store)؛ وإلا تُحسب من السلاسل
+    """
+    last_price = float(df['Close'].iloc[-1]) if df is not None and not df.empty else 0
+
     # تشغيل المحركات
-    s_vsa, o_vsa = _analyze_vsa_art_of_trading(df)
-    s_dow, o_dow, trend = _analyze_dow_theory_murphy(df)
+    s_vsa, o_vsa = _analyze_vsa_art_of_trading(df, latest)
+    s_dow, o_dow, trend = _analyze_dow_theory_murphy(df, latest)
     s_can, o_can = _detect_candlestick_patterns(df)
-    s_fun, o_fun, m_fun = _analyze_deep_financials(symbol)
+    s_fun, o_fun, m_fun = _analyze_deep_financials(symbol, last_price, statements, snapshot)
+    signals = latest_signals(df)
     
     # حساب النتيجة النهائية
     tech_score = s_vsa + s_dow + s_can
@@ -225,6 +311,7 @@ def generate_ai_report(symbol):
 
     # تجميع الملاحظات
     tech_reasons = o_dow + o_vsa + o_can
+    tech_reasons += [f"إشارة دخول نشطة حسب استراتيجية {n}" for n, v in signals.items() if v == 1]
     fund_reasons = o_fun
     
     if not tech_reasons: tech_reasons.append("لا توجد أنماط فنية مميزة حالياً")
@@ -236,7 +323,29 @@ def generate_ai_report(symbol):
         "strategy": strategy,
         "tech_score": tech_score,
         "fund_score": fund_score,
+        "total_score": total_score,
         "tech_reasons": tech_reasons,
         "fund_reasons": fund_reasons,
-        "trend": trend
+        "trend": trend,
+        "strategy_signals": signals
     }
+
+# ==============================
+# 📈 سجل النتيجة الفنية (ScoreHistory)
+# ==============================
+
+def store_score_history(symbol, df):
+    """حساب النتيجة الفنية لكل الشموع دفعة واحدة وحفظها (upsert)"""
+    scores = tech_score_series(df)
+    if scores.empty: return False
+    rows = [(symbol, d.strftime('%Y-%m-%d'), int(v), int(w), int(c), int(t))
+            for d, v, w, c, t in zip(scores.index, scores['vsa'], scores['dow'], scores['candles'], scores['tech_score'])]
+    return execute_batch(
+        """INSERT INTO ScoreHistory (symbol, date, vsa, dow, candles, tech_score) VALUES %s
+           ON CONFLICT (symbol, date) DO UPDATE SET vsa=EXCLUDED.vsa, dow=EXCLUDED.dow,
+               candles=EXCLUDED.candles, tech_score=EXCLUDED.tech_score""", rows)
+
+def load_score_history(symbol):
+    df = fetch_query("SELECT date, vsa, dow, candles, tech_score FROM ScoreHistory WHERE symbol = %s ORDER BY date", (symbol,))
+    if not df.empty: df = df.set_index(pd.to_datetime(df['date'])).drop(columns='date')
+    return df
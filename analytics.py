@@ -1,16 +1,20 @@
 import pandas as pd
 import numpy as np
-from database import fetch_table, execute_query
+from database import fetch_user_table, execute_query, current_user
 from market_data import fetch_batch_data
 import streamlit as st
+from profiler import profiled, mark_cache_miss
 
 # دالة مساعدة لتنظيف الأرقام
 def _clean_num(df, col):
     if col not in df.columns: df[col] = 0.0
     df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
 
+@profiled(cache=True)
 @st.cache_data(ttl=60)
-def calculate_portfolio_metrics():
+def calculate_portfolio_metrics(username):
+    """مؤشرات محفظة مستخدم واحد؛ اسم المستخدم جزء من مفتاح الكاش فلا تختلط المحافظ"""
+    mark_cache_miss()
     default_res = {
         "cost_open": 0.0, "market_val_open": 0.0, "cash": 0.0,
         "unrealized_pl": 0.0, "realized_pl": 0.0,
@@ -20,10 +24,10 @@ def calculate_portfolio_metrics():
     }
     
     try:
-        trades = fetch_table("Trades")
-        dep = fetch_table("Deposits")
-        wit = fetch_table("Withdrawals")
-        ret = fetch_table("ReturnsGrants")
+        trades = fetch_user_table("Trades", username)
+        dep = fetch_user_table("Deposits", username)
+        wit = fetch_user_table("Withdrawals", username)
+        ret = fetch_user_table("ReturnsGrants", username)
         
         for df in [dep, wit, ret]: _clean_num(df, 'amount')
             
@@ -103,9 +107,11 @@ def calculate_portfolio_metrics():
         st.error(f"خطأ في الحسابات: {e}")
         return default_res
 
-def update_prices():
+@profiled()
+def update_prices(username=None):
+    username = username or current_user()
     try:
-        df = fetch_table("Trades")
+        df = fetch_user_table("Trades", username)
         if df.empty: return True
         
         if 'asset_type' in df.columns:
@@ -123,13 +129,13 @@ def update_prices():
                 price = float(data.get('price', 0))
                 if price > 0:
                     execute_query(
-                        "UPDATE Trades SET current_price = %s WHERE symbol = %s AND status = 'Open'",
-                        (price, sym)
+                        "UPDATE Trades SET current_price = %s WHERE owner = %s AND symbol = %s AND status = 'Open'",
+                        (price, username, sym)
                     )
             except:
                 continue # لو فشل سهم، انتقل للتالي
         
-        st.cache_data.clear()
+        calculate_portfolio_metrics.clear(username)   # كاش هذا المستخدم فقط
         return True
     except Exception as e:
         st.error(f"فشل التحديث: {e}")
@@ -147,13 +153,16 @@ def generate_equity_curve(df):
         return pd.DataFrame()
 
 # ربطنا الدالة بنظام النسخ الاحتياطي الجديد
-def create_smart_backup():
+def create_smart_backup(fmt='zip'):
+    """fmt='zip': أرشيف CSV متدفق على القرص (يرجع المسار والاسم)، 'excel': ملف Excel في الذاكرة"""
     try:
-        from backup_system import generate_full_backup
-        return generate_full_backup()
+        from backup_system import generate_full_backup, generate_streaming_backup
+        if fmt == 'excel': return generate_full_backup()
+        path, _ = generate_streaming_backup()
+        return path, path.name
     except Exception as e:
         st.error(f"فشل النسخ الاحتياطي: {e}")
-        return None
+        return None, None
 
 def calculate_historical_drawdown(df):
     return pd.DataFrame()
@@ -1,28 +1,23 @@
 import pandas as pd
 import numpy as np
+import indicators as ind
+from strategies import get_strategy
 
 COMMISSION = 0.00155 
 
 def calculate_indicators(df):
     df = df.copy()
-    df['SMA_20'] = df['Close'].rolling(20).mean(); df['SMA_50'] = df['Close'].rolling(50).mean()
-    delta = df['Close'].diff()
-    avg_gain = delta.where(delta>0, 0).ewm(alpha=1/14, adjust=False).mean()
-    avg_loss = (-delta.where(delta<0, 0)).ewm(alpha=1/14, adjust=False).mean()
-    df['RSI'] = 100 - (100 / (1 + avg_gain/avg_loss))
+    df['SMA_20'] = ind.sma(df['Close'], 20); df['SMA_50'] = ind.sma(df['Close'], 50)
+    df['RSI'] = ind.rsi(df['Close'], 14)
     df['RSI'] = df['RSI'].fillna(50); df.dropna(inplace=True)
     return df
 
 def run_backtest(df, strategy, capital=100000):
     if df is None or len(df) < 60: return None
-    df = calculate_indicators(df); df['Signal'] = 0
-    
-    if 'Trend' in strategy:
-        df.loc[(df['Close']>df['SMA_50'])&(df['RSI']>50), 'Signal'] = 1
-        df.loc[df['Close']<df['SMA_50'], 'Signal'] = -1
-    elif 'Sniper' in strategy:
-        df.loc[(df['Close']>df['SMA_20'])&(df['Close'].shift(1)<=df['SMA_20'].shift(1)), 'Signal'] = 1
-        df.loc[df['Close']<df['SMA_20'], 'Signal'] = -1
+    strat = get_strategy(strategy)
+    signals = strat.signals(df) if strat else None
+    df = calculate_indicators(df)
+    df['Signal'] = signals.reindex(df.index).fillna(0).astype(int) if signals is not None else 0
 
     cash = float(capital); shares = 0; log = []; hist = []
     
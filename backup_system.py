@@ -1,25 +1,124 @@
 import pandas as pd
 import io
+import os
+import json
+import re
+import hashlib
+import zipfile
 from datetime import datetime
-from database import fetch_table
+from config import BACKUP_DIR, BACKUP_KEEP
+from database import fetch_table, fetch_user_table, get_db, current_user, USER_TABLES
 import streamlit as st
 
+# قائمة الجداول المراد حفظها
+BACKUP_TABLES = {
+    "Trades": "صفقات",
+    "Deposits": "إيداعات",
+    "Withdrawals": "سحوبات",
+    "ReturnsGrants": "عوائد",
+    "Watchlist": "مراقبة",
+    "FinancialStatements": "قوائم_مالية",
+    "InvestmentThesis": "أطروحات"
+}
+
+# ============================================================
+# 🗜️ النسخة المتدفقة (ZIP من ملفات CSV)
+# كل جدول يُنسخ بـ COPY ... TO STDOUT مباشرة إلى ملف مضغوط داخل الأرشيف
+# على القرص، دون تحميل الجدول في الذاكرة، مع manifest.json (عدد الصفوف
+# والحجم و sha256 لكل ملف) للتحقق عند الاستعادة.
+# الكتابة إلى ملف .part ثم إعادة التسمية بعد التحقق: لا يبقى أرشيف ناقص باسم نهائي
+# ============================================================
+
+class _HashingWriter:
+    """يمرر البيانات إلى الملف الهدف ويحسب sha256 والحجم أثناء الكتابة"""
+
+    def __init__(self, target):
+        self.target, self.sha, self.size = target, hashlib.sha256(), 0
+
+    def write(self, data):
+        if isinstance(data, str): data = data.encode('utf-8')
+        self.sha.update(data); self.size += len(data)
+        return self.target.write(data)
+
+def _table_ref(cur, name):
+    """اسم الجدول كما أُنشئ: بين علامتي تنصيص (حالة الأحرف محفوظة) أو بأحرف صغيرة"""
+    cur.execute("SELECT to_regclass(%s), to_regclass(%s)", (f'"{name}"', name.lower()))
+    quoted, lower = cur.fetchone()
+    return f'"{name}"' if quoted else (name.lower() if lower else None)
+
+def _backup_pattern(safe_user):
+    """أرشيفات هذا المستخدم فقط (لا تطابق مستخدماً آخر يبدأ اسمه بنفس الحروف)"""
+    return re.compile(rf"Osoli_Backup_{re.escape(safe_user)}_\d{{4}}-\d\d-\d\d_\d\d-\d\d-\d\d\.zip")
+
+def prune_backups(safe_user, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    """يحذف أقدم أرشيفات المستخدم ويبقي آخر keep (الطابع الزمني في الاسم يُرتب أبجدياً)"""
+    pattern = _backup_pattern(safe_user)
+    own = sorted(p for p in backup_dir.glob("Osoli_Backup_*.zip") if pattern.fullmatch(p.name))
+    keep = max(keep, 1)   # الأرشيف الجديد لا يُحذف أبداً
+    for old in own[:-keep]: old.unlink(missing_ok=True)
+    return own[-keep:]
+
+def generate_streaming_backup(username=None, tables=BACKUP_TABLES, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    """يكتب الأرشيف في BACKUP_DIR ويتحقق منه ويرجع (المسار، manifest). جداول المحفظة: صفوف المستخدم فقط"""
+    username = username or current_user()
+    stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    safe_user = re.sub(r'[^\w-]', '_', str(username))   # اسم المستخدم جزء من اسم الملف
+    path = backup_dir / f"Osoli_Backup_{safe_user}_{stamp}.zip"
+    part = path.with_name(path.name + ".part")
+    manifest = {'created_at': datetime.now().isoformat(timespec='seconds'), 'owner': username, 'format': 'csv', 'tables': []}
+
+    with get_db() as conn:
+        if not conn: raise RuntimeError("لا يوجد اتصال بقاعدة البيانات")
+        try:
+            with conn.cursor() as cur, zipfile.ZipFile(part, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                for table in tables:
+                    ref = _table_ref(cur, table)
+                    if ref is None: continue
+                    select = (cur.mogrify(f"SELECT * FROM {ref} WHERE owner = %s", (username,)).decode()
+                              if table in USER_TABLES else f"SELECT * FROM {ref}")
+                    name = f"{table}.csv"
+                    with zf.open(name, 'w', force_zip64=True) as entry:
+                        out = _HashingWriter(entry)
+                        cur.copy_expert(f"COPY ({select}) TO STDOUT WITH CSV HEADER", out)
+                    manifest['tables'].append({'table': table, 'file': name, 'rows': cur.rowcount,
+                                               'bytes': out.size, 'sha256': out.sha.hexdigest()})
+                zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+            bad = verify_backup(part)
+            if bad: raise RuntimeError(f"فشل التحقق من الأرشيف: {', '.join(bad)}")
+            os.replace(part, path)
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+        finally:
+            conn.rollback()   # قراءة فقط
+    prune_backups(safe_user, backup_dir, keep)
+    return path, manifest
+
+def verify_backup(path):
+    """يعيد حساب sha256 لكل ملف في الأرشيف ويقارنه بالـ manifest. يرجع قائمة الملفات التالفة أو الناقصة"""
+    bad = []
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        for t in manifest['tables']:
+            sha = hashlib.sha256()
+            try:
+                with zf.open(t['file']) as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''): sha.update(chunk)
+            except KeyError:
+                bad.append(t['file']); continue
+            if sha.hexdigest() != t['sha256']: bad.append(t['file'])
+    return bad
+
+# ============================================================
+# 📗 تصدير Excel (اختياري): مناسب للقراءة، محدود بعدد صفوف الورقة
+# ============================================================
+
 def generate_full_backup():
     """
     يقوم بإنشاء ملف Excel يحتوي على كافة بيانات النظام
     """
     output = io.BytesIO()
-    
-    # قائمة الجداول المراد حفظها
-    tables = {
-        "Trades": "صفقات",
-        "Deposits": "إيداعات",
-        "Withdrawals": "سحوبات",
-        "ReturnsGrants": "عوائد",
-        "Watchlist": "مراقبة",
-        "FinancialStatements": "قوائم_مالية",
-        "InvestmentThesis": "أطروحات"
-    }
+    tables = BACKUP_TABLES
     
     try:
         # إنشاء ملف Excel في الذاكرة
@@ -27,7 +126,8 @@ def generate_full_backup():
             data_found = False
             
             for table_name, sheet_name in tables.items():
-                df = fetch_table(table_name)
+                # جداول المحفظة: صفوف المستخدم الحالي فقط
+                df = fetch_user_table(table_name) if table_name in USER_TABLES else fetch_table(table_name)
                 if not df.empty:
                     # تحويل التواريخ لنص لضمان التنسيق
                     for col in df.columns:
@@ -0,0 +1,103 @@
+import time
+import random
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from data_source import TADAWUL_DB
+from financial_analysis import fetch_yahoo_statements, save_financial_records
+
+# ============================================================
+# 🔄 المزامنة الجماعية للقوائم المالية
+# جلب متوازٍ تحت حد معدل عام (token bucket) مع إعادة المحاولة
+# بتأخير متصاعد، والحفظ على دفعات بدل سجل بسجل
+# ============================================================
+
+SCOPES = {'holdings': 'الأسهم المملوكة', 'watchlist': 'قائمة المراقبة', 'all': 'كامل السوق'}
+
+class TokenBucket:
+    """حد معدل مشترك بين الخيوط: rate طلب/ثانية مع سماح بدفعة حتى capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def with_retry(fn, retries=3, base_delay=2.0, max_delay=30.0):
+    """تنفيذ fn مع إعادة المحاولة بتأخير متصاعد (2، 4، 8...) وعشوائية بسيطة. يرجع (النتيجة، عدد المحاولات)"""
+    for attempt in range(1, retries + 2):
+        try:
+            return fn(), attempt
+        except Exception:
+            if attempt > retries: raise
+            time.sleep(min(max_delay, base_delay * 2 ** (attempt - 1)) * (1 + random.random() * 0.25))
+
+def scope_symbols(scope):
+    if scope == 'all': return sorted(TADAWUL_DB)
+    from database import current_user
+    from scheduler import portfolio_symbols
+    held, watch = portfolio_symbols(current_user())
+    return held if scope == 'holdings' else watch
+
+def bulk_sync_financials(symbols, rate_per_sec=2.0, max_workers=6, retries=3, flush_every=25, progress_cb=None):
+    """
+    مزامنة قائمة رموز من Yahoo. كل إطار قائمة (6 لكل سهم) يستهلك رمزاً من الحد العام.
+    progress_cb(done, total, symbol) تُستدعى من الخيط الرئيسي.
+    يرجع DataFrame بنتيجة كل سهم: الحالة، السجلات، المحاولات، الزمن، الخطأ.
+    """
+    bucket = TokenBucket(rate_per_sec)
+
+    def _one(sym):
+        t0 = time.perf_counter()
+        try:
+            records, attempts = with_retry(lambda: fetch_yahoo_statements(sym, throttle=bucket.acquire), retries)
+            return sym, records, attempts, time.perf_counter() - t0, None
+        except Exception as e:
+            return sym, [], retries + 1, time.perf_counter() - t0, str(e)
+
+    report, buffer, buffered_syms = [], [], []
+
+    def _flush():
+        if not buffer: return []
+        ok = save_financial_records(buffer) > 0   # السجلات الصفرية مستبعدة مسبقاً، فالصفر هنا فشل
+        if not ok:
+            for row in report:
+                if row['symbol'] in buffered_syms: row['status'], row['error'] = 'error', 'فشل الحفظ في قاعدة البيانات'
+        synced = list(buffered_syms) if ok else []
+        buffer.clear(); buffered_syms.clear()
+        return synced
+
+    synced = []
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = [ex.submit(_one, s) for s in symbols]
+        for i, fut in enumerate(as_completed(futures), 1):
+            sym, records, attempts, elapsed, err = fut.result()
+            status = 'error' if err else ('synced' if records else 'empty')
+            report.append({'symbol': sym, 'name': TADAWUL_DB.get(sym, {}).get('name', sym), 'status': status,
+                           'records': len(records), 'attempts': attempts, 'seconds': round(elapsed, 2), 'error': err or ''})
+            if records:
+                buffer.extend(records); buffered_syms.append(sym)
+            if len(buffered_syms) >= flush_every: synced += _flush()
+            if progress_cb: progress_cb(i, len(symbols), sym)
+    synced += _flush()
+
+    # لوحة النسب لكل الأسهم المحدثة في تمريرة واحدة، ثم إبطال المخرجات المالية وجدولة إعادة حسابها
+    from ratio_engine import refresh_ratio_panel
+    from scheduler import notify_financials_changed
+    if synced: refresh_ratio_panel(synced)
+    for sym in synced: notify_financials_changed(sym)
+
+    return pd.DataFrame(report, columns=['symbol', 'name', 'status', 'records', 'attempts', 'seconds', 'error'])
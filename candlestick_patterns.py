@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# 🕯️ مكتبة النماذج اليابانية (مصفوفات منطقية لكامل التاريخ)
+# كل نموذج دالة على (O, H, L, C): تعمل على Series لسهم واحد
+# أو على DataFrame (تواريخ × رموز) لكامل السوق بنفس الكود
+# ============================================================
+
+def _parts(o, h, l, c):
+    body = (c - o).abs()
+    rng = h - l
+    upper = h - np.maximum(c, o)
+    lower = np.minimum(c, o) - l
+    return body, rng, upper, lower
+
+def doji(o, h, l, c):
+    body, rng, _, _ = _parts(o, h, l, c)
+    return (rng > 0) & (body <= rng * 0.1)
+
+def hammer(o, h, l, c):
+    body, _, upper, lower = _parts(o, h, l, c)
+    return (lower > body * 2) & (upper < body * 0.5)
+
+def shooting_star(o, h, l, c):
+    body, _, upper, lower = _parts(o, h, l, c)
+    return (upper > body * 2) & (lower < body * 0.5)
+
+def bullish_engulfing(o, h, l, c):
+    po, pc = o.shift(1), c.shift(1)
+    return (c > o) & (pc < po) & (c > po) & (o < pc)
+
+def bearish_engulfing(o, h, l, c):
+    po, pc = o.shift(1), c.shift(1)
+    return (c < o) & (pc > po) & (o > pc) & (c < po)
+
+def bullish_harami(o, h, l, c):
+    po, pc = o.shift(1), c.shift(1)
+    return (pc < po) & (c > o) & (o > pc) & (c < po)
+
+def bearish_harami(o, h, l, c):
+    po, pc = o.shift(1), c.shift(1)
+    return (pc > po) & (c < o) & (o < pc) & (c > po)
+
+def piercing_line(o, h, l, c):
+    po, pc = o.shift(1), c.shift(1)
+    return (pc < po) & (c > o) & (o < pc) & (c > (po + pc) / 2) & (c < po)
+
+def dark_cloud_cover(o, h, l, c):
+    po, pc = o.shift(1), c.shift(1)
+    return (pc > po) & (c < o) & (o > pc) & (c < (po + pc) / 2) & (c > po)
+
+def _star_legs(o, h, l, c):
+    body, rng, _, _ = _parts(o, h, l, c)
+    o2, c2, body2, rng2 = o.shift(2), c.shift(2), body.shift(2), rng.shift(2)
+    small_middle = body.shift(1) < body2 * 0.3
+    long_first = body2 > rng2 * 0.5
+    return o2, c2, long_first & small_middle
+
+def morning_star(o, h, l, c):
+    o2, c2, legs = _star_legs(o, h, l, c)
+    return legs & (c2 < o2) & (c > o) & (c > (o2 + c2) / 2)
+
+def evening_star(o, h, l, c):
+    o2, c2, legs = _star_legs(o, h, l, c)
+    return legs & (c2 > o2) & (c < o) & (c < (o2 + c2) / 2)
+
+def _three_in_row(o, c, up):
+    ok = None
+    for k in range(3):
+        ok_k = (c.shift(k) > o.shift(k)) if up else (c.shift(k) < o.shift(k))
+        ok = ok_k if ok is None else ok & ok_k
+    for k in range(2):
+        co, pc, po = o.shift(k), c.shift(k + 1), o.shift(k + 1)
+        step = (c.shift(k) > pc) if up else (c.shift(k) < pc)
+        inside = ((co > po) & (co < pc)) if up else ((co < po) & (co > pc))
+        ok = ok & step & inside
+    return ok
+
+def three_white_soldiers(o, h, l, c):
+    return _three_in_row(o, c, up=True)
+
+def three_black_crows(o, h, l, c):
+    return _three_in_row(o, c, up=False)
+
+# الاسم: (الدالة، الاتجاه المتوقع +1 صاعد / -1 هابط / 0 حيادي، الوصف)
+PATTERNS = {
+    'doji': (doji, 0, "دوجي (تردد)"),
+    'hammer': (hammer, 1, "المطرقة"),
+    'shooting_star': (shooting_star, -1, "الشهاب"),
+    'bullish_engulfing': (bullish_engulfing, 1, "الابتلاع الشرائي"),
+    'bearish_engulfing': (bearish_engulfing, -1, "الابتلاع البيعي"),
+    'bullish_harami': (bullish_harami, 1, "الهارامي الشرائي"),
+    'bearish_harami': (bearish_harami, -1, "الهارامي البيعي"),
+    'piercing_line': (piercing_line, 1, "الخط الثاقب"),
+    'dark_cloud_cover': (dark_cloud_cover, -1, "الغيمة السوداء"),
+    'morning_star': (morning_star, 1, "نجمة الصباح"),
+    'evening_star': (evening_star, -1, "نجمة المساء"),
+    'three_white_soldiers': (three_white_soldiers, 1, "الجنود الثلاثة البيض"),
+    'three_black_crows': (three_black_crows, -1, "الغربان الثلاثة السود"),
+}
+
+# النماذج ذات الأوزان الثابتة في المحرك؛ البقية توزن بأدلتها التاريخية
+FIXED_WEIGHT_PATTERNS = ('hammer', 'bullish_engulfing', 'shooting_star')
+
+# ==============================
+# 🔎 المسح
+# ==============================
+
+def detect_patterns(df):
+    """DataFrame منطقي: عمود لكل نموذج وصف لكل شمعة"""
+    o, h, l, c = df['Open'], df['High'], df['Low'], df['Close']
+    return pd.DataFrame({name: fn(o, h, l, c).fillna(False).astype(bool) for name, (fn, _, _) in PATTERNS.items()}, index=df.index)
+
+def detect_patterns_panel(panels):
+    """لكامل السوق: {النموذج: DataFrame منطقي (تواريخ × رموز)} من لوحات get_price_panel"""
+    o, h, l, c = (panels[f] for f in ['Open', 'High', 'Low', 'Close'])
+    return {name: fn(o, h, l, c).fillna(False).astype(bool) for name, (fn, _, _) in PATTERNS.items()}
+
+# ==============================
+# 📊 الأدلة التاريخية (العوائد اللاحقة)
+# ==============================
+
+def forward_returns(close, horizon):
+    return close.shift(-horizon) / close - 1
+
+def pattern_forward_stats(df=None, panels=None, horizons=(1, 5, 10)):
+    """
+    إحصاءات العائد بعد كل نموذج: عدد المرات، متوسط العائد، نسبة النجاح (في اتجاه النموذج)، وإحصاء t.
+    تعمل على سهم واحد (df) أو على كامل السوق (panels) بتجميع كل الرموز.
+    """
+    if panels is not None:
+        close, hits = panels['Close'], detect_patterns_panel(panels)
+    else:
+        close, hits = df['Close'], detect_patterns(df)
+        hits = {k: hits[k] for k in hits.columns}
+
+    rows = []
+    for h in horizons:
+        fwd = np.asarray(forward_returns(close, h), dtype=float)
+        for name, (_, direction, label) in PATTERNS.items():
+            mask = np.asarray(hits[name], dtype=bool) & ~np.isnan(fwd)
+            r = fwd[mask]
+            n = r.size
+            mean = r.mean() if n else np.nan
+            std = r.std(ddof=1) if n > 1 else np.nan
+            sign = direction if direction else 1
+            rows.append({
+                'pattern': name, 'label': label, 'direction': direction, 'horizon': h, 'count': n,
+                'mean_return_pct': mean * 100 if n else np.nan,
+                'hit_rate_pct': (np.mean(r * sign > 0) * 100) if n else np.nan,
+                't_stat': (mean / (std / np.sqrt(n))) if n > 1 and std > 0 else np.nan,
+            })
+    return pd.DataFrame(rows)
+
+def evidence_score_series(df, horizon=5, min_count=8, t_threshold=2.0, exclude=FIXED_WEIGHT_PATTERNS):
+    """
+    وزن النماذج بالأدلة دون النظر للمستقبل: عند كل شمعة تُستخدم فقط الحالات السابقة
+    التي اكتمل عائدها اللاحق (قبل horizon شمعة). النموذج يضيف +1/-1 حسب إشارة متوسط
+    عائده التاريخي إذا تكرر min_count مرة على الأقل وكان |t| ≥ t_threshold.
+    يرجع (النتيجة لكل شمعة، DataFrame بأوزان كل نموذج).
+    """
+    hits = detect_patterns(df)
+    fwd = forward_returns(df['Close'], horizon)
+    weights = {}
+    for name in PATTERNS:
+        if name in exclude: continue
+        m = hits[name] & fwd.notna()
+        x = fwd.where(m, 0.0)
+        n = m.astype(float).cumsum().shift(horizon)
+        s1 = x.cumsum().shift(horizon)
+        s2 = (x * x).cumsum().shift(horizon)
+        mean = s1 / n
+        var = (s2 - n * mean * mean) / (n - 1)
+        t = mean / np.sqrt(var / n)
+        strong = (n >= min_count) & (t.abs() >= t_threshold)
+        weights[name] = np.where(hits[name] & strong, np.sign(mean), 0).astype(int)
+    w = pd.DataFrame(weights, index=df.index)
+    return w.sum(axis=1).astype('int64'), w
@@ -4,41 +4,45 @@ from plotly.subplots import make_subplots
 import numpy as np
 import pandas as pd
 from market_data import get_chart_history
+from indicator_store import refresh_streaming_indicators
+import indicators as ind
+from profiler import profiled
 
-def render_technical_chart(symbol, period='2y', interval='1d'):
+@profiled()
+def build_technical_view(symbol, period='2y', interval='1d'):
+    """الرسم والقيم الأخيرة للتحليل الفني (بدون عرض)؛ None إذا كانت البيانات غير كافية"""
     df = get_chart_history(symbol, period, interval)
-    if df is None or len(df) < 50: 
-        st.warning("البيانات التاريخية غير كافية للتحليل الفني الدقيق.")
-        return
+    if df is None or len(df) < 50: return None
+    # القيم الأخيرة من الحالة المتدفقة المحفوظة (شموع يومية)؛ السلاسل أدناه للرسم فقط
+    latest = refresh_streaming_indicators(symbol, df) if (period, interval) == ('2y', '1d') else None
 
     # 1. المؤشرات الفنية (Technical Indicators)
     # SMA 50 & 200 (لتحديد الاتجاه العام والتقاطعات الذهبية)
-    df['SMA_50'] = df['Close'].rolling(window=50).mean()
-    df['SMA_200'] = df['Close'].rolling(window=200).mean()
+    df['SMA_50'] = ind.sma(df['Close'], 50)
+    df['SMA_200'] = ind.sma(df['Close'], 200)
     
     # Bollinger Bands (لقياس التذبذب)
-    df['STD_20'] = df['Close'].rolling(20).std()
-    df['BB_Upper'] = df.rolling(20)['Close'].mean() + (df['STD_20'] * 2)
-    df['BB_Lower'] = df.rolling(20)['Close'].mean() - (df['STD_20'] * 2)
+    bb = ind.bollinger(df['Close'], 20, 2)
+    df['STD_20'] = bb['STD']
+    df['BB_Upper'] = bb['Upper']
+    df['BB_Lower'] = bb['Lower']
     
     # RSI (الزخم)
-    delta = df['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).ewm(alpha=1/14, adjust=False).mean()
-    loss = (-delta.where(delta < 0, 0)).ewm(alpha=1/14, adjust=False).mean()
-    rs = gain / loss
-    df['RSI'] = 100 - (100 / (1 + rs))
+    df['RSI'] = ind.rsi(df['Close'], 14)
 
     # MACD
-    exp12 = df['Close'].ewm(span=12, adjust=False).mean()
-    exp26 = df['Close'].ewm(span=26, adjust=False).mean()
-    df['MACD'] = exp12 - exp26
-    df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()
+    m = ind.macd(df['Close'], 12, 26, 9)
+    df['MACD'] = m['MACD']
+    df['Signal_Line'] = m['Signal']
     
     # 2. المنطق التحليلي (Interpreted Logic)
     last_close = df['Close'].iloc[-1]
-    last_sma50 = df['SMA_50'].iloc[-1]
-    last_sma200 = df['SMA_200'].iloc[-1]
-    last_rsi = df['RSI'].iloc[-1]
+    if latest:
+        last_sma50, last_sma200, last_rsi = latest['SMA_50'], latest['SMA_200'], latest['RSI']
+        bb_width = (latest['BB_Upper'] - latest['BB_Lower']) / last_sma200
+    else:
+        last_sma50, last_sma200, last_rsi = df['SMA_50'].iloc[-1], df['SMA_200'].iloc[-1], df['RSI'].iloc[-1]
+        bb_width = (df['BB_Upper'].iloc[-1] - df['BB_Lower'].iloc[-1]) / last_sma200
     
     trend_status = "صاعد 🐂" if last_close > last_sma200 else "هابط 🐻"
     cross_status = "تقاطع ذهبي ✨" if last_sma50 > last_sma200 else "تقاطع موت 💀"
@@ -71,7 +75,17 @@ def render_technical_chart(symbol, period='2y', interval='1d'):
     fig.add_trace(go.Scatter(x=df.index, y=df['Signal_Line'], name='Signal'), row=3, col=1)
 
     fig.update_layout(height=800, xaxis_rangeslider_visible=False, showlegend=True)
-    st.plotly_chart(fig, use_container_width=True)
+    return {'fig': fig, 'last_close': last_close, 'last_sma50': last_sma50, 'last_sma200': last_sma200,
+            'last_rsi': last_rsi, 'bb_width': bb_width}
+
+@profiled('render')
+def render_technical_chart(symbol, period='2y', interval='1d', view=None):
+    view = view or build_technical_view(symbol, period, interval)
+    if view is None: 
+        st.warning("البيانات التاريخية غير كافية للتحليل الفني الدقيق.")
+        return
+    last_close, last_sma50, last_sma200, last_rsi = view['last_close'], view['last_sma50'], view['last_sma200'], view['last_rsi']
+    st.plotly_chart(view['fig'], use_container_width=True)
 
     # 3. التحليل النصي (جون ميرفي ستايل)
     st.markdown("#### 🔭 رؤية فنية (جون ميرفي):")
@@ -101,8 +115,7 @@ def render_technical_chart(symbol, period='2y', interval='1d'):
     # تحليل التذبذب
     with cols[2]:
         st.write("**التذبذب (Bollinger):**")
-        bb_width = (df['BB_Upper'].iloc[-1] - df['BB_Lower'].iloc[-1]) / df['SMA_200'].iloc[-1]
-        if bb_width < 0.10: # رقم تقريبي
+        if view['bb_width'] < 0.10: # رقم تقريبي
             st.info("انحسار سعري (Squeeze): توقع حركة قوية قادمة.")
         else:
             st.write("تذبذب طبيعي.")
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from market_data import get_chart_history
+from scheduler import get_artifact, is_bar_complete
+from profiler import profiled
 
 def calculate_fibonacci_levels(df):
     """حساب مستويات فيبوناتشي بناءً على آخر قمة وقاع رئيسيين"""
@@ -19,27 +20,39 @@ def calculate_fibonacci_levels(df):
     }
     return levels, max_price, min_price
 
-def render_classical_analysis(symbol):
+def compute_classical_levels(df):
+    """
+    مستويات التحليل الكلاسيكي كقاموس قابل للحفظ.
+    نقاط الارتكاز تُحسب من آخر شمعة مكتملة: شمعة اليوم بعد الإغلاق، وشمعة أمس أثناء الجلسة.
+    """
+    if df is None or len(df) < 20: return None
+
+    pivot_candle = df.iloc[-1] if is_bar_complete(df.index[-1]) else df.iloc[-2]
+    H, L, C = float(pivot_candle['High']), float(pivot_candle['Low']), float(pivot_candle['Close'])
+    PP = (H + L + C) / 3
+    fibs, high_6m, low_6m = calculate_fibonacci_levels(df)
+    return {
+        'last_bar': df.index[-1].strftime('%Y-%m-%d'),
+        'price': float(df['Close'].iloc[-1]),
+        'PP': PP, 'R1': (2 * PP) - L, 'S1': (2 * PP) - H, 'R2': PP + (H - L), 'S2': PP - (H - L),
+        'fibs': {k: float(v) for k, v in fibs.items()},
+        'high_6m': float(high_6m), 'low_6m': float(low_6m),
+    }
+
+@profiled('render')
+def render_classical_analysis(symbol, levels=None):
     st.markdown("### 🏛️ التحليل الكلاسيكي (Price Action & Fibonacci)")
     
-    df = get_chart_history(symbol, period="6mo", interval="1d")
-    if df is None or len(df) < 20: 
+    # المستويات محسوبة مسبقاً بالجدولة الخلفية بعد الإغلاق
+    lv = levels or get_artifact(symbol, 'classical')
+    if not lv: 
         st.warning("بيانات غير كافية للتحليل الكلاسيكي")
         return
 
-    curr_price = df['Close'].iloc[-1]
-    
-    # 1. حساب النقاط المحورية (Pivot Points - Standard)
-    last_candle = df.iloc[-2] # شمعة أمس
-    H, L, C = last_candle['High'], last_candle['Low'], last_candle['Close']
-    PP = (H + L + C) / 3
-    R1 = (2 * PP) - L
-    S1 = (2 * PP) - H
-    R2 = PP + (H - L)
-    S2 = PP - (H - L)
-
-    # 2. فيبوناتشي
-    fibs, high_6m, low_6m = calculate_fibonacci_levels(df)
+    curr_price = lv['price']
+    PP, R1, S1, R2, S2 = lv['PP'], lv['R1'], lv['S1'], lv['R2'], lv['S2']
+    fibs, high_6m, low_6m = lv['fibs'], lv['high_6m'], lv['low_6m']
+    st.caption(f"آخر شمعة: {lv['last_bar']}")
 
     c1, c2 = st.columns(2)
     
@@ -1,6 +1,26 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import html
+from profiler import profiled
+
+SESSION_RESULTS_MAX = 60
+
+def session_result(key, compute, refresh=False):
+    """
+    نتيجة محسوبة محفوظة في الجلسة بمفتاح (السهم، القسم، ...) حتى لا يعاد حسابها عند التنقل بين الأقسام.
+    الأقدم يُحذف عند تجاوز SESSION_RESULTS_MAX.
+    """
+    cache = st.session_state.setdefault('session_results', {})
+    if refresh or key not in cache:
+        cache.pop(key, None)
+        cache[key] = compute()
+        while len(cache) > SESSION_RESULTS_MAX: cache.pop(next(iter(cache)))
+    return cache[key]
+
+def invalidate_session_results(symbol):
+    cache = st.session_state.get('session_results', {})
+    for k in [k for k in cache if k[0] == symbol]: cache.pop(k)
 
 def safe_fmt(val, suffix=""):
     try:
@@ -22,9 +42,11 @@ def render_kpi(label, value, color_class="neutral", icon="📊"):
     </div>
     """, unsafe_allow_html=True)
 
-def render_ticker_card(symbol, name, price, change):
+def ticker_card_html(symbol, name, price, change, moved=0):
+    """moved: +1/-1 إذا تغير السعر منذ آخر تحديث (إطار أخضر/أحمر)، 0 بدون إبراز"""
     col = "#059669" if change >= 0 else "#DC2626"
     bg = "#DCFCE7" if change >= 0 else "#FEE2E2"
+    flash = {1: " ticker-up", -1: " ticker-down"}.get(moved, "")
     
     try: price_disp = f"{float(price):,.2f}"
     except: price_disp = "-"
@@ -32,82 +54,80 @@ def render_ticker_card(symbol, name, price, change):
     try: change_disp = f"{float(change):+.2f}%"
     except: change_disp = "0.00%"
     
-    st.markdown(f"""
-    <div class="kpi-card" style="padding:15px;min-height:120px;">
+    return f"""
+    <div class="kpi-card{flash}" style="padding:15px;min-height:120px;">
         <div style="display:flex;justify-content:space-between;margin-bottom:10px;">
-            <div style="font-weight:900;color:#1E293B;">{symbol}</div>
+            <div style="font-weight:900;color:#1E293B;">{html.escape(str(symbol))}</div>
             <div style="direction:ltr;color:{col};background:{bg};padding:2px 8px;border-radius:8px;font-weight:800;font-size:0.8rem;">
                 {change_disp}
             </div>
         </div>
         <div style="font-size:1.5rem;font-weight:900;color:#0F172A;">{price_disp}</div>
-        <div style="color:#94A3B8;font-size:0.75rem;font-weight:600;">{name}</div>
+        <div style="color:#94A3B8;font-size:0.75rem;font-weight:600;">{html.escape(str(name))}</div>
     </div>
-    """, unsafe_allow_html=True)
+    """
+
+def render_ticker_card(symbol, name, price, change):
+    st.markdown(ticker_card_html(symbol, name, price, change), unsafe_allow_html=True)
+
+TABLE_PAGE_SIZE = 50
+NUMERIC_TYPES = ('money', 'percent', 'colorful')
 
-def render_custom_table(df, columns_config):
+def _format_column(values, col_type):
+    """تنسيق عمود كامل دفعة واحدة: يرجع خلايا <td> جاهزة كسلسلة نصوص"""
+    if col_type == 'badge':
+        s = values.map(str).str.lower()
+        is_op = s.str.startswith('open') | s.str.startswith('مفتوح')
+        return pd.Series(np.where(is_op, '<td><span class="badge badge-open">مفتوحة</span></td>',
+                                  '<td><span class="badge badge-closed">مغلقة</span></td>'), index=values.index)
+
+    if col_type in NUMERIC_TYPES:
+        v = pd.to_numeric(values, errors='coerce')
+        text = v.map('{:.2f}%'.format if col_type == 'percent' else '{:,.2f}'.format).where(v.notna(), '-')
+        if col_type == 'money': cls = np.where(v > 0, 'txt-blue', '')
+        else: cls = np.where(v >= 0, 'txt-green', np.where(v < 0, 'txt-red', ''))
+    else:
+        text = values.map(str)
+        if col_type == 'date': text = text.str[:10]
+        text = text.map(html.escape)
+        cls = ''
+    return '<td><span class="' + pd.Series(cls, index=values.index) + '">' + text + '</span></td>'
+
+@profiled('render')
+def render_custom_table(df, columns_config, key="table", page_size=TABLE_PAGE_SIZE):
+    """
+    جدول HTML مرقّم: الترتيب والتقسيم على الخادم، ولا يُنسّق ويُرسل للمتصفح إلا صفوف الصفحة الظاهرة.
+    key يميز عناصر التحكم عند وجود أكثر من جدول في الصفحة.
+    """
     if df is None or df.empty:
         st.info("📭 لا توجد بيانات متاحة")
         return
 
-    # بداية الجدول
-    html_out = '<div style="overflow-x:auto;"><table class="finance-table"><thead><tr>'
-    
-    # الرؤوس
-    for _, label, _ in columns_config:
-        html_out += f'<th>{html.escape(str(label))}</th>'
-    html_out += '</tr></thead><tbody>'
-    
-    # الصفوف
-    for _, row in df.iterrows():
-        html_out += '<tr>'
-        for col_key, _, col_type in columns_config:
-            val = row.get(col_key, "")
-            display = str(val)
-            cls = ""
-            
-            if col_type == 'money':
-                try:
-                    v = float(val)
-                    display = f"{v:,.2f}"
-                    cls = "txt-blue" if v > 0 else ""
-                except:
-                    display = "-"
-            
-            elif col_type == 'percent':
-                try:
-                    v = float(val)
-                    display = f"{v:.2f}%"
-                    cls = "txt-green" if v >= 0 else "txt-red"
-                except:
-                    display = "-"
-            
-            elif col_type == 'colorful':
-                try:
-                    v = float(val)
-                    display = f"{v:,.2f}"
-                    cls = "txt-green" if v >= 0 else "txt-red"
-                except:
-                    display = "-"
-            
-            elif col_type == 'badge':
-                s = str(val).lower()
-                is_op = s.startswith('open') or s.startswith('مفتوح')
-                badge_cls = "badge-open" if is_op else "badge-closed"
-                badge_text = "مفتوحة" if is_op else "مغلقة"
-                display = f'<span class="badge {badge_cls}">{badge_text}</span>'
-                html_out += f'<td>{display}</td>'
-                continue 
-            
-            elif col_type == 'date':
-                display = display[:10]
-            
-            # Sanitization Final Step
-            if col_type != 'badge':
-                display = html.escape(display)
-                
-            html_out += f'<td><span class="{cls}">{display}</span></td>'
-        html_out += '</tr>'
-        
-    html_out += '</tbody></table></div>'
-    st.markdown(html_out, unsafe_allow_html=True)
+    labels = {label: col for col, label, _ in columns_config if col in df.columns}
+    types = {col: t for col, _, t in columns_config}
+    pages = max(1, -(-len(df) // page_size))
+
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > pages: st.session_state[page_key] = pages   # تقلص الصفوف (فلتر أو إغلاق صفقة)
+
+    c1, c2, c3 = st.columns([2, 1, 1])
+    sort_label = c1.selectbox("ترتيب حسب", ["—"] + list(labels), key=f"{key}_sort", label_visibility="collapsed")
+    descending = c2.toggle("تنازلي", value=True, key=f"{key}_desc")
+    page = c3.number_input("الصفحة", 1, pages, 1, key=page_key, label_visibility="collapsed") if pages > 1 else 1
+
+    if sort_label != "—":
+        col = labels[sort_label]
+        sort_key = (lambda v: pd.to_numeric(v, errors='coerce')) if types[col] in NUMERIC_TYPES else None
+        df = df.sort_values(col, ascending=not descending, key=sort_key, na_position='last')
+    view = df.iloc[(page - 1) * page_size: page * page_size]
+
+    head = "".join(f'<th>{html.escape(str(label))}</th>' for _, label, _ in columns_config)
+    cells = pd.Series('', index=view.index)
+    for col, _, col_type in columns_config:
+        values = view[col] if col in view.columns else pd.Series('', index=view.index)
+        cells = cells + _format_column(values, col_type)
+    body = "".join('<tr>' + cells + '</tr>')
+
+    st.markdown(f'<div style="overflow-x:auto;"><table class="finance-table"><thead><tr>{head}</tr></thead>'
+                f'<tbody>{body}</tbody></table></div>', unsafe_allow_html=True)
+    if pages > 1: st.caption(f"عرض {len(view)} من {len(df)} صف · صفحة {page} من {pages}")
@@ -2,5 +2,6 @@ from pathlib import Path
 APP_NAME = "أصولي"
 APP_ICON = "🏛️"
 BACKUP_DIR = Path("backups"); BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+BACKUP_KEEP = 5   # عدد أرشيفات ZIP المحفوظة لكل مستخدم على الخادم
 COMMISSION_RATE = 0.00155
 DEFAULT_COLORS = {'primary': '#0052CC', 'page_bg': '#F4F6F8', 'card_bg': '#FFFFFF', 'main_text': '#172B4D', 'success': '#006644', 'danger': '#DE350B', 'border': '#DFE1E6'}
@@ -1,4 +1,6 @@
 # data_source.py
+import re
+
 TADAWUL_DB = {
     '1010': {'name': 'بنك الرياض', 'sector': 'البنوك'},
     '1020': {'name': 'بنك الجزيرة', 'sector': 'البنوك'},
@@ -353,8 +355,73 @@ TADAWUL_DB = {
     '9642': {'name': 'تايم', 'sector': 'الإعلام والترفيه (موازي)'},
 }
 
+# ==============================
+# 🔎 فهرس البحث: يُبنى مرة عند الاستيراد
+# الرمز بالمطابقة التامة، والاسم بالبادئة أو بالمقاطع الثلاثية (trigrams)
+# بعد توحيد الحروف العربية، مع فهرس عكسي القطاع ← الرموز
+# ==============================
+
+_DIACRITICS = re.compile(r'[\u064B-\u0652\u0640]')   # التشكيل والتطويل
+
+def normalize_arabic(text):
+    """توحيد الألف والياء والتاء المربوطة، وحذف التشكيل وعلامات الترقيم"""
+    t = _DIACRITICS.sub('', str(text)).lower()
+    t = re.sub('[أإآ]', 'ا', t).replace('ى', 'ي').replace('ة', 'ه')
+    t = re.sub(r'[^\w\s]|_', ' ', t)
+    return re.sub(r'\s+', ' ', t).strip()
+
+def _trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+def _without_al(word):
+    return word[2:] if word.startswith('ال') and len(word) > 3 else word
+
+def _build_search_index():
+    names, prefixes, trigrams, sectors = {}, {}, {}, {}
+    for code, info in TADAWUL_DB.items():
+        name = normalize_arabic(info['name'])
+        names[code] = name
+        sectors.setdefault(info['sector'], []).append(code)
+        words = set(name.split()) | {_without_al(w) for w in name.split()}
+        for w in words | {code}:
+            for i in range(1, len(w) + 1): prefixes.setdefault(w[:i], set()).add(code)
+            for g in _trigrams(w): trigrams.setdefault(g, set()).add(code)
+    return names, prefixes, trigrams, {k: sorted(v) for k, v in sectors.items()}
+
+_NAMES, _PREFIXES, _TRIGRAMS, SECTOR_INDEX = _build_search_index()
+SECTORS = sorted(SECTOR_INDEX)
+
+def clean_symbol(symbol):
+    return str(symbol).upper().replace('.SR', '').replace('.0', '').strip()
+
+def search_symbols(query, sector=None, limit=10):
+    """
+    رموز مرتبة حسب قوة المطابقة: الرمز نفسه، ثم اسم يبدأ بالنص، ثم كل كلمة بادئة لكلمة في الاسم،
+    ثم كل كلمة (3 أحرف فأكثر) موجودة داخل الاسم. sector يحصر النتائج في قطاع.
+    """
+    q = normalize_arabic(query)
+    if not q: return SECTOR_INDEX.get(sector, [])[:limit] if sector else []
+    allowed = set(SECTOR_INDEX.get(sector, [])) if sector else None
+    words = [_without_al(w) for w in q.split()]   # "الاسمنت" تطابق "اسمنت"
+
+    ranked = {}
+    def _add(codes, rank):
+        for c in codes:
+            if c not in ranked and (allowed is None or c in allowed): ranked[c] = rank
+
+    code = clean_symbol(query)
+    if code in TADAWUL_DB: _add([code], 0)
+    by_prefix = set.intersection(*(_PREFIXES.get(w, set()) for w in words))
+    _add(sorted(c for c in by_prefix if _NAMES[c].startswith(q)), 1)
+    _add(sorted(by_prefix), 2)
+    long_words = [w for w in words if len(w) >= 3]
+    if long_words:
+        grams = [_TRIGRAMS.get(g, set()) for w in long_words for g in _trigrams(w)]
+        by_gram = set.intersection(*grams) if grams else set()
+        _add(sorted(c for c in by_gram if all(w in _NAMES[c] or w in c for w in long_words)), 3)
+    return sorted(ranked, key=ranked.get)[:limit]
+
 def get_company_details(symbol):
-    clean_sym = str(symbol).replace('.SR', '').replace('.0', '').strip()
-    data = TADAWUL_DB.get(clean_sym)
+    data = TADAWUL_DB.get(clean_symbol(symbol))
     if data: return data['name'], data['sector']
     return symbol, "غير معروف"
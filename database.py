@@ -1,9 +1,12 @@
 import psycopg2
 from psycopg2 import pool
+from psycopg2.extras import execute_values
 import pandas as pd
 import streamlit as st
 import bcrypt
+import threading
 from contextlib import contextmanager
+from profiler import profiled
 
 # 1. إعداد الاتصال
 try:
@@ -21,8 +24,15 @@ def get_connection_pool():
         st.error(f"DB Error: {e}")
         return None
 
+# عدّاد طلبات القاعدة لكل خيط (كل تشغيل لصفحة Streamlit في خيط مستقل)
+_stats = threading.local()
+
+def query_count():
+    return getattr(_stats, 'queries', 0)
+
 @contextmanager
 def get_db():
+    _stats.queries = query_count() + 1
     pool_obj = get_connection_pool()
     if not pool_obj:
         yield None
@@ -39,6 +49,7 @@ def get_db():
             pool_obj.putconn(conn)
 
 # 2. تنفيذ الأوامر
+@profiled('db', detail=lambda a: a[0])
 def execute_query(query, params=()):
     with get_db() as conn:
         if conn:
@@ -54,6 +65,24 @@ def execute_query(query, params=()):
                 return False
     return False
 
+@profiled('db', detail=lambda a: a[0])
+def execute_batch(query, rows, page_size=1000):
+    """إدراج/تحديث دفعة صفوف في طلب واحد (الاستعلام يحتوي VALUES %s)"""
+    if not rows: return True
+    with get_db() as conn:
+        if conn:
+            try:
+                with conn.cursor() as cur:
+                    execute_values(cur, query, rows, page_size=page_size)
+                    conn.commit()
+                    return True
+            except Exception as e:
+                conn.rollback()
+                print(f"Batch Error: {e}")
+                return False
+    return False
+
+@profiled('db', detail=lambda a: a[0])
 def fetch_table(table_name):
     with get_db() as conn:
         if conn:
@@ -66,6 +95,24 @@ def fetch_table(table_name):
                     pass
     return pd.DataFrame()
 
+@profiled('db', detail=lambda a: a[0])
+def fetch_query(query, params=()):
+    """تنفيذ SELECT بمعاملات وإرجاع DataFrame (بدلاً من قراءة الجدول كاملاً)"""
+    with get_db() as conn:
+        if conn:
+            try:
+                return pd.read_sql(query.replace('?', '%s'), conn, params=params)
+            except Exception as e:
+                print(f"Fetch Error: {e}")
+    return pd.DataFrame()
+
+def current_user():
+    return st.session_state.get('username')
+
+def fetch_user_table(table_name, username=None):
+    """صفوف المستخدم فقط من جداول المحفظة (USER_TABLES)، عبر فهرس (owner, ...)"""
+    return fetch_query(f"SELECT * FROM {table_name} WHERE owner = %s", (username or current_user(),))
+
 # 3. تحديث هيكلية البيانات (Migration)
 def migrate_financial_schema():
     # هنا التعديل الوحيد: أضفنا الأعمدة الناقصة (source, period_type)
@@ -77,6 +124,8 @@ def migrate_financial_schema():
         ("current_assets", "DOUBLE PRECISION"),
         ("current_liabilities", "DOUBLE PRECISION"),
         ("long_term_debt", "DOUBLE PRECISION"),
+        ("gross_profit", "DOUBLE PRECISION"),
+        ("shares_outstanding", "DOUBLE PRECISION"),
         ("source", "VARCHAR(20)"), # جديد
         ("period_type", "VARCHAR(20)") # جديد
     ]
@@ -91,6 +140,57 @@ def migrate_financial_schema():
                         conn.rollback()
             conn.commit()
 
+# جداول المحفظة: لكل صف مالك (owner = اسم المستخدم). القوائم المالية والتحليلات مشتركة بين الجميع
+USER_TABLES = ['Trades', 'Deposits', 'Withdrawals', 'ReturnsGrants', 'Watchlist']
+USER_INDEXES = {
+    'Trades': '(owner, status, symbol)',
+    'Deposits': '(owner, date)',
+    'Withdrawals': '(owner, date)',
+    'ReturnsGrants': '(owner, date)',
+}
+
+def _legacy_owner(cur):
+    """مالك الصفوف السابقة للتقسيم: LEGACY_OWNER من الأسرار، وإلا المستخدم الوحيد إن لم يوجد غيره"""
+    try: owner = st.secrets.get("LEGACY_OWNER")
+    except Exception: owner = None
+    if owner: return owner
+    cur.execute("SELECT username FROM Users LIMIT 2")
+    users = cur.fetchall()
+    return users[0][0] if len(users) == 1 else None
+
+def migrate_owner_schema():
+    with get_db() as conn:
+        if not conn: return
+        try:
+            with conn.cursor() as cur:
+                for t in USER_TABLES: cur.execute(f"ALTER TABLE {t} ADD COLUMN IF NOT EXISTS owner VARCHAR(50)")
+                owner = _legacy_owner(cur)
+                if owner:
+                    for t in USER_TABLES: cur.execute(f"UPDATE {t} SET owner = %s WHERE owner IS NULL", (owner,))
+                for t, cols in USER_INDEXES.items():
+                    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{t.lower()}_owner ON {t} {cols}")
+                # مفتاح المراقبة يصبح (owner, symbol) بعد إسناد كل الصفوف لمالك
+                cur.execute("""SELECT COUNT(*) FROM information_schema.key_column_usage
+                               WHERE table_name = 'watchlist' AND constraint_name = 'watchlist_pkey'""")
+                single_key = cur.fetchone()[0] == 1
+                cur.execute("SELECT COUNT(*) FROM Watchlist WHERE owner IS NULL")
+                if single_key and cur.fetchone()[0] == 0:
+                    cur.execute("ALTER TABLE Watchlist DROP CONSTRAINT watchlist_pkey")
+                    cur.execute("ALTER TABLE Watchlist ALTER COLUMN owner SET NOT NULL")
+                    cur.execute("ALTER TABLE Watchlist ADD PRIMARY KEY (owner, symbol)")
+                elif single_key:
+                    print("Owner Migration: Watchlist rows without owner; set LEGACY_OWNER to finish the migration")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Owner Migration Error: {e}")
+
+def count_unowned_rows():
+    """عدد الصفوف بلا مالك في كل جدول (لا تظهر لأي مستخدم حتى يُضبط LEGACY_OWNER)"""
+    union = " UNION ALL ".join(f"SELECT '{t}' AS tbl, COUNT(*) AS n FROM {t} WHERE owner IS NULL" for t in USER_TABLES)
+    df = fetch_query(union)
+    return {r['tbl']: int(r['n']) for _, r in df.iterrows() if r['n']}
+
 def init_db():
     tables = [
         "CREATE TABLE IF NOT EXISTS Users (username VARCHAR(50) PRIMARY KEY, password TEXT, email TEXT)",
@@ -98,12 +198,12 @@ def init_db():
             id SERIAL PRIMARY KEY, symbol VARCHAR(20), company_name TEXT, sector TEXT, 
             asset_type VARCHAR(20), date DATE, quantity DOUBLE PRECISION, entry_price DOUBLE PRECISION, 
             exit_price DOUBLE PRECISION DEFAULT 0, current_price DOUBLE PRECISION DEFAULT 0, 
-            strategy VARCHAR(20), status VARCHAR(10) DEFAULT 'Open', exit_date DATE, notes TEXT
+            strategy VARCHAR(20), status VARCHAR(10) DEFAULT 'Open', exit_date DATE, notes TEXT, owner VARCHAR(50)
         )""",
-        "CREATE TABLE IF NOT EXISTS Deposits (id SERIAL PRIMARY KEY, date DATE, amount DOUBLE PRECISION, note TEXT)",
-        "CREATE TABLE IF NOT EXISTS Withdrawals (id SERIAL PRIMARY KEY, date DATE, amount DOUBLE PRECISION, note TEXT)",
-        "CREATE TABLE IF NOT EXISTS ReturnsGrants (id SERIAL PRIMARY KEY, date DATE, symbol VARCHAR(20), company_name TEXT, amount DOUBLE PRECISION, note TEXT)",
-        "CREATE TABLE IF NOT EXISTS Watchlist (symbol VARCHAR(20) PRIMARY KEY, target_price DOUBLE PRECISION, note TEXT)",
+        "CREATE TABLE IF NOT EXISTS Deposits (id SERIAL PRIMARY KEY, date DATE, amount DOUBLE PRECISION, note TEXT, owner VARCHAR(50))",
+        "CREATE TABLE IF NOT EXISTS Withdrawals (id SERIAL PRIMARY KEY, date DATE, amount DOUBLE PRECISION, note TEXT, owner VARCHAR(50))",
+        "CREATE TABLE IF NOT EXISTS ReturnsGrants (id SERIAL PRIMARY KEY, date DATE, symbol VARCHAR(20), company_name TEXT, amount DOUBLE PRECISION, note TEXT, owner VARCHAR(50))",
+        "CREATE TABLE IF NOT EXISTS Watchlist (owner VARCHAR(50) NOT NULL, symbol VARCHAR(20), target_price DOUBLE PRECISION, note TEXT, PRIMARY KEY(owner, symbol))",
         "CREATE TABLE IF NOT EXISTS InvestmentThesis (symbol VARCHAR(20) PRIMARY KEY, thesis_text TEXT, target_price DOUBLE PRECISION, recommendation VARCHAR(20), last_updated DATE)",
         """CREATE TABLE IF NOT EXISTS FinancialStatements (
             symbol VARCHAR(20), date DATE, 
@@ -111,6 +211,23 @@ def init_db():
             period_type VARCHAR(20) DEFAULT 'Annual', 
             source VARCHAR(20) DEFAULT 'Auto',
             PRIMARY KEY(symbol, date, period_type)
+        )""",
+        "CREATE TABLE IF NOT EXISTS IndicatorState (symbol VARCHAR(20) PRIMARY KEY, last_bar DATE, state TEXT, updated_at TIMESTAMP)",
+        "CREATE TABLE IF NOT EXISTS AIReports (symbol VARCHAR(20) PRIMARY KEY, last_bar DATE, fin_version VARCHAR(32), engine_version VARCHAR(20), report TEXT, created_at TIMESTAMP)",
+        "CREATE TABLE IF NOT EXISTS ScoreHistory (symbol VARCHAR(20), date DATE, vsa INTEGER, dow INTEGER, candles INTEGER, tech_score INTEGER, PRIMARY KEY(symbol, date))",
+        "CREATE TABLE IF NOT EXISTS AnalysisArtifacts (symbol VARCHAR(20), kind VARCHAR(30), payload TEXT, computed_at TIMESTAMP, PRIMARY KEY(symbol, kind))",
+        """CREATE TABLE IF NOT EXISTS FundamentalsSnapshot (
+            symbol VARCHAR(20) PRIMARY KEY, eps DOUBLE PRECISION, bvps DOUBLE PRECISION,
+            shares_outstanding DOUBLE PRECISION, dividend_rate DOUBLE PRECISION, dividend_yield DOUBLE PRECISION,
+            payout_ratio DOUBLE PRECISION, ex_dividend_date DATE, currency VARCHAR(10), updated_at TIMESTAMP
+        )""",
+        """CREATE TABLE IF NOT EXISTS RatioPanel (
+            symbol VARCHAR(20), date DATE, period_type VARCHAR(20),
+            roa DOUBLE PRECISION, roe DOUBLE PRECISION, current_ratio DOUBLE PRECISION, leverage DOUBLE PRECISION,
+            accruals DOUBLE PRECISION, gross_margin DOUBLE PRECISION, asset_turnover DOUBLE PRECISION,
+            f1 BOOLEAN, f2 BOOLEAN, f3 BOOLEAN, f4 BOOLEAN, f5 BOOLEAN, f6 BOOLEAN, f7 BOOLEAN, f8 BOOLEAN, f9 BOOLEAN,
+            f_score INTEGER, f_available INTEGER, updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY(symbol, date, period_type)
         )"""
     ]
     
@@ -122,6 +239,8 @@ def init_db():
             conn.commit()
     
     migrate_financial_schema()
+    migrate_owner_schema()
+    execute_query("ALTER TABLE Users ADD COLUMN IF NOT EXISTS token_version INTEGER DEFAULT 0")
 
 # 4. المصادقة
 def db_create_user(u, p):
@@ -145,9 +264,16 @@ def db_verify_user(u, p):
                 print(f"Verify User Error: {e}")
     return False
 
-# تشغيل التهيئة
-if DB_URL:
-    try:
-        init_db()
-    except Exception as e:
-        print(f"Init DB Failed: {e}")
\ No newline at end of file
+def db_token_version(u):
+    """نسخة رموز الجلسة للمستخدم (تزيد عند الخروج فتُبطل الرموز السابقة)؛ None إن لم يوجد"""
+    df = fetch_query("SELECT COALESCE(token_version, 0) AS v FROM Users WHERE username = %s", (u,))
+    return int(df.iloc[0]['v']) if not df.empty else None
+
+def db_revoke_tokens(u):
+    return execute_query("UPDATE Users SET token_version = COALESCE(token_version, 0) + 1 WHERE username = %s", (u,))
+
+@st.cache_resource(show_spinner=False)
+def ensure_db():
+    """التهيئة مرة واحدة لكل عملية خادم (بدلاً من كل استيراد أو كل جلسة)"""
+    init_db()
+    return True
@@ -4,104 +4,129 @@ import io
 import yfinance as yf
 import plotly.express as px
 import numpy as np
-from database import execute_query, fetch_table
+from database import execute_query, execute_batch, fetch_table
 from market_data import fetch_price_from_google, get_ticker_symbol
+from scheduler import notify_financials_changed, get_artifact
+from fundamentals_store import get_snapshot
+from components import session_result, invalidate_session_results
+from ratio_engine import compute_ratio_panel, latest_row, ttm_statements, F_LABELS, LAGS, F_MIN_AVAILABLE
+from profiler import profiled
 
 # ==============================================================
 # 📥 1. وحدة التخزين والمزامنة (Input & Storage)
 # ==============================================================
 
+FIN_COLUMNS = [
+    'revenue', 'net_income', 'total_assets', 'total_liabilities',
+    'total_equity', 'operating_cash_flow', 'current_assets',
+    'current_liabilities', 'long_term_debt', 'gross_profit', 'shares_outstanding'
+]
+
+def _clean_record(data):
+    """
+    استخراج القيم بأمان وتنظيفها؛ البند غير المذكور يُحفظ NULL (لا صفراً) حتى لا يُعامل كقيمة متوفرة.
+    None للسجل الفارغ بالكامل (لعدم ملء القاعدة ببيانات فارغة)
+    """
+    def clean(val):
+        try:
+            if val is None or pd.isna(val): return None
+            return float(val)
+        except: return None
+
+    vals = {k: clean(data.get(k)) for k in FIN_COLUMNS}
+    return vals if any(vals.values()) else None
+
+_UPSERT_FIN = f"""
+    INSERT INTO "FinancialStatements" (symbol, date, period_type, source, {", ".join(FIN_COLUMNS)})
+    VALUES %s
+    ON CONFLICT (symbol, date, period_type) 
+    DO UPDATE SET {", ".join(f"{c}=EXCLUDED.{c}" for c in FIN_COLUMNS)}, source=EXCLUDED.source
+"""
+
 def save_financial_record(symbol, date_str, data, period_type='Annual', source='Manual'):
     """حفظ سجل مالي واحد في قاعدة البيانات"""
+    return save_financial_records([(symbol, date_str, period_type, source, data)]) == 1
+
+def save_financial_records(records, page_size=500):
+    """
+    حفظ دفعة سجلات في طلب واحد (upsert).
+    records: [(symbol, date_str, period_type, source, data), ...] — يرجع عدد السجلات المحفوظة
+    """
     try:
-        # استخراج القيم بأمان وتنظيفها
-        def clean(val):
-            try:
-                if pd.isna(val) or val is None: return 0.0
-                return float(val)
-            except: return 0.0
+        rows = {}
+        for symbol, date_str, period_type, source, data in records:
+            vals = _clean_record(data)
+            if vals is None: continue
+            # آخر نسخة من نفس المفتاح تفوز (ON CONFLICT لا يقبل تكرار المفتاح في نفس الطلب)
+            rows[(symbol, date_str, period_type)] = (symbol, date_str, period_type, source) + tuple(vals[c] for c in FIN_COLUMNS)
+        if not rows: return 0
+        if not execute_batch(_UPSERT_FIN, list(rows.values()), page_size): return 0
+        clear_statements_cache()
+        return len(rows)
+    except Exception as e:
+        print(f"Save Error: {e}")
+        return 0
 
-        vals = {k: clean(data.get(k, 0)) for k in [
-            'revenue', 'net_income', 'total_assets', 'total_liabilities', 
-            'total_equity', 'operating_cash_flow', 'current_assets', 
-            'current_liabilities', 'long_term_debt'
-        ]}
+def fetch_yahoo_statements(symbol, throttle=None):
+    """
+    جلب القوائم السنوية والربعية من Yahoo دون حفظ.
+    throttle: دالة تُستدعى قبل كل طلب شبكة (محدد المعدل في المزامنة الجماعية)
+    يرجع قائمة سجلات بصيغة save_financial_records
+    """
+    t = yf.Ticker(get_ticker_symbol(symbol))
 
-        # تجاهل السجلات الصفرية بالكامل (لعدم ملء القاعدة ببيانات فارغة)
-        if sum(vals.values()) == 0:
-            return False
+    def _frame(attr):
+        if throttle: throttle()
+        df = getattr(t, attr)
+        return df if df is not None else pd.DataFrame()
 
-        query = """
-            INSERT INTO "FinancialStatements" 
-            (symbol, date, period_type, source, revenue, net_income, total_assets, total_liabilities, 
-             total_equity, operating_cash_flow, current_assets, current_liabilities, long_term_debt)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (symbol, date, period_type) 
-            DO UPDATE SET 
-                revenue=EXCLUDED.revenue, net_income=EXCLUDED.net_income,
-                total_assets=EXCLUDED.total_assets, total_liabilities=EXCLUDED.total_liabilities,
-                total_equity=EXCLUDED.total_equity, operating_cash_flow=EXCLUDED.operating_cash_flow,
-                current_assets=EXCLUDED.current_assets, current_liabilities=EXCLUDED.current_liabilities,
-                long_term_debt=EXCLUDED.long_term_debt, source=EXCLUDED.source;
-        """
-        execute_query(query, (
-            symbol, date_str, period_type, source,
-            vals['revenue'], vals['net_income'], vals['total_assets'], vals['total_liabilities'],
-            vals['total_equity'], vals['operating_cash_flow'], vals['current_assets'],
-            vals['current_liabilities'], vals['long_term_debt']
-        ))
-        return True
-    except Exception as e:
-        print(f"Save Error: {e}")
-        return False
+    def _process(df_fin, df_bs, df_cf, p_type):
+        out = []
+        if df_fin.empty and df_bs.empty: return out
+        
+        # دمج التواريخ المتاحة
+        dates = sorted(list(set(df_fin.columns) | set(df_bs.columns) | set(df_cf.columns)), reverse=True)[:6]
+        
+        for d in dates:
+            try:
+                d_str = d.strftime('%Y-%m-%d')
+                
+                # دالة مساعدة لجلب القيمة بأمان
+                def get_val(df, key):
+                    if d in df.columns and key in df.index:
+                        return df.loc[key, d]
+                    return 0
+
+                data = {
+                    'revenue': get_val(df_fin, 'Total Revenue'),
+                    'net_income': get_val(df_fin, 'Net Income'),
+                    'total_assets': get_val(df_bs, 'Total Assets'),
+                    'total_liabilities': get_val(df_bs, 'Total Liabilities Net Minority Interest'),
+                    'total_equity': get_val(df_bs, 'Total Equity Gross Minority Interest'),
+                    'operating_cash_flow': get_val(df_cf, 'Operating Cash Flow'),
+                    'current_assets': get_val(df_bs, 'Current Assets'),
+                    'current_liabilities': get_val(df_bs, 'Current Liabilities'),
+                    'long_term_debt': get_val(df_bs, 'Long Term Debt'),
+                    'gross_profit': get_val(df_fin, 'Gross Profit'),
+                    'shares_outstanding': get_val(df_bs, 'Ordinary Shares Number'),
+                }
+                if _clean_record(data) is not None: out.append((symbol, d_str, p_type, 'Auto', data))
+            except: continue
+        return out
+
+    records = _process(_frame('financials'), _frame('balance_sheet'), _frame('cashflow'), 'Annual')
+    records += _process(_frame('quarterly_financials'), _frame('quarterly_balance_sheet'), _frame('quarterly_cashflow'), 'Quarterly')
+    return records
 
 def sync_auto_yahoo(symbol):
     """جلب آلي من Yahoo مع تحسينات للشركات السعودية"""
     try:
-        ticker_sym = get_ticker_symbol(symbol)
-        t = yf.Ticker(ticker_sym)
-        count = 0
-        
-        def _process(df_fin, df_bs, df_cf, p_type):
-            c = 0
-            if df_fin.empty and df_bs.empty: return 0
-            
-            # دمج التواريخ المتاحة
-            dates = sorted(list(set(df_fin.columns) | set(df_bs.columns) | set(df_cf.columns)), reverse=True)[:6]
-            
-            for d in dates:
-                try:
-                    d_str = d.strftime('%Y-%m-%d')
-                    
-                    # دالة مساعدة لجلب القيمة بأمان
-                    def get_val(df, key):
-                        if d in df.columns and key in df.index:
-                            return df.loc[key, d]
-                        return 0
-
-                    data = {
-                        'revenue': get_val(df_fin, 'Total Revenue'),
-                        'net_income': get_val(df_fin, 'Net Income'),
-                        'total_assets': get_val(df_bs, 'Total Assets'),
-                        'total_liabilities': get_val(df_bs, 'Total Liabilities Net Minority Interest'),
-                        'total_equity': get_val(df_bs, 'Total Equity Gross Minority Interest'),
-                        'operating_cash_flow': get_val(df_cf, 'Operating Cash Flow'),
-                        'current_assets': get_val(df_bs, 'Current Assets'),
-                        'current_liabilities': get_val(df_bs, 'Current Liabilities'),
-                        'long_term_debt': get_val(df_bs, 'Long Term Debt'),
-                    }
-                    
-                    if save_financial_record(symbol, d_str, data, p_type, 'Auto'): 
-                        c += 1
-                except: continue
-            return c
-
-        count += _process(t.financials, t.balance_sheet, t.cashflow, 'Annual')
-        count += _process(t.quarterly_financials, t.quarterly_balance_sheet, t.quarterly_cashflow, 'Quarterly')
+        count = save_financial_records(fetch_yahoo_statements(symbol))
         
         if count == 0:
             return False, "لم يتم العثور على بيانات مالية في Yahoo Finance لهذا الرمز."
             
+        notify_financials_changed(symbol)
         return True, f"تم تحديث {count} سجلات بنجاح"
     except Exception as e: return False, str(e)
 
@@ -140,12 +165,37 @@ def parse_pasted_text(txt):
 # 🧠 2. وحدة التحليل (Analysis Logic)
 # ==============================================================
 
-def get_stored_financials_df(symbol, period_type='Annual'):
+@st.cache_resource(show_spinner=False)
+def _statements_index():
+    """
+    فهرس القوائم في الذاكرة: {الرمز: DataFrame} من قراءة واحدة للجدول.
+    cache_resource (بلا نسخ عند كل استدعاء)؛ الإطارات للقراءة فقط ويُمسح الفهرس عند أي حفظ.
+    """
+    df = fetch_table("FinancialStatements")
+    if df.empty or 'symbol' not in df.columns: return {}
+    df['date'] = pd.to_datetime(df['date'])
+    return {sym: g.sort_values('date', ascending=False).reset_index(drop=True) for sym, g in df.groupby('symbol')}
+
+def clear_statements_cache():
+    _statements_index.clear()
+
+def get_symbol_statements(symbol):
+    """كل قوائم السهم (سنوي وربعي) من الفهرس دون قراءة الجدول"""
+    df = _statements_index().get(symbol)
+    return df.copy() if df is not None else pd.DataFrame()
+
+def get_stored_financials_df(symbol, period_type='Annual', statements=None):
+    """
+    قوائم السهم لنوع فترة (Annual / Quarterly / TTM) من الأحدث للأقدم.
+    statements: جدول محمل مسبقاً (كاملاً أو لسهم واحد)؛ وإلا يُقرأ من الفهرس.
+    """
     try:
-        df = fetch_table("FinancialStatements")
+        df = get_symbol_statements(symbol) if statements is None else statements
         if not df.empty:
-            mask = (df['symbol'] == symbol) & (df['period_type'] == period_type)
-            df = df[mask].copy()
+            df = df[df['symbol'] == symbol]
+            if period_type == 'TTM': df = ttm_statements(df)
+            df = df[df['period_type'] == period_type].copy()
+            if df.empty: return df
             df['date'] = pd.to_datetime(df['date'])
             
             # ضمان وجود الأعمدة لمنع الأخطاء وتعبئة القيم الفارغة
@@ -158,39 +208,50 @@ def get_stored_financials_df(symbol, period_type='Annual'):
     except: pass
     return pd.DataFrame()
 
-def get_advanced_fundamental_ratios(symbol):
+def choose_statement_basis(symbol, statements=None):
+    """
+    أحدث أساس قابل للمقارنة: TTM إذا كان أحدث من آخر سنة مالية ولديه TTM قبل عام للمقارنة،
+    وإلا السنوي، وإلا الربعي. يرجع (الأساس، DataFrame)
+    """
+    annual = get_stored_financials_df(symbol, 'Annual', statements)
+    ttm = get_stored_financials_df(symbol, 'TTM', statements)
+    if len(ttm) > LAGS['TTM'] and (annual.empty or ttm['date'].iloc[0] > annual['date'].iloc[0]):
+        return 'TTM', ttm
+    if not annual.empty: return 'Annual', annual
+    if not ttm.empty: return 'TTM', ttm
+    return 'Quarterly', get_stored_financials_df(symbol, 'Quarterly', statements)
+
+def get_advanced_fundamental_ratios(symbol, statements=None, snapshot=None):
+    """
+    النسب المالية محلياً بالكامل: القوائم من FinancialStatements و EPS/BVPS من FundamentalsSnapshot.
+    snapshot: لقطة السهم إن كانت محملة مسبقاً (الماسح يمرر {} للسهم بلا لقطة)
+    """
     metrics = {"Fair_Value_Graham": None, "Piotroski_Score": 0, "Financial_Health": "غير متوفر", "Score": 0, "Rating": "N/A", "Opinions": ""}
     
-    df = get_stored_financials_df(symbol, 'Annual')
-    if df.empty: df = get_stored_financials_df(symbol, 'Quarterly')
+    basis, df = choose_statement_basis(symbol, statements)
     if df.empty or len(df) < 1: return metrics
+    metrics['Basis'] = basis
     
     curr = df.iloc[0]
-    prev = df.iloc[1] if len(df) > 1 else curr
+    prev = df.iloc[LAGS[basis]] if len(df) > LAGS[basis] else (df.iloc[1] if len(df) > 1 else curr)
     
     try:
-        # Piotroski F-Score (محلي)
-        score = 0
-        if curr.get('net_income', 0) > 0: score += 1
-        if curr.get('operating_cash_flow', 0) > 0: score += 1
-        
-        roa_c = curr.get('net_income', 0) / (curr.get('total_assets', 1) or 1)
-        roa_p = prev.get('net_income', 0) / (prev.get('total_assets', 1) or 1)
-        if roa_c > roa_p: score += 1
-        
-        if curr.get('operating_cash_flow', 0) > curr.get('net_income', 0): score += 1
+        # Piotroski F-Score الكامل (9 معايير) من محرك النسب
+        row = latest_row(compute_ratio_panel(df, basis))
+        metrics['Piotroski_Score'] = int(row['f_score'])
+        metrics['F_Available'] = int(row['f_available'])
+        metrics['F_Criteria'] = {F_LABELS[k]: bool(row[k]) for k in F_LABELS}
+        for k in ['roa', 'roe', 'current_ratio', 'leverage', 'accruals', 'gross_margin', 'asset_turnover']:
+            metrics[k.upper()] = None if pd.isna(row[k]) else float(row[k])
         
-        metrics['Piotroski_Score'] = min(score + 4, 9) # تقريب
-        
-        # Graham
-        try:
-            t = yf.Ticker(get_ticker_symbol(symbol))
-            eps = t.info.get('trailingEps')
-            bvps = t.info.get('bookValue')
-            if eps and bvps: metrics['Fair_Value_Graham'] = (22.5 * eps * bvps) ** 0.5
-        except: pass
+        # Graham (من اللقطة المحفوظة بدل yf.Ticker.info)
+        snap = get_snapshot(symbol) if snapshot is None else snapshot
+        eps, bvps = snap.get('eps'), snap.get('bvps')
+        if eps and bvps and eps > 0 and bvps > 0: metrics['Fair_Value_Graham'] = (22.5 * eps * bvps) ** 0.5
+        metrics['Snapshot_Updated'] = snap.get('updated_at')
 
-        if score >= 5: metrics['Financial_Health'] = "جيد / مستقر"
+        if metrics['F_Available'] < F_MIN_AVAILABLE: metrics['Financial_Health'] = "بيانات غير كافية"
+        elif metrics['Piotroski_Score'] >= 5: metrics['Financial_Health'] = "جيد / مستقر"
         else: metrics['Financial_Health'] = "هش / يحتاج مراجعة"
         metrics['Score'] = metrics['Piotroski_Score']
         metrics['Rating'] = metrics['Financial_Health']
@@ -198,16 +259,18 @@ def get_advanced_fundamental_ratios(symbol):
         ops = []
         if curr.get('net_income',0) > prev.get('net_income',0): ops.append("نمو في الأرباح")
         if curr.get('operating_cash_flow',0) < 0: ops.append("كاش تشغيلي سالب")
+        if (metrics['ACCRUALS'] or 0) > 0.1: ops.append("مستحقات مرتفعة (جودة أرباح ضعيفة)")
         metrics['Opinions'] = " | ".join(ops)
 
-    except: pass
+    except Exception as e: print(f"Ratios Error ({symbol}): {e}")
     return metrics
 
 # ==============================================================
 # 📊 3. واجهة المستخدم (UI Layer) - تم إصلاح الخطأ هنا
 # ==============================================================
 
-def render_financial_dashboard_ui(symbol):
+@profiled('render')
+def render_financial_dashboard_ui(symbol, metrics=None):
     # فصلنا التبويبات لتكون واضحة
     tab_dashboard, tab_data_mgmt = st.tabs(["📊 لوحة التحليل المالي", "⚙️ إدارة القوائم والبيانات"])
     
@@ -216,20 +279,37 @@ def render_financial_dashboard_ui(symbol):
     # --------------------------
     with tab_dashboard:
         # اختيار الفترة للتحليل
-        ptype = st.radio("نطاق التحليل:", ["Annual", "Quarterly"], horizontal=True, label_visibility="collapsed")
+        ptype = st.radio("نطاق التحليل:", ["Annual", "Quarterly", "TTM"], horizontal=True, label_visibility="collapsed")
         df = get_stored_financials_df(symbol, ptype)
         
         if df.empty:
             st.warning("⚠️ لا توجد بيانات مالية محفوظة لهذا السهم.")
             st.info("👈 يرجى الانتقال لتبويب 'إدارة القوائم والبيانات' لجلب أو إدخال البيانات.")
         else:
-            # التحليل الذكي
-            metrics = get_advanced_fundamental_ratios(symbol)
+            # التحليل الذكي (جاهز من الجدولة الخلفية)
+            metrics = metrics or get_artifact(symbol, 'fundamentals')
             c1, c2, c3 = st.columns(3)
-            c1.metric("المتانة (F-Score)", f"{metrics['Piotroski_Score']}/9", metrics['Financial_Health'])
+            c1.metric(f"المتانة (F-Score · {metrics.get('Basis', '-')})", f"{metrics['Piotroski_Score']}/9", metrics['Financial_Health'])
             fv = metrics.get('Fair_Value_Graham')
             c2.metric("قيمة جراهام", f"{fv:,.2f}" if fv else "غير متاح")
             c3.write(f"**ملاحظات:** {metrics.get('Opinions', '-')}")
+            if metrics.get('Snapshot_Updated'): st.caption(f"EPS / القيمة الدفترية محدثة في: {str(metrics['Snapshot_Updated'])[:10]}")
+
+            # معايير Piotroski ومقارنة النسب بوسيط القطاع
+            if metrics.get('F_Criteria'):
+                with st.expander(f"🧮 معايير Piotroski ({metrics.get('F_Available', 0)} معيار متوفر البيانات)"):
+                    st.write(" | ".join(f"{'✅' if ok else '❌'} {name}" for name, ok in metrics['F_Criteria'].items()))
+                    from ratio_engine import load_latest_ratios, RATIO_COLUMNS
+                    peers = session_result((symbol, 'peers', ptype), lambda: load_latest_ratios(ptype))
+                    mine = peers[peers['symbol'] == symbol] if not peers.empty else peers
+                    if not mine.empty:
+                        r = mine.iloc[0]
+                        st.dataframe(pd.DataFrame({
+                            'النسبة': RATIO_COLUMNS + ['f_score'],
+                            'السهم': [r[c] for c in RATIO_COLUMNS + ['f_score']],
+                            f"وسيط القطاع ({r['sector']})": [r[f'{c}_median'] for c in RATIO_COLUMNS + ['f_score']],
+                            'الترتيب المئوي': [r[f'{c}_pct'] * 100 for c in RATIO_COLUMNS + ['f_score']],
+                        }).round(3), hide_index=True, use_container_width=True)
             
             st.markdown("---")
             
@@ -278,7 +358,7 @@ def render_financial_dashboard_ui(symbol):
             if st.button("بدء المزامنة الآلية", key="btn_sync_yahoo"):
                 with st.spinner("جاري الاتصال بالمخدمات..."):
                     ok, msg = sync_auto_yahoo(symbol)
-                    if ok: st.success(msg); st.rerun()
+                    if ok: invalidate_session_results(symbol); st.success(msg); st.rerun()
                     else: st.error(f"فشل: {msg}")
         
         # ب. النسخ واللصق
@@ -291,6 +371,7 @@ def render_financial_dashboard_ui(symbol):
                     saved_count = 0
                     for r in res:
                         if save_financial_record(symbol, r['date'], r['data']): saved_count += 1
+                    if saved_count: notify_financials_changed(symbol); invalidate_session_results(symbol)
                     st.success(f"تمت معالجة وحفظ {saved_count} سنوات.")
                     st.rerun()
                 else: st.error("لم نتمكن من قراءة البيانات. تأكد من التنسيق.")
@@ -312,6 +393,7 @@ def render_financial_dashboard_ui(symbol):
                     date_str = f"{f_year}-12-31" if f_type == "Annual" else f"{f_year}-03-31" # تاريخ تقريبي للربع
                     data = {'revenue': v_rev, 'net_income': v_net, 'operating_cash_flow': v_ocf, 'total_assets': v_ast}
                     if save_financial_record(symbol, date_str, data, f_type, 'Manual'):
+                        notify_financials_changed(symbol); invalidate_session_results(symbol)
                         st.success("تم الحفظ بنجاح")
                         st.rerun()
 
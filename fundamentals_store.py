@@ -0,0 +1,92 @@
+import pandas as pd
+import yfinance as yf
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from database import execute_batch, fetch_query
+from market_data import get_ticker_symbol
+
+# ============================================================
+# 🗃️ لقطة البيانات الأساسية (FundamentalsSnapshot)
+# yf.Ticker(...).info من أبطأ طلبات Yahoo، لذلك تُجلب دورياً وتُحفظ
+# وتقرأ حسابات النسب المالية من القاعدة فقط
+# ============================================================
+
+SNAPSHOT_TTL = timedelta(days=7)   # تتغير هذه الأرقام مع النتائج الربعية
+SNAPSHOT_FIELDS = {
+    'eps': 'trailingEps',
+    'bvps': 'bookValue',
+    'shares_outstanding': 'sharesOutstanding',
+    'dividend_rate': 'dividendRate',
+    'dividend_yield': 'dividendYield',
+    'payout_ratio': 'payoutRatio',
+    'ex_dividend_date': 'exDividendDate',
+}
+COLUMNS = list(SNAPSHOT_FIELDS) + ['currency']
+
+def _num(v):
+    try:
+        v = float(v)
+        return v if v == v else None
+    except (TypeError, ValueError):
+        return None
+
+def fetch_snapshot_from_yahoo(symbol):
+    """قاموس اللقطة لسهم واحد (طلب شبكة)"""
+    info = yf.Ticker(get_ticker_symbol(symbol)).info or {}
+    snap = {k: _num(info.get(src)) for k, src in SNAPSHOT_FIELDS.items() if k != 'ex_dividend_date'}
+    ex_div = info.get('exDividendDate')
+    snap['ex_dividend_date'] = pd.to_datetime(ex_div, unit='s').strftime('%Y-%m-%d') if isinstance(ex_div, (int, float)) else None
+    snap['currency'] = info.get('currency')
+    return snap
+
+def refresh_snapshots(symbols, max_workers=8):
+    """جلب متوازٍ لعدة رموز ثم حفظها في طلب واحد. يرجع (ناجحة، فاشلة)"""
+    def _one(sym):
+        try: return sym, fetch_snapshot_from_yahoo(sym)
+        except Exception as e:
+            print(f"Snapshot Error ({sym}): {e}")
+            return sym, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        results = list(ex.map(_one, symbols))
+
+    now = datetime.now()
+    rows, done, failed = [], [], []
+    for sym, snap in results:
+        if snap and any(snap[k] is not None for k in SNAPSHOT_FIELDS):
+            rows.append((sym,) + tuple(snap[c] for c in COLUMNS) + (now,))
+            done.append(sym)
+        else:
+            failed.append(sym)
+
+    cols = ", ".join(COLUMNS)
+    updates = ", ".join(f"{c}=EXCLUDED.{c}" for c in COLUMNS)
+    execute_batch(
+        f"""INSERT INTO FundamentalsSnapshot (symbol, {cols}, updated_at) VALUES %s
+            ON CONFLICT (symbol) DO UPDATE SET {updates}, updated_at=EXCLUDED.updated_at""", rows)
+    return done, failed
+
+def load_snapshots(symbols=None):
+    """كل اللقطات (أو لقائمة رموز) في استعلام واحد، مفهرسة بالرمز"""
+    if symbols is None:
+        df = fetch_query("SELECT * FROM FundamentalsSnapshot")
+    else:
+        df = fetch_query("SELECT * FROM FundamentalsSnapshot WHERE symbol = ANY(%s)", (list(symbols),))
+    return df.set_index('symbol') if not df.empty else df
+
+def get_snapshot(symbol):
+    df = load_snapshots([symbol])
+    return df.iloc[0].to_dict() if not df.empty else {}
+
+def stale_symbols(symbols, now=None):
+    """الرموز التي لا لقطة لها أو تجاوزت لقطتها SNAPSHOT_TTL"""
+    snaps = load_snapshots(symbols)
+    now = now or datetime.now()
+    if snaps.empty: return list(symbols)
+    updated = pd.to_datetime(snaps['updated_at'])
+    fresh = set(updated[updated >= now - SNAPSHOT_TTL].index)
+    return [s for s in symbols if s not in fresh]
+
+def refresh_stale_snapshots(symbols, max_workers=8):
+    stale = stale_symbols(symbols)
+    return refresh_snapshots(stale, max_workers) if stale else ([], [])
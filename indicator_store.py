@@ -0,0 +1,57 @@
+import json
+from database import execute_query, fetch_query
+from market_data import get_chart_history
+from indicators import IndicatorSet
+from scheduler import is_bar_complete
+
+# ============================================================
+# 💾 حفظ حالة المؤشرات المتدفقة مع بيانات الأسعار
+# عند وصول شمعة جديدة تُحدَّث الحالة بشمعة واحدة بدل إعادة حساب سنتين كاملتين
+# ============================================================
+
+def load_indicator_state(symbol):
+    df = fetch_query("SELECT state FROM IndicatorState WHERE symbol = %s", (symbol,))
+    if df.empty: return None
+    try:
+        return IndicatorSet.from_state(json.loads(df.iloc[0]['state']))
+    except Exception as e:
+        print(f"Indicator State Error ({symbol}): {e}")
+        return None
+
+def save_indicator_state(symbol, iset):
+    return execute_query(
+        """INSERT INTO IndicatorState (symbol, last_bar, state, updated_at) VALUES (%s, %s, %s, NOW())
+           ON CONFLICT (symbol) DO UPDATE SET last_bar=EXCLUDED.last_bar, state=EXCLUDED.state, updated_at=EXCLUDED.updated_at""",
+        (symbol, iset.last_bar, json.dumps(iset.to_state()))
+    )
+
+def refresh_streaming_indicators(symbol, df=None, period='2y'):
+    """
+    آخر قيم المؤشرات للسهم (شموع يومية) عند آخر شمعة في df: تُستكمل الحالة المحفوظة بالشموع الجديدة فقط.
+    إذا تغير سعر آخر شمعة محفوظة (تعديل توزيعات/تجزئة) أو لم تعد ضمن البيانات، يُعاد البناء من الصفر.
+    الشمعة الجزئية أثناء الجلسة تُضاف لنسخة مؤقتة ولا تُحفظ.
+    """
+    if df is None: df = get_chart_history(symbol, period=period)
+    if df is None or df.empty: return None
+
+    partial = None
+    if not is_bar_complete(df.index[-1]): df, partial = df.iloc[:-1], df.iloc[-1:]
+
+    dates = df.index.strftime('%Y-%m-%d')
+    iset = load_indicator_state(symbol)
+    new_bars = df
+    if iset is not None and iset.last_bar in dates:
+        pos = dates.get_loc(iset.last_bar)
+        if float(df['Close'].iloc[pos]) == iset.last_close:
+            new_bars = df.iloc[pos + 1:]
+        else:
+            iset = None
+    else:
+        iset = None
+
+    if iset is None: iset = IndicatorSet()
+    if not new_bars.empty:
+        iset.seed(new_bars)
+        save_indicator_state(symbol, iset)
+    if partial is not None: iset = IndicatorSet.from_state(iset.to_state()).seed(partial)
+    return iset.values()
@@ -0,0 +1,338 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# 📐 مكتبة المؤشرات الفنية الموحدة (مع ذاكرة مشتركة)
+# تعريف رقمي واحد لكل مؤشر يستخدمه: المختبر، الرسوم، المحرك الذكي، الاستراتيجيات
+# القيم المرجعة مشتركة بين المستهلكين: للقراءة فقط، لا تعدّلها في مكانها
+# ============================================================
+
+_CACHE = OrderedDict()
+_CACHE_MAX = 512
+_LOCK = threading.Lock()
+_STATS = {'hits': 0, 'misses': 0}
+
+def series_fingerprint(obj):
+    """بصمة سريعة للسلسلة (القيم + حدود الفهرس) لاستخدامها كمفتاح في الذاكرة"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(obj.to_numpy(dtype=float)).tobytes())
+    if len(obj): h.update(f"{len(obj)}|{obj.index[0]}|{obj.index[-1]}".encode())
+    if isinstance(obj, pd.DataFrame): h.update("|".join(map(str, obj.columns)).encode())
+    return h.hexdigest()
+
+def _memoized(name, obj, params, compute):
+    key = (series_fingerprint(obj), name, params)
+    with _LOCK:
+        if key in _CACHE:
+            _CACHE.move_to_end(key); _STATS['hits'] += 1
+            return _CACHE[key]
+    out = compute()
+    with _LOCK:
+        _CACHE[key] = out; _STATS['misses'] += 1
+        while len(_CACHE) > _CACHE_MAX: _CACHE.popitem(last=False)
+    return out
+
+def clear_cache():
+    with _LOCK:
+        _CACHE.clear(); _STATS.update(hits=0, misses=0)
+
+def cache_info():
+    with _LOCK:
+        return {'size': len(_CACHE), **_STATS}
+
+# ==============================
+# 📏 التعريفات الرقمية
+# ==============================
+
+def sma(s, n):
+    """المتوسط البسيط: متوسط آخر n قيم (NaN حتى اكتمال النافذة)"""
+    return _memoized('sma', s, (n,), lambda: s.rolling(n).mean())
+
+def ema(s, span):
+    """المتوسط الأسي: alpha = 2/(span+1)، تكراري بدون تعديل (adjust=False) ويبدأ من أول قيمة"""
+    return _memoized('ema', s, (span,), lambda: s.ewm(span=span, adjust=False).mean())
+
+def rolling_std(s, n):
+    """الانحراف المعياري المتحرك للعينة (ddof=1)"""
+    return _memoized('std', s, (n,), lambda: s.rolling(n).std())
+
+def rsi(s, period=14):
+    """
+    مؤشر القوة النسبية بتنعيم وايلدر: alpha = 1/period، adjust=False.
+    المكسب/الخسارة للشمعة الأولى = 0 لذا أول قيمة NaN (0/0).
+    """
+    def compute():
+        delta = s.diff()
+        gain = (delta.where(delta > 0, 0)).ewm(alpha=1/period, adjust=False).mean()
+        loss = (-delta.where(delta < 0, 0)).ewm(alpha=1/period, adjust=False).mean()
+        return 100 - (100 / (1 + gain / loss))
+    return _memoized('rsi', s, (period,), compute)
+
+def macd(s, fast=12, slow=26, signal=9):
+    """الماكد = EMA(fast) - EMA(slow)، خط الإشارة = EMA(signal) للماكد، الهستوجرام = الفرق بينهما"""
+    def compute():
+        line = ema(s, fast) - ema(s, slow)
+        sig = ema(line, signal)
+        return pd.DataFrame({'MACD': line, 'Signal': sig, 'Hist': line - sig})
+    return _memoized('macd', s, (fast, slow, signal), compute)
+
+def bollinger(s, n=20, k=2):
+    """بولنجر: الوسط = SMA(n)، الحدود = الوسط ± k × الانحراف المعياري (ddof=1)"""
+    def compute():
+        mid, std = sma(s, n), rolling_std(s, n)
+        return pd.DataFrame({'Mid': mid, 'Upper': mid + std * k, 'Lower': mid - std * k, 'STD': std})
+    return _memoized('bollinger', s, (n, k), compute)
+
+def volume_avg(volume, n=20):
+    """متوسط الحجم المتحرك (نفس تعريف SMA)"""
+    return sma(volume, n)
+
+# ============================================================
+# 🗂️ مؤشرات اللوحة المقطعية (تواريخ × رموز) لكل السوق في تمريرة واحدة
+# sma / ema / rolling_std / rsi أعلاه تعمل على DataFrame مباشرة (عمود لكل سهم)
+# ============================================================
+
+def panel_macd(close_panel, fast=12, slow=26, signal=9):
+    """نفس تعريف macd() لكن يُرجع dict من ثلاث لوحات بدل أعمدة"""
+    def compute():
+        line = ema(close_panel, fast) - ema(close_panel, slow)
+        sig = ema(line, signal)
+        return {'MACD': line, 'Signal': sig, 'Hist': line - sig}
+    return _memoized('panel_macd', close_panel, (fast, slow, signal), compute)
+
+def volume_ratio(volume, n=20):
+    """حجم اليوم ÷ متوسط الحجم (يعمل على سلسلة أو لوحة)"""
+    return _memoized('vol_ratio', volume, (n,), lambda: volume / volume_avg(volume, n).replace(0, np.nan))
+
+def panel_snapshot(close_panel, volume_panel):
+    """
+    صورة السوق لآخر يوم: صف لكل رمز بالسعر والمتوسطات وRSI والماكد ونسبة الحجم.
+    كل مؤشر يُحسب مرة واحدة على كامل اللوحة (متجه عبر الرموز) ثم يؤخذ آخر صف.
+    """
+    close_panel = close_panel.sort_index()
+    volume_panel = volume_panel.reindex_like(close_panel)
+    last = lambda p: p.ffill().iloc[-1]
+    m = panel_macd(close_panel)
+    snap = pd.DataFrame({
+        'Close': last(close_panel),
+        'SMA_20': last(sma(close_panel, 20)),
+        'SMA_50': last(sma(close_panel, 50)),
+        'SMA_200': last(sma(close_panel, 200)),
+        'RSI': last(rsi(close_panel, 14)),
+        'MACD': last(m['MACD']),
+        'MACD_Signal': last(m['Signal']),
+        'MACD_Hist': last(m['Hist']),
+        'Vol_Ratio': last(volume_ratio(volume_panel, 20)),
+    })
+    snap['Above_SMA50'] = snap['Close'] > snap['SMA_50']
+    snap['Above_SMA200'] = snap['Close'] > snap['SMA_200']
+    snap.index.name = 'symbol'
+    return snap
+
+# ============================================================
+# 🔁 المؤشرات المتدفقة (تحديث شمعة بشمعة بتكلفة ثابتة O(1))
+# تكرر نفس خوارزميات pandas التراكمية (جمع كاهان / ويلفورد / EWM بدون تعديل)
+# لذلك تطابق النسخ الدفعية أعلاه رقماً برقم، وحالتها قابلة للحفظ كـ JSON
+# ============================================================
+
+_NAN = float('nan')
+
+class StreamingSMA:
+    """مطابق لـ rolling(n).mean()"""
+    def __init__(self, n):
+        self.n = n; self.window = deque(); self.nobs = 0; self.neg_ct = 0
+        self.sum_x = 0.0; self.comp_add = 0.0; self.comp_remove = 0.0
+        self.same_ct = 0; self.prev_value = _NAN; self.value = _NAN
+
+    def update(self, x):
+        x = float(x)
+        if len(self.window) == 0: self.prev_value = x
+        if len(self.window) == self.n:
+            old = self.window.popleft()
+            if old == old:
+                self.nobs -= 1
+                y = -old - self.comp_remove; t = self.sum_x + y
+                self.comp_remove = t - self.sum_x - y; self.sum_x = t
+                if math.copysign(1, old) < 0: self.neg_ct -= 1
+        self.window.append(x)
+        if x == x:
+            self.nobs += 1
+            y = x - self.comp_add; t = self.sum_x + y
+            self.comp_add = t - self.sum_x - y; self.sum_x = t
+            if math.copysign(1, x) < 0: self.neg_ct += 1
+            self.same_ct = self.same_ct + 1 if x == self.prev_value else 1
+            self.prev_value = x
+        if self.nobs >= self.n:
+            res = self.sum_x / self.nobs
+            if self.same_ct >= self.nobs: res = self.prev_value
+            elif self.neg_ct == 0 and res < 0: res = 0.0
+            elif self.neg_ct == self.nobs and res > 0: res = 0.0
+            self.value = res
+        else:
+            self.value = _NAN
+        return self.value
+
+class StreamingSTD:
+    """مطابق لـ rolling(n).std() (ddof=1)"""
+    def __init__(self, n):
+        self.n = n; self.window = deque(); self.nobs = 0
+        self.mean_x = 0.0; self.ssqdm_x = 0.0; self.comp_add = 0.0; self.comp_remove = 0.0
+        self.same_ct = 0; self.prev_value = _NAN; self.value = _NAN
+
+    def update(self, x):
+        x = float(x)
+        if len(self.window) == 0: self.prev_value = x
+        if len(self.window) == self.n:
+            old = self.window.popleft()
+            if old == old:
+                self.nobs -= 1
+                if self.nobs:
+                    prev_mean = self.mean_x - self.comp_remove
+                    y = old - self.comp_remove; t = y - self.mean_x
+                    self.comp_remove = t + self.mean_x - y
+                    self.mean_x = self.mean_x - t / self.nobs
+                    self.ssqdm_x = self.ssqdm_x - (old - prev_mean) * (old - self.mean_x)
+                else:
+                    self.mean_x = 0.0; self.ssqdm_x = 0.0
+        self.window.append(x)
+        if x == x:
+            self.nobs += 1
+            self.same_ct = self.same_ct + 1 if x == self.prev_value else 1
+            self.prev_value = x
+            prev_mean = self.mean_x - self.comp_add
+            y = x - self.comp_add; t = y - self.mean_x
+            self.comp_add = t + self.mean_x - y
+            self.mean_x = self.mean_x + t / self.nobs
+            self.ssqdm_x = self.ssqdm_x + (x - prev_mean) * (x - self.mean_x)
+        if self.nobs >= self.n and self.nobs > 1:
+            var = 0.0 if self.same_ct >= self.nobs else self.ssqdm_x / (self.nobs - 1.0)
+            self.value = math.sqrt(var) if var >= 0 else 0.0
+        else:
+            self.value = _NAN
+        return self.value
+
+class StreamingEMA:
+    """مطابق لـ ewm(alpha=..., adjust=False).mean()"""
+    def __init__(self, span=None, alpha=None):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1.0)
+        self.old_wt = 1.0; self.value = _NAN
+
+    def update(self, x):
+        x = float(x)
+        w = self.value
+        if w == w:
+            self.old_wt *= (1.0 - self.alpha)
+            if x == x:
+                if w != x:
+                    w = self.old_wt * w + self.alpha * x
+                    w /= (self.old_wt + self.alpha)
+                self.old_wt = 1.0
+        elif x == x:
+            w = x
+        self.value = w
+        return w
+
+class StreamingRSI:
+    """مطابق لـ rsi(): تنعيم وايلدر للمكاسب والخسائر"""
+    def __init__(self, period=14):
+        self.period = period; self.prev_close = _NAN
+        self.gain = StreamingEMA(alpha=1.0 / period); self.loss = StreamingEMA(alpha=1.0 / period)
+        self.value = _NAN
+
+    def update(self, close):
+        close = float(close)
+        delta = close - self.prev_close
+        self.prev_close = close
+        g = self.gain.update(delta if delta > 0 else 0.0)
+        l = self.loss.update(-(delta if delta < 0 else 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.value = float(100 - (100 / (1 + np.float64(g) / np.float64(l))))
+        return self.value
+
+class StreamingMACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(fast); self.slow = StreamingEMA(slow); self.sig = StreamingEMA(signal)
+        self.value = {'MACD': _NAN, 'Signal': _NAN, 'Hist': _NAN}
+
+    def update(self, close):
+        line = self.fast.update(close) - self.slow.update(close)
+        sig = self.sig.update(line)
+        self.value = {'MACD': line, 'Signal': sig, 'Hist': line - sig}
+        return self.value
+
+class StreamingBollinger:
+    def __init__(self, n=20, k=2):
+        self.k = k; self.mid = StreamingSMA(n); self.std = StreamingSTD(n)
+        self.value = {'Mid': _NAN, 'Upper': _NAN, 'Lower': _NAN, 'STD': _NAN}
+
+    def update(self, close):
+        mid, std = self.mid.update(close), self.std.update(close)
+        self.value = {'Mid': mid, 'Upper': mid + std * self.k, 'Lower': mid - std * self.k, 'STD': std}
+        return self.value
+
+_STREAM_TYPES = {c.__name__: c for c in [StreamingSMA, StreamingSTD, StreamingEMA, StreamingRSI, StreamingMACD, StreamingBollinger]}
+
+def _dump(obj):
+    if type(obj).__name__ in _STREAM_TYPES:
+        return {'__type__': type(obj).__name__, **{k: _dump(v) for k, v in vars(obj).items()}}
+    if isinstance(obj, deque): return {'__deque__': list(obj)}
+    return obj
+
+def _load(data):
+    if isinstance(data, dict) and '__type__' in data:
+        obj = _STREAM_TYPES[data['__type__']].__new__(_STREAM_TYPES[data['__type__']])
+        for k, v in data.items():
+            if k != '__type__': setattr(obj, k, _load(v))
+        return obj
+    if isinstance(data, dict) and '__deque__' in data: return deque(data['__deque__'])
+    return data
+
+class IndicatorSet:
+    """
+    الحزمة القياسية التي تستخدمها الرسوم والمحرك الذكي والمختبر:
+    SMA 20/50/200، RSI 14، MACD 12/26/9، بولنجر 20، متوسط الحجم 20
+    """
+    def __init__(self):
+        self.streams = {
+            'SMA_20': StreamingSMA(20), 'SMA_50': StreamingSMA(50), 'SMA_200': StreamingSMA(200),
+            'RSI': StreamingRSI(14), 'MACD': StreamingMACD(12, 26, 9), 'BB': StreamingBollinger(20, 2),
+            'Vol_Avg_20': StreamingSMA(20),
+        }
+        self.last_bar = None
+        self.last_close = _NAN
+
+    def update(self, bar_date, bar):
+        """إضافة شمعة واحدة (dict أو Series فيه Close و Volume)"""
+        close = bar['Close']
+        for key, s in self.streams.items():
+            s.update(bar['Volume'] if key == 'Vol_Avg_20' else close)
+        self.last_bar = str(bar_date)[:10]
+        self.last_close = float(close)
+        return self.values()
+
+    def seed(self, df):
+        for d, row in zip(df.index, df[['Close', 'Volume']].to_dict('records')):
+            self.update(d, row)
+        return self
+
+    def values(self):
+        out = {}
+        for key, s in self.streams.items():
+            if isinstance(s.value, dict): out.update({(k if k == key else f"{key}_{k}"): v for k, v in s.value.items()})
+            else: out[key] = s.value
+        return out
+
+    def to_state(self):
+        return {'last_bar': self.last_bar, 'last_close': self.last_close,
+                'streams': {k: _dump(v) for k, v in self.streams.items()}}
+
+    @classmethod
+    def from_state(cls, state):
+        obj = cls.__new__(cls)
+        obj.last_bar = state.get('last_bar'); obj.last_close = state.get('last_close', _NAN)
+        obj.streams = {k: _load(v) for k, v in state['streams'].items()}
+        return obj
@@ -4,6 +4,8 @@ import streamlit as st
 import yfinance as yf
 import pandas as pd
 import time
+import threading
+from profiler import profiled, mark_cache_miss
 
 # ==============================
 # 🛠️ Helpers & Configuration
@@ -46,9 +48,11 @@ def fetch_price_from_google(symbol):
         pass
     return 0.0
 
+@profiled('fetch', cache=True)
 @st.cache_data(ttl=300, show_spinner=False)
 def get_tasi_data():
     """جلب بيانات المؤشر العام (كاش لمدة 5 دقائق)"""
+    mark_cache_miss()
     # 1. محاولة Yahoo
     try:
         tick = yf.Ticker("^TASI.SR")
@@ -65,9 +69,11 @@ def get_tasi_data():
     price = fetch_price_from_google(".TASI")
     return price, 0.0
 
+@profiled('fetch', cache=True, detail=lambda a: a[0])
 @st.cache_data(ttl=3600, show_spinner=False)
 def get_chart_history(symbol, period='1y', interval='1d'):
     """جلب الشارت التاريخي (كاش لمدة ساعة كاملة)"""
+    mark_cache_miss()
     try:
         t = yf.Ticker(get_ticker_symbol(symbol))
         df = t.history(period=period, interval=interval)
@@ -75,9 +81,35 @@ def get_chart_history(symbol, period='1y', interval='1d'):
     except:
         return None
 
-@st.cache_data(ttl=60, show_spinner=False)
-def fetch_batch_data(symbols_list):
-    """جلب أسعار مجموعة أسهم دفعة واحدة (كاش لمدة دقيقة)"""
+@profiled('fetch', cache=True, detail=lambda a: f"{len(a[0])} رمز")
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_price_panel(symbols, period='1y', interval='1d'):
+    """
+    جلب تاريخ مجموعة أسهم بطلب واحد وإرجاع لوحات (تواريخ × رموز) لكل حقل:
+    {'Open': df, 'High': df, 'Low': df, 'Close': df, 'Volume': df}
+    symbols يجب أن تكون tuple لتعمل مع الكاش
+    """
+    mark_cache_miss()
+    if not symbols: return {}
+    tickers = [get_ticker_symbol(s) for s in symbols]
+    try:
+        raw = yf.download(tickers, period=period, interval=interval, group_by='column',
+                          auto_adjust=True, threads=True, progress=False)
+    except Exception:
+        return {}
+    if raw is None or raw.empty: return {}
+
+    panels = {}
+    for field in ['Open', 'High', 'Low', 'Close', 'Volume']:
+        if field not in raw.columns.get_level_values(0): continue
+        p = raw[field]
+        if isinstance(p, pd.Series): p = p.to_frame(tickers[0])
+        p = p.rename(columns=lambda c: str(c).replace('.SR', ''))
+        panels[field] = p.dropna(how='all', axis=1)
+    return panels
+
+def _fetch_quotes(symbols_list):
+    """جلب أسعار مجموعة أسهم دفعة واحدة من المصدر (بدون كاش)"""
     results = {}
     if not symbols_list: return results
     
@@ -114,15 +146,41 @@ def fetch_batch_data(symbols_list):
 
     # 2. تعبئة النواقص من Google
     for sym_raw in symbols_list:
-        if sym_raw not in results:
+        if quote_key(sym_raw) not in results:
             p = fetch_price_from_google(sym_raw)
             if p > 0:
-                results[sym_raw] = {
+                results[quote_key(sym_raw)] = {
                     'price': p, 'prev_close': p, 'year_high': 0, 'year_low': 0
                 }
     
     return results
 
+QUOTE_TTL = 60   # ثانية
+
+def quote_key(symbol):
+    return get_ticker_symbol(symbol).replace('.SR', '')
+
+@st.cache_resource
+def _quote_store():
+    """مخزن أسعار مشترك بين كل الجلسات: {الرمز: (البيانات، وقت الجلب)}"""
+    return {'quotes': {}, 'lock': threading.Lock()}
+
+@profiled('fetch', cache=True, detail=lambda a: f"{len(a[0])} رمز")
+def fetch_batch_data(symbols_list, max_age=QUOTE_TTL):
+    """أسعار مجموعة أسهم من المخزن المشترك؛ لا يُجلب من المصدر إلا ما تجاوز عمره max_age ثانية"""
+    if not symbols_list: return {}
+    store, now = _quote_store(), time.time()
+    keys = {s: quote_key(s) for s in symbols_list}
+    with store['lock']:
+        stale = [s for s, k in keys.items() if k not in store['quotes'] or now - store['quotes'][k][1] > max_age]
+    if stale:
+        mark_cache_miss(fetched=len(stale))
+        fresh = _fetch_quotes(stale)
+        with store['lock']:
+            for k, info in fresh.items(): store['quotes'][k] = (info, now)
+    with store['lock']:
+        return {k: dict(store['quotes'][k][0]) for k in keys.values() if k in store['quotes']}
+
 def get_static_info(symbol):
     try:
         from data_source import get_company_details
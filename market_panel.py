@@ -0,0 +1,34 @@
+import pandas as pd
+from data_source import TADAWUL_DB
+from market_data import get_price_panel
+import indicators as ind
+
+# ============================================================
+# 🌐 السوق كاملاً في تمريرة واحدة: أساس الماسح ولوحات القطاعات
+# ============================================================
+
+def get_market_panel(symbols=None, period='1y'):
+    """لوحات الأسعار لكل رموز TADAWUL_DB (أو قائمة محددة) بطلب تنزيل واحد"""
+    symbols = tuple(sorted(symbols)) if symbols else tuple(sorted(TADAWUL_DB))
+    return get_price_panel(symbols, period)
+
+def market_snapshot(symbols=None, period='1y'):
+    """صف لكل سهم بآخر قيم المؤشرات مع الاسم والقطاع"""
+    panels = get_market_panel(symbols, period)
+    if not panels or 'Close' not in panels: return pd.DataFrame()
+    snap = ind.panel_snapshot(panels['Close'], panels.get('Volume', pd.DataFrame()))
+    snap['name'] = [TADAWUL_DB.get(s, {}).get('name', s) for s in snap.index]
+    snap['sector'] = [TADAWUL_DB.get(s, {}).get('sector', 'غير معروف') for s in snap.index]
+    return snap
+
+def sector_breadth(snapshot):
+    """اتساع السوق لكل قطاع: عدد الأسهم، نسبة من فوق متوسط 50/200، وسيط RSI ونسبة الحجم"""
+    if snapshot is None or snapshot.empty: return pd.DataFrame()
+    g = snapshot.groupby('sector')
+    return pd.DataFrame({
+        'count': g.size(),
+        'pct_above_sma50': g['Above_SMA50'].mean() * 100,
+        'pct_above_sma200': g['Above_SMA200'].mean() * 100,
+        'median_rsi': g['RSI'].median(),
+        'median_vol_ratio': g['Vol_Ratio'].median(),
+    }).sort_values('pct_above_sma50', ascending=False)
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+from backtester import COMMISSION
+
+# ============================================================
+# 🎲 محاكاة مونت كارلو: هل نتيجة الاختبار الخلفي مهارة أم حظ؟
+# ============================================================
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+def extract_daily_returns(bt_result):
+    """العوائد اليومية لمنحنى قيمة المحفظة الناتج من run_backtest"""
+    if not bt_result or 'df' not in bt_result: return np.array([])
+    pv = bt_result['df']['Portfolio_Value'].astype(float)
+    return pv.pct_change().replace([np.inf, -np.inf], np.nan).dropna().to_numpy()
+
+def extract_trade_returns(trades_log):
+    """عائد كل صفقة مكتملة (شراء ثم بيع) بعد العمولة"""
+    if trades_log is None or trades_log.empty: return np.array([])
+    buys = trades_log[trades_log['Type'] == 'Buy']['Price'].to_numpy(dtype=float)
+    sells = trades_log[trades_log['Type'] == 'Sell']['Price'].to_numpy(dtype=float)
+    n = min(len(buys), len(sells)) # الصفقة المفتوحة الأخيرة لا تُحسب
+    if n == 0: return np.array([])
+    return (sells[:n] * (1 - COMMISSION)) / (buys[:n] * (1 + COMMISSION)) - 1
+
+def _resample_indices(rng, n_obs, n_paths, horizon, block_size=1):
+    """
+    فهارس إعادة المعاينة لكل المسارات دفعة واحدة.
+    block_size > 1 = Block Bootstrap دائري للحفاظ على تتابع العوائد (التقلب المتجمع)
+    """
+    if block_size <= 1:
+        return rng.integers(0, n_obs, size=(n_paths, horizon))
+    n_blocks = -(-horizon // block_size)
+    starts = rng.integers(0, n_obs, size=(n_paths, n_blocks, 1))
+    idx = (starts + np.arange(block_size)) % n_obs
+    return idx.reshape(n_paths, -1)[:, :horizon]
+
+def simulate_paths(returns, capital, n_paths=10000, horizon=None, block_size=1, seed=None):
+    """مصفوفة مسارات القيمة (n_paths × horizon) من عوائد معاد معاينتها"""
+    returns = np.asarray(returns, dtype=float)
+    if returns.size == 0: return np.empty((0, 0))
+    horizon = horizon or returns.size
+    block_size = max(1, min(int(block_size), returns.size))
+    rng = np.random.default_rng(seed)
+    idx = _resample_indices(rng, returns.size, n_paths, horizon, block_size)
+    return capital * np.cumprod(1.0 + returns[idx], axis=1)
+
+def _max_drawdowns(paths, capital):
+    """أقصى تراجع لكل مسار (نسبة موجبة) مع احتساب رأس المال الابتدائي كقمة أولى"""
+    peaks = np.maximum(np.maximum.accumulate(paths, axis=1), capital)
+    return (1.0 - paths / peaks).max(axis=1)
+
+def run_monte_carlo(bt_result, capital=100000, n_paths=10000, method='block', source='daily',
+                    block_size=20, ruin_level=0.5, seed=None):
+    """
+    تحليل المتانة لنتيجة run_backtest.
+    method: 'bootstrap' (عشوائي بسيط) أو 'block' (كتل متتالية)
+    source: 'daily' (العوائد اليومية) أو 'trades' (سجل الصفقات)
+    ruin_level: نسبة رأس المال التي يُعتبر النزول تحتها "إفلاساً"
+    """
+    if source == 'trades':
+        returns = extract_trade_returns(bt_result.get('trades_log') if bt_result else None)
+    else:
+        returns = extract_daily_returns(bt_result)
+    if returns.size < 2: return None
+
+    bs = block_size if method == 'block' else 1
+    paths = simulate_paths(returns, capital, n_paths=n_paths, block_size=bs, seed=seed)
+    final_values = paths[:, -1]
+    max_dd = _max_drawdowns(paths, capital)
+    ruined = paths.min(axis=1) <= capital * ruin_level
+
+    final_ret = (final_values / capital - 1) * 100
+    pct = pd.DataFrame({
+        'final_value': np.percentile(final_values, PERCENTILES),
+        'return_pct': np.percentile(final_ret, PERCENTILES),
+        'max_drawdown_pct': np.percentile(max_dd * 100, PERCENTILES),
+    }, index=[f"P{p}" for p in PERCENTILES])
+
+    return {
+        'method': method, 'source': source, 'n_paths': int(n_paths), 'horizon': int(paths.shape[1]),
+        'final_values': final_values,
+        'max_drawdowns': max_dd,
+        'prob_ruin': float(ruined.mean()),
+        'prob_loss': float((final_values < capital).mean()),
+        'percentiles': pct,
+    }
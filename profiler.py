@@ -0,0 +1,141 @@
+import functools
+import html
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import streamlit as st
+
+# ============================================================
+# 🔬 محلل الأداء لكل تشغيل للصفحة (للمشرفين فقط، عند التفعيل)
+# يسجل زمن كل دالة عرض، وكل جلب بيانات (مع إصابة/فوات الكاش)،
+# وكل استعلام، وكل حساب ثقيل، ويعرضها كمخطط لهب أسفل الصفحة
+# عند عدم التفعيل كل نقطة قياس تكلف فحص متغير واحد فقط
+# ============================================================
+
+PROFILE_LOG = Path("profiles") / "profile.jsonl"
+KIND_COLORS = {'render': '#0052CC', 'fetch': '#D97706', 'db': '#7C3AED', 'compute': '#059669'}
+
+_local = threading.local()   # مسجل التشغيل الحالي (كل تشغيل للصفحة في خيط مستقل)
+
+def admin_users():
+    try: users = st.secrets.get("ADMIN_USERS", [])
+    except Exception: users = []
+    return [u.strip() for u in users.split(',')] if isinstance(users, str) else list(users)
+
+def is_admin(username=None):
+    username = username or st.session_state.get('username')
+    return bool(username) and username in admin_users()
+
+def profiling_enabled():
+    return bool(st.session_state.get('profiler_on')) and is_admin()
+
+# ==============================
+# ⏱️ نقاط القياس
+# ==============================
+
+@contextmanager
+def span(name, kind='compute', **meta):
+    rec = getattr(_local, 'rec', None)
+    if rec is None:
+        yield None
+        return
+    entry = {'name': name, 'kind': kind, 'depth': rec['depth'], 'start': (time.perf_counter() - rec['t0']) * 1000, **meta}
+    rec['depth'] += 1
+    rec['stack'].append(entry)
+    try:
+        yield entry
+    finally:
+        rec['stack'].pop()
+        rec['depth'] -= 1
+        entry['ms'] = (time.perf_counter() - rec['t0']) * 1000 - entry['start']
+        rec['spans'].append(entry)
+
+def profiled(kind='compute', name=None, cache=False, detail=None):
+    """
+    مزخرف لقياس دالة. cache=True: يُسجل 'hit' إلا إذا استُدعي mark_cache_miss داخل الدالة المخزنة.
+    detail(args) نص إضافي للسجل (مثل بداية الاستعلام).
+    """
+    def deco(fn):
+        label = name or fn.__name__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, 'rec', None) is None: return fn(*args, **kwargs)
+            meta = {'cache': 'hit'} if cache else {}
+            if detail:
+                try: meta['detail'] = str(detail(args))[:120]
+                except Exception: pass
+            with span(label, kind, **meta):
+                return fn(*args, **kwargs)
+        if hasattr(fn, 'clear'): wrapper.clear = fn.clear   # مسح مفتاح محدد من الكاش عبر الغلاف
+        return wrapper
+    return deco
+
+def mark_cache_miss(**meta):
+    """يُستدعى داخل جسم دالة مخزنة (لا يُنفذ إلا عند فوات الكاش)"""
+    rec = getattr(_local, 'rec', None)
+    if rec and rec['stack']: rec['stack'][-1].update(cache='miss', **meta)
+
+# ==============================
+# 📊 التشغيل والعرض
+# ==============================
+
+@contextmanager
+def profiled_run(page):
+    """يغلّف عرض الصفحة؛ إذا كان المحلل مفعلاً يعرض المخطط بعدها ويحفظ السجل إن طُلب"""
+    if not profiling_enabled():
+        yield
+        return
+    _local.rec = {'t0': time.perf_counter(), 'depth': 0, 'stack': [], 'spans': []}
+    try:
+        with span(page, 'render'):
+            yield
+    finally:
+        rec, _local.rec = _local.rec, None
+        spans = sorted(rec['spans'], key=lambda s: (s['start'], s['depth']))
+        render_flame(spans)
+        if st.session_state.get('profiler_jsonl'): append_jsonl(page, spans)
+
+def append_jsonl(page, spans, path=PROFILE_LOG):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = {'ts': datetime.now().isoformat(timespec='seconds'), 'user': st.session_state.get('username'),
+            'page': page, 'spans': [{k: (round(v, 2) if isinstance(v, float) else v) for k, v in s.items()} for s in spans]}
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+def summarize(spans):
+    """إجمالي الزمن والعدد لكل نوع، مع إصابات وفوات الكاش"""
+    out = {}
+    for s in spans:
+        if s['depth'] == 0: continue
+        k = out.setdefault(s['kind'], {'count': 0, 'ms': 0.0, 'hits': 0, 'misses': 0})
+        k['count'] += 1; k['ms'] += s['ms']
+        if s.get('cache') == 'hit': k['hits'] += 1
+        elif s.get('cache') == 'miss': k['misses'] += 1
+    return out
+
+def render_flame(spans):
+    if not spans: return
+    total = max(s['start'] + s['ms'] for s in spans) or 1.0
+    rows = max(s['depth'] for s in spans) + 1
+    bars = []
+    for s in spans:
+        left, width = s['start'] / total * 100, max(s['ms'] / total * 100, 0.3)
+        tip = f"{s['name']} · {s['ms']:.1f}ms" + (f" · {s['cache']}" if 'cache' in s else "") + (f" · {s['detail']}" if 'detail' in s else "")
+        label = html.escape(s['name']) if width > 6 else ""
+        bars.append(
+            f'<div title="{html.escape(tip)}" style="position:absolute;top:{s["depth"] * 22}px;left:{left:.2f}%;width:{width:.2f}%;'
+            f'height:20px;background:{KIND_COLORS.get(s["kind"], "#64748B")};color:white;font-size:11px;overflow:hidden;'
+            f'white-space:nowrap;border-radius:3px;padding:0 4px;direction:ltr;">{label}</div>')
+    legend = " ".join(f'<span style="color:{c};font-weight:800;">■ {k}</span>' for k, c in KIND_COLORS.items())
+    st.markdown("---")
+    st.markdown(f"**🔬 المحلل: {total:.0f}ms** &nbsp; {legend}", unsafe_allow_html=True)
+    st.markdown(f'<div style="position:relative;height:{rows * 22}px;direction:ltr;">{"".join(bars)}</div>', unsafe_allow_html=True)
+    summary = summarize(spans)
+    if summary:
+        cols = st.columns(len(summary))
+        for col, (kind, v) in zip(cols, summary.items()):
+            extra = f" · كاش {v['hits']}/{v['hits'] + v['misses']}" if v['hits'] + v['misses'] else ""
+            col.caption(f"{kind}: {v['count']} × {v['ms']:.0f}ms{extra}")
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from data_source import TADAWUL_DB
+from database import execute_batch, fetch_query, fetch_table
+
+# ============================================================
+# 🧮 محرك النسب المالية: Piotroski كامل (9 معايير) + ROA/ROE
+# والسيولة والرافعة والمستحقات لكل الأسهم وكل الفترات في تمريرة
+# واحدة مجمّعة (groupby + shift) بدل حلقات على كل سهم
+# ============================================================
+
+STATEMENT_COLUMNS = [
+    'revenue', 'gross_profit', 'net_income', 'total_assets', 'total_liabilities', 'total_equity',
+    'operating_cash_flow', 'current_assets', 'current_liabilities', 'long_term_debt', 'shares_outstanding'
+]
+RATIO_COLUMNS = ['roa', 'roe', 'current_ratio', 'leverage', 'accruals', 'gross_margin', 'asset_turnover']
+F_COLUMNS = [f'f{i}' for i in range(1, 10)]
+F_LABELS = {
+    'f1': 'صافي ربح موجب', 'f2': 'تدفق تشغيلي موجب', 'f3': 'تحسن العائد على الأصول',
+    'f4': 'التدفق التشغيلي يفوق الربح', 'f5': 'انخفاض الرافعة', 'f6': 'تحسن السيولة الجارية',
+    'f7': 'لا إصدار أسهم جديدة', 'f8': 'تحسن الهامش الإجمالي', 'f9': 'تحسن دوران الأصول',
+}
+F_MIN_AVAILABLE = 7   # أقل عدد معايير محسوبة فعلاً ليُعتد بالنتيجة (سهم بفترة واحدة يُحسب له 3 فقط)
+# المقارنة بالفترة المماثلة: السنة السابقة، أو نفس الربع من العام السابق
+LAGS = {'Annual': 1, 'Quarterly': 4, 'TTM': 4}
+# بنود التدفق تُجمع لآخر 4 أرباع؛ بنود المركز المالي تؤخذ من آخر ربع
+FLOW_COLUMNS = ['revenue', 'gross_profit', 'net_income', 'operating_cash_flow']
+TTM_MAX_SPAN_DAYS = 300   # أول وآخر ربع في النافذة: ~273 يوماً إذا كانت الأرباع متتالية
+YOY_SPAN_DAYS = (330, 400)   # الفترة المقارنة (بعد الإزاحة) يجب أن تبعد سنة تقريباً، وإلا فهناك فترة ناقصة
+# بنود لا تكون صفراً فعلياً: الصفر فيها (من السجلات القديمة) يعني "غير متوفر"
+ZERO_MEANS_MISSING = ['revenue', 'gross_profit', 'net_income', 'total_assets', 'total_equity', 'operating_cash_flow',
+                      'current_assets', 'current_liabilities', 'shares_outstanding']
+
+def _div(a, b):
+    return a / b.where(b != 0)
+
+def _prepare(statements, period_type):
+    """القوائم مرتبة مع NaN للبند غير المتوفر (لا تُملأ بالصفر حتى لا يُحسب المعيار كأنه متوفر)"""
+    if statements is None or statements.empty: return pd.DataFrame(columns=['symbol', 'date', 'period_type'] + STATEMENT_COLUMNS)
+    df = statements[statements['period_type'] == period_type].copy()
+    df['date'] = pd.to_datetime(df['date'])
+    for c in STATEMENT_COLUMNS:
+        df[c] = pd.to_numeric(df[c], errors='coerce') if c in df.columns else np.nan
+    df[ZERO_MEANS_MISSING] = df[ZERO_MEANS_MISSING].where(df[ZERO_MEANS_MISSING] != 0)
+    # دين طويل الأجل صفري مقبول فقط إذا كانت المطلوبات مذكورة (شركة بلا ديون فعلاً)
+    df['long_term_debt'] = df['long_term_debt'].where((df['long_term_debt'] != 0) | (df['total_liabilities'] > 0))
+    return df.sort_values(['symbol', 'date']).reset_index(drop=True)
+
+def _lagged(df, by, cols, lag):
+    """قيم الفترة المماثلة السابقة (إزاحة lag)، و NaN إذا لم تبعد سنة تقريباً (فترة ناقصة بينهما)"""
+    span = (df['date'] - by['date'].shift(lag)).dt.days
+    return by[cols].shift(lag).where(span.between(*YOY_SPAN_DAYS), axis=0)
+
+def ttm_statements(statements):
+    """
+    قوائم "آخر اثني عشر شهراً" لكل ربع لديه 3 أرباع متتالية قبله، لكل الأسهم دفعة واحدة.
+    يرجع صفوفاً بنفس أعمدة FinancialStatements و period_type = 'TTM'.
+    """
+    q = _prepare(statements, 'Quarterly')
+    if q.empty: return q.assign(period_type='TTM')
+    by = q.groupby('symbol', sort=False)
+    flows = by[FLOW_COLUMNS].rolling(4, min_periods=4).sum().reset_index(level=0, drop=True)
+    consecutive = (q['date'] - by['date'].shift(3)).dt.days <= TTM_MAX_SPAN_DAYS
+    out = q.copy()
+    out[FLOW_COLUMNS] = flows[FLOW_COLUMNS]
+    out['period_type'] = 'TTM'
+    return out[consecutive].reset_index(drop=True)
+
+def compute_ratio_panel(statements, period_type='Annual'):
+    """
+    لوحة النسب لكل (سهم، فترة). البند غير المتوفر NaN (انظر _prepare)، والمقارنة بفترة لا تبعد سنة تُعد غير متوفرة؛
+    والمعيار الذي لا تتوفر بياناته يُحسب صفراً (f_available يوضح عدد المعايير المحسوبة فعلاً).
+    """
+    df = _prepare(statements, period_type)
+    lag = LAGS.get(period_type, 1)
+    out = df[['symbol', 'date']].copy()
+    out['period_type'] = period_type
+    if df.empty:
+        for c in RATIO_COLUMNS + F_COLUMNS + ['f_score', 'f_available']: out[c] = pd.Series(dtype=float)
+        return out
+
+    by = df.groupby('symbol', sort=False)
+    prev_assets = _lagged(df, by, ['total_assets'], lag)['total_assets']
+    assets_base = prev_assets.where(prev_assets > 0, df['total_assets'])   # أصول بداية الفترة إن توفرت
+    ni, cfo = df['net_income'], df['operating_cash_flow']
+    gp = df['gross_profit']
+    shares = df['shares_outstanding'].where(df['shares_outstanding'] > 0)
+
+    out['roa'] = _div(ni, assets_base)
+    out['roe'] = _div(ni, df['total_equity'].where(df['total_equity'] > 0))
+    out['current_ratio'] = _div(df['current_assets'], df['current_liabilities'])
+    out['leverage'] = _div(df['long_term_debt'], df['total_assets'])
+    out['accruals'] = out['roa'] - _div(cfo, assets_base)
+    out['gross_margin'] = _div(gp, df['revenue'])
+    out['asset_turnover'] = _div(df['revenue'], assets_base)
+
+    ratios = out.assign(shares=shares)
+    prev = _lagged(ratios, ratios.groupby('symbol', sort=False), ['roa', 'current_ratio', 'leverage', 'gross_margin', 'asset_turnover', 'shares'], lag)
+    prev_shares = prev['shares']
+    no_debt = (out['leverage'] == 0) & (prev['leverage'] == 0)
+
+    crit = {
+        'f1': (ni > 0, ni.notna()),
+        'f2': (cfo > 0, cfo.notna()),
+        'f3': (out['roa'] > prev['roa'], out['roa'].notna() & prev['roa'].notna()),
+        'f4': (cfo > ni, cfo.notna() & ni.notna()),
+        'f5': ((out['leverage'] < prev['leverage']) | no_debt, out['leverage'].notna() & prev['leverage'].notna()),
+        'f6': (out['current_ratio'] > prev['current_ratio'], out['current_ratio'].notna() & prev['current_ratio'].notna()),
+        'f7': (shares <= prev_shares, shares.notna() & prev_shares.notna()),
+        'f8': (out['gross_margin'] > prev['gross_margin'], out['gross_margin'].notna() & prev['gross_margin'].notna()),
+        'f9': (out['asset_turnover'] > prev['asset_turnover'], out['asset_turnover'].notna() & prev['asset_turnover'].notna()),
+    }
+    for k, (passed, available) in crit.items(): out[k] = (passed & available).astype(bool)
+    out['f_score'] = out[F_COLUMNS].sum(axis=1).astype(int)
+    out['f_available'] = pd.concat([a for _, a in crit.values()], axis=1).sum(axis=1).astype(int)
+    return out
+
+def compute_all_periods(statements):
+    frames = [compute_ratio_panel(statements, p) for p in ['Annual', 'Quarterly']]
+    frames.append(compute_ratio_panel(ttm_statements(statements), 'TTM'))
+    return pd.concat(frames, ignore_index=True)
+
+def latest_row(panel, symbol=None):
+    """آخر فترة لسهم من لوحة محسوبة (قاموس) أو None"""
+    if symbol is not None: panel = panel[panel['symbol'] == symbol]
+    return panel.sort_values('date').iloc[-1].to_dict() if not panel.empty else None
+
+# ==============================
+# 💾 اللوحة المحفوظة (RatioPanel)
+# ==============================
+
+_PANEL_COLUMNS = ['symbol', 'date', 'period_type'] + RATIO_COLUMNS + F_COLUMNS + ['f_score', 'f_available']
+
+def save_ratio_panel(panel):
+    if panel.empty: return True
+    df = panel[_PANEL_COLUMNS].copy()
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+    df[RATIO_COLUMNS] = df[RATIO_COLUMNS].replace([np.inf, -np.inf], np.nan)
+    rows = [tuple(None if (isinstance(v, float) and v != v) else (v.item() if hasattr(v, 'item') else v) for v in r)
+            for r in df.itertuples(index=False, name=None)]
+    updates = ", ".join(f"{c}=EXCLUDED.{c}" for c in _PANEL_COLUMNS[3:])
+    return execute_batch(
+        f"""INSERT INTO RatioPanel ({", ".join(_PANEL_COLUMNS)}) VALUES %s
+            ON CONFLICT (symbol, date, period_type) DO UPDATE SET {updates}, updated_at=NOW()""", rows)
+
+def refresh_ratio_panel(symbols=None, statements=None):
+    """
+    إعادة حساب اللوحة (لكل الأسهم أو لقائمة) ثم حفظها. لقائمة أسهم تُؤخذ القوائم
+    من فهرس القوائم المشترك (get_symbol_statements) بدل قراءة الجدول كاملاً لكل تحديث
+    """
+    if statements is None and symbols is not None:
+        from financial_analysis import get_symbol_statements
+        frames = [f for f in (get_symbol_statements(s) for s in symbols) if not f.empty]
+        statements = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if statements is None: statements = fetch_table("FinancialStatements")
+    if symbols is not None and not statements.empty: statements = statements[statements['symbol'].isin(list(symbols))]
+    panel = compute_all_periods(statements)
+    save_ratio_panel(panel)
+    return panel
+
+def load_latest_ratios(period_type='Annual'):
+    """آخر فترة لكل سهم من اللوحة المحفوظة، مع القطاع ووسيطه وترتيب السهم داخل قطاعه"""
+    df = fetch_query(
+        """SELECT DISTINCT ON (symbol) * FROM RatioPanel WHERE period_type = %s
+           ORDER BY symbol, date DESC""", (period_type,))
+    return with_sector_medians(df)
+
+def with_sector_medians(latest):
+    """يضيف لكل نسبة عمود <نسبة>_median (وسيط القطاع) و <نسبة>_pct (ترتيب مئوي داخل القطاع)"""
+    if latest.empty: return latest
+    latest = latest.copy()
+    latest['sector'] = latest['symbol'].map(lambda s: TADAWUL_DB.get(str(s), {}).get('sector', 'غير معروف'))
+    by = latest.groupby('sector')
+    for c in RATIO_COLUMNS + ['f_score']:
+        latest[f'{c}_median'] = by[c].transform('median')
+        latest[f'{c}_pct'] = by[c].rank(pct=True)
+    # الرافعة والمستحقات: الأقل أفضل
+    for c in ['leverage', 'accruals']: latest[f'{c}_pct'] = 1 - latest[f'{c}_pct'] + 1 / by[c].transform('count')
+    return latest
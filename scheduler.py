@@ -0,0 +1,236 @@
+import json
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import streamlit as st
+from database import execute_query, fetch_query
+
+# ============================================================
+# ⏱️ الجدولة الخلفية: حساب التحليلات الثقيلة مسبقاً
+# بعد إغلاق كل جلسة وبعد كل مزامنة مالية تُجهَّز مخرجات الأسهم
+# المملوكة والمراقبة وتُحفظ، فتقرأ الصفحات نتائج جاهزة فقط
+# ============================================================
+
+RIYADH = timezone(timedelta(hours=3))
+TRADING_DAYS = {6, 0, 1, 2, 3}   # الأحد - الخميس (weekday)
+SESSION_CLOSE = (15, 20)         # الإغلاق 15:00 + مهلة لنشر الشمعة النهائية
+CLOCK_INTERVAL = 60
+
+# الأولوية: الأصغر أولاً؛ الأسهم المملوكة تسبق المراقبة
+PRIORITY_URGENT, PRIORITY_HELD, PRIORITY_WATCH = 0, 10, 20
+
+# ==============================
+# 🕒 ساعة السوق
+# ==============================
+
+def riyadh_now():
+    return datetime.now(RIYADH)
+
+def last_session_close(now=None):
+    """آخر وقت إغلاق (مع المهلة) سبق اللحظة الحالية"""
+    now = now or riyadh_now()
+    day = now.replace(hour=SESSION_CLOSE[0], minute=SESSION_CLOSE[1], second=0, microsecond=0)
+    if now < day: day -= timedelta(days=1)
+    while day.weekday() not in TRADING_DAYS: day -= timedelta(days=1)
+    return day
+
+def is_bar_complete(bar_date, now=None):
+    """هل اكتملت شمعة هذا اليوم (أُغلقت جلستها)؟"""
+    return pd.Timestamp(bar_date).date() <= last_session_close(now).date()
+
+def is_fresh(computed_at, now=None):
+    if computed_at is None or pd.isna(computed_at): return False
+    ts = pd.Timestamp(computed_at)
+    if ts.tzinfo is None: ts = ts.tz_localize(RIYADH)
+    return ts >= pd.Timestamp(last_session_close(now))
+
+# ==============================
+# 💾 المخرجات المحفوظة (AnalysisArtifacts)
+# ==============================
+
+def _to_json(payload):
+    return json.dumps(payload, ensure_ascii=False, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+
+def save_artifact(symbol, kind, payload):
+    return execute_query(
+        """INSERT INTO AnalysisArtifacts (symbol, kind, payload, computed_at) VALUES (%s, %s, %s, %s)
+           ON CONFLICT (symbol, kind) DO UPDATE SET payload=EXCLUDED.payload, computed_at=EXCLUDED.computed_at""",
+        (symbol, kind, _to_json(payload), riyadh_now().replace(tzinfo=None)))
+
+def load_artifact(symbol, kind):
+    """(payload, computed_at) أو (None, None)"""
+    df = fetch_query("SELECT payload, computed_at FROM AnalysisArtifacts WHERE symbol = %s AND kind = %s", (symbol, kind))
+    if df.empty: return None, None
+    try:
+        return json.loads(df.iloc[0]['payload']), df.iloc[0]['computed_at']
+    except Exception:
+        return None, None
+
+def invalidate_artifacts(symbol, kinds):
+    return execute_query("DELETE FROM AnalysisArtifacts WHERE symbol = %s AND kind = ANY(%s)", (symbol, list(kinds)))
+
+# ==============================
+# 🧩 المهام
+# كل مهمة تحسب وتحفظ؛ ai_report تحفظ في جدولها الخاص (ومعها حالة المؤشرات المتدفقة)
+# ==============================
+
+def _job_ai_report(symbol):
+    from ai_engine import generate_ai_report
+    generate_ai_report(symbol)
+
+def _job_classical(symbol):
+    from classical_analysis import compute_classical_levels
+    from market_data import get_chart_history
+    levels = compute_classical_levels(get_chart_history(symbol, period="6mo", interval="1d"))
+    if levels: save_artifact(symbol, 'classical', levels)
+    return levels
+
+def _job_fundamentals(symbol, network=True):
+    from financial_analysis import get_advanced_fundamental_ratios
+    from fundamentals_store import refresh_stale_snapshots
+    from ratio_engine import refresh_ratio_panel
+    if network: refresh_stale_snapshots([symbol])   # الشبكة هنا فقط؛ حساب النسب محلي
+    refresh_ratio_panel([symbol])
+    metrics = get_advanced_fundamental_ratios(symbol)
+    save_artifact(symbol, 'fundamentals', metrics)
+    return metrics
+
+JOBS = {
+    'ai_report': _job_ai_report,
+    'classical': _job_classical,
+    'fundamentals': _job_fundamentals,
+}
+ARTIFACT_KINDS = {'classical', 'fundamentals'}
+SESSION_JOBS = ['ai_report', 'classical', 'fundamentals']
+FINANCIAL_JOBS = ['fundamentals', 'ai_report']
+
+def get_artifact(symbol, kind, with_status=False):
+    """
+    قراءة المخرج الجاهز للصفحات. إن كان أقدم من آخر إغلاق يُرجع كما هو ويُطلب تحديثه
+    في الخلفية بأولوية عاجلة؛ ولا يُحسب أثناء العرض إلا إذا لم يُحفظ بعد (وبدون طلبات شبكة).
+    with_status=True يرجع (المخرج، هل هو حديث)
+    """
+    payload, computed_at = load_artifact(symbol, kind)
+    fresh = True
+    if payload is None:
+        payload = JOBS[kind](symbol, network=False) if kind == 'fundamentals' else JOBS[kind](symbol)
+    elif not is_fresh(computed_at):
+        get_scheduler().submit(kind, symbol, PRIORITY_URGENT)
+        fresh = False
+    return (payload, fresh) if with_status else payload
+
+def refresh_artifact(symbol, kind):
+    """للعامل: يحسب المخرج ويحفظه ما لم يكن أحدث من آخر إغلاق"""
+    payload, computed_at = load_artifact(symbol, kind)
+    if payload is not None and is_fresh(computed_at): return payload
+    return JOBS[kind](symbol)
+
+# ==============================
+# 🗂️ الطابور والعامل
+# ==============================
+
+class Scheduler:
+    """طابور أولويات بلا تكرار: المفتاح (kind, symbol) يظهر مرة واحدة، ويحتفظ بأعلى أولوية طُلبت"""
+
+    def __init__(self, workers=2):
+        self._heap = []
+        self._pending = {}
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+        self._last_close_run = None
+        self.running = set()
+        self.done = 0
+        self.errors = deque(maxlen=50)
+        self._threads = [threading.Thread(target=self._worker, daemon=True, name=f"osoul-worker-{i}") for i in range(workers)]
+        self._threads.append(threading.Thread(target=self._clock, daemon=True, name="osoul-clock"))
+        for t in self._threads: t.start()
+
+    def submit(self, kind, symbol, priority=PRIORITY_WATCH):
+        key = (kind, symbol)
+        with self._cv:
+            if key in self._pending and self._pending[key] <= priority: return False
+            self._pending[key] = priority
+            heapq.heappush(self._heap, (priority, next(self._seq), key))
+            self._cv.notify()
+        return True
+
+    def submit_symbols(self, symbols, kinds, priority=PRIORITY_WATCH):
+        return sum(self.submit(k, s, priority) for s in symbols for k in kinds)
+
+    def _next(self):
+        with self._cv:
+            while True:
+                while not self._heap: self._cv.wait()
+                priority, _, key = heapq.heappop(self._heap)
+                if self._pending.get(key) == priority:   # غير ذلك: نسخة أقدم رُفعت أولويتها
+                    del self._pending[key]
+                    self.running.add(key)
+                    return key
+
+    def _worker(self):
+        while True:
+            key = self._next()
+            kind, symbol = key
+            try:
+                if kind in ARTIFACT_KINDS: refresh_artifact(symbol, kind)   # يتخطى المخرج الحديث
+                else: JOBS[kind](symbol)
+            except Exception as e:
+                print(f"Scheduler Error ({kind}, {symbol}): {e}")
+                self.errors.append((riyadh_now().strftime('%Y-%m-%d %H:%M'), kind, symbol, str(e)))
+            finally:
+                with self._cv:
+                    self.running.discard(key)
+                    self.done += 1
+
+    def _clock(self):
+        while True:
+            try:
+                close = last_session_close()
+                if self._last_close_run != close:
+                    self._last_close_run = close
+                    enqueue_portfolio(self)
+            except Exception as e:
+                print(f"Scheduler Clock Error: {e}")
+            time.sleep(CLOCK_INTERVAL)
+
+    def status(self):
+        with self._cv:
+            return {'pending': len(self._pending), 'running': sorted(self.running), 'done': self.done,
+                    'last_close_run': self._last_close_run, 'errors': list(self.errors)}
+
+@st.cache_resource
+def get_scheduler():
+    return Scheduler()
+
+# ==============================
+# 🎯 المحفزات
+# ==============================
+
+def portfolio_symbols(username=None):
+    """(المملوكة، المراقبة) بدون الصكوك: لمستخدم واحد، أو لكل المستخدمين (الجدولة الخلفية)"""
+    owner_filter, params = ("AND owner = %s", (username,)) if username else ("", ())
+    trades = fetch_query(f"""SELECT DISTINCT symbol FROM Trades
+                             WHERE status = 'Open' AND COALESCE(asset_type, '') <> 'Sukuk' {owner_filter}""", params)
+    held = sorted(trades['symbol'].dropna().astype(str)) if not trades.empty else []
+    wl = fetch_query(f"SELECT DISTINCT symbol FROM Watchlist WHERE TRUE {owner_filter}", params)
+    watch = sorted(set(wl['symbol'].dropna().astype(str)) - set(held)) if not wl.empty else []
+    return held, watch
+
+def enqueue_portfolio(scheduler=None):
+    """بعد إغلاق الجلسة: كل المخرجات للأسهم المملوكة ثم المراقبة"""
+    scheduler = scheduler or get_scheduler()
+    held, watch = portfolio_symbols()
+    return (scheduler.submit_symbols(held, SESSION_JOBS, PRIORITY_HELD) +
+            scheduler.submit_symbols(watch, SESSION_JOBS, PRIORITY_WATCH))
+
+def notify_financials_changed(symbol):
+    """بعد مزامنة/حفظ قوائم مالية: إبطال المخرجات المالية وإعادة حسابها بأولوية عاجلة"""
+    invalidate_artifacts(symbol, ['fundamentals'])
+    try:
+        get_scheduler().submit_symbols([symbol], FINANCIAL_JOBS, PRIORITY_URGENT)
+    except Exception as e:
+        print(f"Scheduler Submit Error ({symbol}): {e}")
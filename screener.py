@@ -0,0 +1,80 @@
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from data_source import TADAWUL_DB
+from database import fetch_table
+from market_panel import get_market_panel
+from ai_engine import build_ai_report
+from fundamentals_store import load_snapshots
+from profiler import profiled
+
+# ============================================================
+# 🧭 الماسح الذكي: تقييم كل السوق بمحرك generate_ai_report
+# الأسعار تُنزَّل مرة واحدة كلوحة، والقوائم المالية واللقطات تُقرأ مرة واحدة،
+# ثم يتوزع التقييم على مجموعة عمال
+# ============================================================
+
+SORT_KEYS = {'total_score': 'النتيجة الكلية', 'tech_score': 'النتيجة الفنية', 'fund_score': 'النتيجة المالية'}
+SCREENER_PERIOD = '2y'   # لوحة الأسعار المشتركة مع اتساع القطاعات (نفس مفتاح الكاش)
+
+def _symbol_frame(panels, symbol):
+    """استخراج إطار OHLCV لسهم واحد من لوحات السوق"""
+    cols = {f: panels[f][symbol] for f in ['Open', 'High', 'Low', 'Close', 'Volume'] if f in panels and symbol in panels[f]}
+    if 'Close' not in cols: return None
+    df = pd.DataFrame(cols).dropna(subset=['Close'])
+    return df if not df.empty else None
+
+def _score_one(symbol, panels, statements, snapshot):
+    df = _symbol_frame(panels, symbol)
+    if df is None: return None
+    rep = build_ai_report(symbol, df, statements, snapshot)
+    info = TADAWUL_DB.get(symbol, {})
+    return {
+        'symbol': symbol,
+        'name': info.get('name', symbol),
+        'sector': info.get('sector', 'غير معروف'),
+        'price': float(df['Close'].iloc[-1]),
+        'total_score': rep['total_score'],
+        'tech_score': rep['tech_score'],
+        'fund_score': rep['fund_score'],
+        'recommendation': rep['recommendation'],
+        'trend': rep['trend'],
+    }
+
+@profiled()
+def run_market_screener(symbols=None, period=SCREENER_PERIOD, max_workers=16, progress_cb=None):
+    """
+    تقييم قائمة رموز (افتراضياً كل TADAWUL_DB) وإرجاع ترتيب قابل للفرز.
+    progress_cb(done, total) تُستدعى من الخيط الرئيسي بعد كل سهم.
+    """
+    t0 = time.perf_counter()
+    symbols = sorted(symbols or TADAWUL_DB)
+    panels = get_market_panel(symbols, period)
+    if not panels: return pd.DataFrame(), {'elapsed': time.perf_counter() - t0, 'failed': symbols}
+    statements = fetch_table("FinancialStatements")
+    by_symbol = dict(tuple(statements.groupby('symbol'))) if not statements.empty else {}
+    empty = statements.iloc[0:0]
+    snaps = load_snapshots()
+    snaps = {s: r.to_dict() for s, r in snaps.iterrows()} if not snaps.empty else {}
+
+    rows, failed = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(_score_one, s, panels, by_symbol.get(s, empty), snaps.get(s, {})): s for s in symbols}
+        for i, fut in enumerate(as_completed(futures), 1):
+            try:
+                row = fut.result()
+                if row: rows.append(row)
+                else: failed.append(futures[fut])
+            except Exception as e:
+                print(f"Screener Error ({futures[fut]}): {e}")
+                failed.append(futures[fut])
+            if progress_cb: progress_cb(i, len(symbols))
+
+    ranking = pd.DataFrame(rows)
+    if not ranking.empty: ranking = rank_results(ranking, 'total_score')
+    return ranking, {'elapsed': time.perf_counter() - t0, 'failed': failed}
+
+def rank_results(ranking, by='total_score'):
+    """فرز النتائج حسب نتيجة محددة مع كسر التعادل بالنتيجتين الأخريين"""
+    others = [k for k in SORT_KEYS if k != by]
+    return ranking.sort_values([by] + others, ascending=False).reset_index(drop=True)
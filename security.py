@@ -1,16 +1,64 @@
 import streamlit as st
 import extra_streamlit_components as stx
+import base64
 import datetime
-import time  # ✅ إضافة مكتبة الوقت
-from database import db_verify_user, db_create_user
+import hashlib
+import hmac
+import secrets
+import time
+from database import db_verify_user, db_create_user, db_token_version, db_revoke_tokens
 from config import APP_NAME, APP_ICON
 
+SESSION_COOKIE = "osoul_session"
+LEGACY_COOKIE = "osoul_user"   # الكوكيز القديمة (اسم المستخدم بدون توقيع): تُتجاهل وتُحذف عند الخروج
+SESSION_DAYS = 30
+
+# =====================================================
+# Session Tokens
+# رمز موقّع HMAC بصلاحية محددة، ومعه نسخة رموز المستخدم (Users.token_version):
+# الخروج يزيد النسخة فتُرفض كل الرموز السابقة للمستخدم
+# الصيغة: base64(اسم المستخدم).النسخة.وقت_الانتهاء.التوقيع
+# =====================================================
+def session_secret_configured():
+    try: return bool(st.secrets.get("SESSION_SECRET"))
+    except Exception: return False
+
+@st.cache_resource
+def _session_key():
+    """المفتاح من SESSION_SECRET؛ بدونه مفتاح عشوائي لعمر العملية (تذكرني ينتهي بإعادة تشغيل الخادم)"""
+    if session_secret_configured(): return str(st.secrets["SESSION_SECRET"]).encode()
+    print("Security Warning: SESSION_SECRET is not set; remember-me tokens expire when the server restarts")
+    return secrets.token_bytes(32)
+
+def _sign(body):
+    return base64.urlsafe_b64encode(hmac.new(_session_key(), body.encode(), hashlib.sha256).digest()).decode().rstrip('=')
+
+def issue_token(username, days=SESSION_DAYS, version=None):
+    user = base64.urlsafe_b64encode(username.encode()).decode().rstrip('=')
+    version = db_token_version(username) if version is None else version
+    body = f"{user}.{version or 0}.{int(time.time() + days * 86400)}"
+    return f"{body}.{_sign(body)}"
+
+def verify_token(token, current_version=db_token_version):
+    """اسم المستخدم إذا كان التوقيع صحيحاً ولم تنتهِ الصلاحية ولم تُبطل نسخته، وإلا None"""
+    try:
+        user, version, exp, sig = str(token).split('.')
+        if not hmac.compare_digest(sig, _sign(f"{user}.{version}.{exp}")) or int(exp) < time.time(): return None
+        username = base64.urlsafe_b64decode(user + '=' * (-len(user) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return username if current_version(username) == int(version) else None   # القاعدة تُسأل بعد صحة التوقيع فقط
+
 # =====================================================
 # Cookie Manager
 # هذا الجزء سليم وممتاز لتجنب الـ Crashes
 # =====================================================
-def get_manager():
-    if "_cookie_manager" not in st.session_state:
+def get_manager(refresh=False):
+    """
+    المُنشئ يعرض مكون القراءة (getAll) ويأخذ منه كوكيز المتصفح؛ النسخة المحفوظة تحمل قيم تشغيل إنشائها فقط.
+    refresh=True (مرة في كل تشغيل يقرأ الكوكيز) يعيد إنشاءه لقراءة القيم الحالية، والمكون يعيد التشغيل عند وصولها
+    """
+    if refresh or "_cookie_manager" not in st.session_state:
         st.session_state._cookie_manager = stx.CookieManager(key="osoul_auth_manager")
     return st.session_state._cookie_manager
 
@@ -24,16 +72,21 @@ def login_system():
     
     # 1. فحص الجلسة الحالية (الأسرع)
     if st.session_state.get("username"):
+        # كتابة الكوكيز في تشغيل عادي بعد الدخول (st.rerun مباشرة بعد set قد يُسقطها)
+        pending = st.session_state.pop('_pending_session_cookie', None)
+        if pending:
+            get_manager().set(SESSION_COOKIE, pending, expires_at=datetime.datetime.now() + datetime.timedelta(days=SESSION_DAYS))
         return True
 
-    cookie_manager = get_manager()
-
-    # ✅ الإضافة الوحيدة للأفضل: 
-    # انتظار جزء من الثانية لضمان وصول الكوكيز من المتصفح قبل الحكم
-    time.sleep(0.1)
+    cookie_manager = get_manager(refresh=True)
 
-    # 2. فحص الكوكيز (تذكرني)
-    cookie_user = cookie_manager.get("osoul_user")
+    # حذف كوكيز الخروج في تشغيل عادي (الحذف متبوعاً مباشرة بـ st.rerun قد يضيع)
+    if st.session_state.pop('_pending_logout', False):
+        _delete_session_cookies(cookie_manager)
+        cookie_user = None
+    # 2. فحص الكوكيز (تذكرني): إن لم تصل بعد من المتصفح يعيد المكون التشغيل عند وصولها
+    else:
+        cookie_user = verify_token(cookie_manager.get(SESSION_COOKIE))
     if cookie_user:
         st.session_state.username = cookie_user
         # تحديث الحالة لتجنب إعادة التحميل المستمر
@@ -62,7 +115,8 @@ def login_system():
                 p = st.text_input("كلمة المرور", type="password")
                 
                 # إضافة زر "تذكرني" كخيار إضافي (ميزة للأفضل)
-                remember = st.checkbox("تذكرني على هذا الجهاز", value=True)
+                remember = st.checkbox("تذكرني على هذا الجهاز", value=True,
+                                       help=None if session_secret_configured() else "SESSION_SECRET غير مضبوط: التذكر ينتهي بإعادة تشغيل الخادم")
 
                 if st.form_submit_button("دخول", use_container_width=True, type="primary"):
                     if not u or not p:
@@ -71,13 +125,7 @@ def login_system():
                         st.session_state.username = u
                         st.session_state['authenticated'] = True
                         
-                        if remember:
-                            # صلاحية الكوكيز 30 يوم
-                            expires = datetime.datetime.now() + datetime.timedelta(days=30)
-                            cookie_manager.set("osoul_user", u, expires_at=expires)
-                        
-                        st.success("تم الدخول بنجاح")
-                        time.sleep(0.5) # انتظار بسيط لتثبيت الكوكيز
+                        if remember: st.session_state['_pending_session_cookie'] = issue_token(u)
                         st.rerun()
                     else:
                         st.error("اسم المستخدم أو كلمة المرور غير صحيحة")
@@ -101,13 +149,19 @@ def login_system():
 # =====================================================
 # Logout
 # =====================================================
+def _delete_session_cookies(cookie_manager):
+    # الحذف دون فحص get(): القيم المقروءة قد لا تتضمن كوكيز قديمة من جلسة متصفح سابقة
+    for name in (SESSION_COOKIE, LEGACY_COOKIE):
+        try: cookie_manager.delete(name, key=f"del_{name}")
+        except KeyError: pass   # أمر الحذف أُرسل للمتصفح؛ الخطأ من النسخة المحلية فقط
+
 def logout():
-    """تسجيل الخروج الآمن"""
-    try:
-        cookie_manager = get_manager()
-        cookie_manager.delete("osoul_user")
-    except Exception:
-        pass
-    
+    """
+    تسجيل الخروج الآمن: إبطال رموز المستخدم في القاعدة (حتى لو بقيت الكوكيز في المتصفح)،
+    ثم حذف الكوكيز في التشغيل التالي
+    """
+    username = st.session_state.get('username')
+    if username: db_revoke_tokens(username)
     st.session_state.clear()
+    st.session_state['_pending_logout'] = True
     st.rerun()
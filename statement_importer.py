@@ -0,0 +1,285 @@
+import os
+import re
+import time
+import difflib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from data_source import normalize_arabic
+
+# ============================================================
+# 📑 الاستيراد الجماعي للقوائم المالية (PDF / Excel)
+# استخراج الجداول في مجموعة عمليات، ومطابقة البنود مع أعمدة
+# FinancialStatements بقاموس مرادفات + تشابه نصي، ثم حفظ دفعة واحدة
+# (الاستيرادات الثقيلة داخل الدوال لأن العمليات الفرعية تستورد هذا الملف)
+# ============================================================
+
+SUPPORTED_EXT = ('.pdf', '.xlsx', '.xls')
+
+LINE_ITEM_SYNONYMS = {
+    'revenue': ['revenue', 'revenues', 'total revenue', 'sales', 'net sales', 'الايرادات', 'اجمالي الايرادات', 'المبيعات', 'صافي المبيعات'],
+    'gross_profit': ['gross profit', 'مجمل الربح', 'اجمالي الربح', 'مجمل الدخل'],
+    'net_income': ['net income', 'net profit', 'profit for the year', 'profit for the period', 'net income for the year',
+                   'صافي الربح', 'صافي الدخل', 'ربح السنه', 'ربح الفتره', 'صافي ربح السنه', 'صافي ربح الفتره'],
+    'operating_cash_flow': ['net cash from operating activities', 'net cash generated from operating activities',
+                            'net cash provided by operating activities', 'صافي النقد من الانشطه التشغيليه',
+                            'صافي التدفقات النقديه من الانشطه التشغيليه', 'صافي النقد الناتج من الانشطه التشغيليه'],
+    'total_assets': ['total assets', 'مجموع الموجودات', 'اجمالي الموجودات', 'مجموع الاصول', 'اجمالي الاصول'],
+    'total_liabilities': ['total liabilities', 'مجموع المطلوبات', 'اجمالي المطلوبات', 'اجمالي الالتزامات', 'مجموع الالتزامات'],
+    'total_equity': ['total equity', 'total shareholders equity', "total shareholders' equity", 'مجموع حقوق الملكيه',
+                     'اجمالي حقوق الملكيه', 'اجمالي حقوق المساهمين', 'مجموع حقوق المساهمين'],
+    'current_assets': ['total current assets', 'مجموع الموجودات المتداوله', 'اجمالي الموجودات المتداوله', 'اجمالي الاصول المتداوله'],
+    'current_liabilities': ['total current liabilities', 'مجموع المطلوبات المتداوله', 'اجمالي المطلوبات المتداوله', 'اجمالي الخصوم المتداوله'],
+    'long_term_debt': ['long term loans', 'long-term loans', 'long term borrowings', 'long-term borrowings', 'term loans',
+                       'قروض طويله الاجل', 'قروض لاجل', 'الجزء غير المتداول من القروض'],
+    'shares_outstanding': ['number of shares', 'weighted average number of shares', 'weighted average number of ordinary shares',
+                           'عدد الاسهم', 'المتوسط المرجح لعدد الاسهم'],
+}
+CORE_FIELDS = ['revenue', 'net_income', 'total_assets', 'total_equity', 'operating_cash_flow']
+MATCH_THRESHOLD = 0.78
+
+_NOTE_HEADERS = {'ايضاح', 'ايضاحات', 'الايضاح', 'note', 'notes'}
+_NEGATION = {'non', 'غير'}   # "غير متداولة" / "non-current": لا تُطابق مع بند بدونها
+_NUMBER = re.compile(r'\(?-?[\d,]+(?:\.\d+)?\)?')
+_YEAR = re.compile(r'\b(20\d{2})\b')
+_QUARTER_HINTS = ['quarter', 'three months', 'six months', 'nine months', 'الربع', 'ثلاثه اشهر', 'سته اشهر', 'تسعه اشهر']
+_MONTHS = {m: i for i, m in enumerate(['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+                                       'september', 'october', 'november', 'december'], 1)}
+
+# ==============================
+# 🔤 مطابقة البنود
+# ==============================
+
+def normalize_label(text):
+    """توحيد الحروف (normalize_arabic) مع حذف الأرقام"""
+    return re.sub(r'\s+', ' ', re.sub(r'\d', ' ', normalize_arabic(text))).strip()
+
+def _negated(norm):
+    tokens = norm.split()
+    return any(t in _NEGATION or t.startswith('noncurrent') for t in tokens)
+
+_SYNONYMS = [(col, normalize_label(s), _negated(normalize_label(s))) for col, syns in LINE_ITEM_SYNONYMS.items() for s in syns]
+
+def match_line_item(label):
+    """(العمود، الثقة) لأقرب مرادف، أو (None، أعلى ثقة) إذا كانت دون MATCH_THRESHOLD"""
+    norm = normalize_label(label)
+    if not norm: return None, 0.0
+    neg = _negated(norm)
+    best_col, best = None, 0.0
+    for col, syn, syn_neg in _SYNONYMS:
+        if syn_neg != neg: continue   # المتداولة مقابل غير المتداولة تتشابه نصياً لكنها بنود مختلفة
+        if norm == syn: return col, 1.0
+        score = difflib.SequenceMatcher(None, norm, syn).ratio()
+        if score > best: best_col, best = col, score
+    return (best_col, best) if best >= MATCH_THRESHOLD else (None, best)
+
+def parse_number(cell):
+    """'(1,234)' → -1234 ، '-' أو فارغ → None"""
+    if cell is None: return None
+    s = str(cell).strip().replace('٬', ',').replace('٫', '.')
+    if not s or s in {'-', '—', '–'}: return None
+    neg = s.startswith('(') and s.endswith(')')
+    s = s.strip('()').replace(',', '').replace(' ', '')
+    try:
+        v = float(s)
+    except ValueError:
+        return None
+    return -v if neg else v
+
+# ==============================
+# 📄 استخراج الصفوف
+# ==============================
+
+def _rows_from_table(table):
+    """[(البند، [أرقام])] من جدول خلايا؛ عمود الإيضاحات (إيضاح / Note) يُستبعد من رأسه"""
+    rows, note_col = [], None
+    for r in table:
+        if note_col is None:
+            note_col = next((i for i, c in enumerate(r) if c is not None and normalize_label(str(c)) in _NOTE_HEADERS), None)
+            if note_col is not None: continue
+        cells = [c for i, c in enumerate(r) if i != note_col and c is not None and str(c).strip() != '']
+        if len(cells) < 2: continue
+        nums = [parse_number(c) for c in cells]
+        labels = [str(c) for c, n in zip(cells, nums) if n is None and re.search(r'[A-Za-z؀-ۿ]', str(c))]
+        values = [n for n in nums if n is not None]
+        if labels and values: rows.append((max(labels, key=len), values))
+    return rows
+
+def _rows_from_text(text):
+    """سطور نصية: بند يليه أرقام (للقوائم غير المجدولة)"""
+    rows = []
+    for line in text.splitlines():
+        nums = [parse_number(m) for m in _NUMBER.findall(line)]
+        nums = [n for n in nums if n is not None and not (1900 < abs(n) < 2100 and float(n).is_integer())]
+        label = _NUMBER.sub(' ', line).strip()
+        if label and nums: rows.append((label, nums))
+    return rows
+
+def _align_values(values, n_periods):
+    """
+    قيم البند بعدد الفترات بالضبط أو None. رقم صحيح صغير قبل أعمدة الفترات
+    هو رقم الإيضاح (في القوائم بلا رأس واضح أو المستخرجة نصياً) فيُحذف
+    """
+    if len(values) == n_periods + 1 and float(values[0]).is_integer() and 0 < values[0] < 100: values = values[1:]
+    return values if len(values) == n_periods else None
+
+def _extract_pdf(path):
+    import pdfplumber
+    rows, text = [], []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text() or ''
+            text.append(page_text)
+            tables = page.extract_tables()
+            for t in tables: rows += _rows_from_table(t)
+            if not tables: rows += _rows_from_text(page_text)
+    return rows, "\n".join(text)
+
+def _extract_excel(path):
+    rows, text = [], []
+    for _, sheet in pd.read_excel(path, sheet_name=None, header=None).items():
+        table = sheet.astype(object).where(sheet.notna(), None).values.tolist()
+        rows += _rows_from_table(table)
+        text.append(" ".join(str(c) for r in table[:15] for c in r if c is not None))
+    return rows, "\n".join(text)
+
+# ==============================
+# 🗓️ الفترة والوحدة
+# ==============================
+
+def _detect_scale(text):
+    text = text.replace('’', "'").replace('‘', "'")
+    t = normalize_label(text)
+    if any(k in t for k in ['millions', 'بملايين', 'بالملايين', 'مليون ريال']): return 1e6
+    if any(k in t for k in ['thousands', 'بالاف', 'الاف الريالات', 'بالالاف']) or "'000" in text: return 1e3
+    return 1.0
+
+def _detect_period(text, filename):
+    """(نوع الفترة، [تواريخ الأعمدة بالترتيب]) — السنوات كما تظهر في رأس القائمة (الحالية ثم المقارنة عادة)"""
+    head = text[:3000]
+    norm = normalize_label(head)
+    quarterly = any(k in norm for k in _QUARTER_HINTS)
+    years = list(dict.fromkeys(_YEAR.findall(head))) or list(dict.fromkeys(_YEAR.findall(filename)))
+    if not years: return None, []
+    if quarterly:
+        m = re.search(r'(\d{1,2})\s+(' + '|'.join(_MONTHS) + r')\s+(20\d{2})', head.lower())
+        iso = re.search(r'(20\d{2})-(\d{2})-(\d{2})', head)
+        if m: end = pd.Timestamp(int(m.group(3)), _MONTHS[m.group(2)], int(m.group(1)))
+        elif iso: end = pd.Timestamp(iso.group(0))
+        else: return None, []
+        dates = [(end - pd.DateOffset(years=i)).strftime('%Y-%m-%d') for i in range(len(years))]
+        return 'Quarterly', dates
+    return 'Annual', [f"{y}-12-31" for y in years]
+
+def _symbol_from_name(filename):
+    m = re.match(r'^(\d{4})\D', os.path.basename(filename) + '_')
+    return m.group(1) if m else None
+
+# ==============================
+# ⚙️ تحليل ملف واحد (يعمل داخل عملية فرعية)
+# ==============================
+
+def parse_statement_file(path, symbol=None):
+    """
+    يرجع قاموس: الملف، الرمز، الفترة، السجلات [(symbol, date, period_type, source, data)]،
+    الحقول المطابقة، الثقة (0-1)، الزمن، الخطأ.
+    """
+    t0 = time.perf_counter()
+    res = {'file': os.path.basename(path), 'symbol': symbol or _symbol_from_name(path), 'period_type': None,
+           'dates': [], 'records': [], 'fields': [], 'confidence': 0.0, 'seconds': 0.0, 'error': ''}
+    try:
+        ext = os.path.splitext(path)[1].lower()
+        rows, text = _extract_pdf(path) if ext == '.pdf' else _extract_excel(path)
+        source = 'PDF' if ext == '.pdf' else 'Excel'
+        period_type, dates = _detect_period(text, os.path.basename(path))
+        res['period_type'], res['dates'] = period_type, dates
+        if not res['symbol']: raise ValueError("تعذر تحديد الرمز من اسم الملف (مثال: 2222_2024.pdf)")
+        if not dates: raise ValueError("تعذر تحديد السنوات/الفترة في الملف")
+
+        scale = _detect_scale(text)
+        best = {}   # العمود → (الثقة، القيم)؛ أول ظهور بأعلى ثقة يفوز
+        for label, values in rows:
+            values = _align_values(values, len(dates))
+            if values is None: continue
+            col, conf = match_line_item(label)
+            if col and conf > best.get(col, (0, None))[0]: best[col] = (conf, values)
+
+        per_date = {d: {} for d in dates}
+        for col, (conf, values) in best.items():
+            mult = 1.0 if col == 'shares_outstanding' else scale
+            for d, v in zip(dates, values): per_date[d][col] = v * mult
+        res['records'] = [(res['symbol'], d, period_type, source, data) for d, data in per_date.items() if data]
+        res['fields'] = sorted(best)
+        coverage = sum(c in best for c in CORE_FIELDS) / len(CORE_FIELDS)
+        match_q = sum(conf for conf, _ in best.values()) / len(best) if best else 0.0
+        res['confidence'] = round(coverage * match_q, 3)
+        if not res['records']: res['error'] = "لم يتم العثور على بنود معروفة"
+    except Exception as e:
+        res['error'] = str(e)
+    res['seconds'] = round(time.perf_counter() - t0, 3)
+    return res
+
+# ==============================
+# 📦 الاستيراد الجماعي
+# ==============================
+
+def resolve_import_dir(base, folder):
+    """المسار الحقيقي لـ folder داخل base (بعد حل .. والروابط)؛ None إذا خرج عنه أو لم يكن مجلداً"""
+    if not base: return None
+    root = os.path.realpath(base)
+    path = os.path.realpath(os.path.join(root, folder or ''))
+    return path if os.path.commonpath([root, path]) == root and os.path.isdir(path) else None
+
+def list_statement_files(directory):
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(SUPPORTED_EXT))
+
+def _merge_with_stored(records):
+    """دمج البنود المستخرجة فوق السجل المحفوظ حتى لا تُصفَّر الحقول غير الموجودة في الملف"""
+    from financial_analysis import get_symbol_statements, FIN_COLUMNS
+    merged, cache = [], {}
+    for symbol, date_str, period_type, source, data in records:
+        if symbol not in cache: cache[symbol] = get_symbol_statements(symbol)
+        stored = cache[symbol]
+        base = {}
+        if not stored.empty:
+            hit = stored[(stored['date'] == pd.Timestamp(date_str)) & (stored['period_type'] == period_type)]
+            if not hit.empty: base = {c: hit.iloc[0].get(c, 0) for c in FIN_COLUMNS}
+        merged.append((symbol, date_str, period_type, source, {**base, **data}))
+    return merged
+
+def import_statement_files(paths, symbol=None, max_workers=None, min_confidence=0.4, dry_run=False, progress_cb=None):
+    """
+    تحليل ملفات متوازياً ثم حفظ السجلات المقبولة (ثقة ≥ min_confidence) في طلب واحد.
+    progress_cb(done, total, file) من الخيط الرئيسي. يرجع DataFrame بتقرير كل ملف.
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(parse_statement_file, p, symbol): p for p in paths}
+        for i, fut in enumerate(as_completed(futures), 1):
+            try: results.append(fut.result())
+            except Exception as e:
+                results.append({'file': os.path.basename(futures[fut]), 'symbol': symbol, 'period_type': None, 'dates': [],
+                                'records': [], 'fields': [], 'confidence': 0.0, 'seconds': 0.0, 'error': str(e)})
+            if progress_cb: progress_cb(i, len(paths), results[-1]['file'])
+
+    accepted = [r for r in results if r['records'] and r['confidence'] >= min_confidence]
+    saved = 0
+    if accepted and not dry_run:
+        from financial_analysis import save_financial_records
+        from ratio_engine import refresh_ratio_panel
+        from scheduler import notify_financials_changed
+        saved = save_financial_records(_merge_with_stored([rec for r in accepted for rec in r['records']]))
+        if saved:
+            symbols = sorted({r['symbol'] for r in accepted})
+            refresh_ratio_panel(symbols)
+            for s in symbols: notify_financials_changed(s)
+
+    report = pd.DataFrame([{
+        'file': r['file'], 'symbol': r['symbol'], 'period_type': r['period_type'], 'periods': ", ".join(r['dates']),
+        'fields': len(r['fields']), 'confidence': r['confidence'] * 100, 'seconds': r['seconds'],
+        'status': ('saved' if saved else 'parsed') if r in accepted else ('low_confidence' if r['records'] else 'failed'),
+        'error': r['error'],
+    } for r in results])
+    return report, saved
+
+def import_directory(directory, **kwargs):
+    return import_statement_files(list_statement_files(directory), **kwargs)
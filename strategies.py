@@ -0,0 +1,175 @@
+import pandas as pd
+import numpy as np
+import indicators as ind
+from tech_scores import tech_score_series
+
+# ============================================================
+# 🧩 سجل الاستراتيجيات: قواعد دخول/خروج تصريحية تُترجم لإشارات متجهة
+# كل استراتيجية تُعرَّف مرة واحدة وتُستخدم في المختبر والماسح والمحرك الذكي
+# ============================================================
+
+INDICATORS = {
+    'sma': lambda df, n, col: ind.sma(df[col], n),
+    'ema': lambda df, n, col: ind.ema(df[col], n),
+    'rsi': lambda df, n, col: ind.rsi(df[col], n),
+    'macd': lambda df, fast, slow, col: ind.macd(df[col], fast, slow)['MACD'],
+    'macd_signal': lambda df, fast, slow, sig, col: ind.macd(df[col], fast, slow, sig)['Signal'],
+    'tech_score': lambda df, col: tech_score_series(df)['tech_score'],
+}
+
+# ==============================
+# 🔤 لغة التعبيرات (Expressions & Rules)
+# ==============================
+
+class Expr:
+    """قيمة رقمية متجهة: عمود سعر أو مؤشر أو ثابت"""
+    def __init__(self, fn, label):
+        self.fn = fn
+        self.label = label
+
+    def __call__(self, df, cache):
+        return self.fn(df, cache)
+
+    def _cmp(self, other, op, sym):
+        other = _as_expr(other)
+        return Rule(lambda df, c: op(self(df, c), other(df, c)), f"{self.label} {sym} {other.label}")
+
+    def _arith(self, other, op, sym):
+        other = _as_expr(other)
+        return Expr(lambda df, c: op(self(df, c), other(df, c)), f"({self.label} {sym} {other.label})")
+
+    def __gt__(self, o): return self._cmp(o, lambda a, b: a > b, '>')
+    def __lt__(self, o): return self._cmp(o, lambda a, b: a < b, '<')
+    def __ge__(self, o): return self._cmp(o, lambda a, b: a >= b, '>=')
+    def __le__(self, o): return self._cmp(o, lambda a, b: a <= b, '<=')
+    def __add__(self, o): return self._arith(o, lambda a, b: a + b, '+')
+    def __sub__(self, o): return self._arith(o, lambda a, b: a - b, '-')
+    def __mul__(self, o): return self._arith(o, lambda a, b: a * b, '*')
+    def __truediv__(self, o): return self._arith(o, lambda a, b: a / b, '/')
+    __rmul__ = __mul__
+
+    def shift(self, n=1):
+        return Expr(lambda df, c: self(df, c).shift(n), f"{self.label}[-{n}]")
+
+class Rule:
+    """شرط منطقي متجه (Series من True/False)"""
+    def __init__(self, fn, label):
+        self.fn = fn
+        self.label = label
+
+    def __call__(self, df, cache):
+        return self.fn(df, cache).fillna(False).astype(bool)
+
+    def __and__(self, o): return Rule(lambda df, c: self(df, c) & o(df, c), f"({self.label} و {o.label})")
+    def __or__(self, o): return Rule(lambda df, c: self(df, c) | o(df, c), f"({self.label} أو {o.label})")
+    def __invert__(self): return Rule(lambda df, c: ~self(df, c), f"ليس ({self.label})")
+
+def _as_expr(x):
+    if isinstance(x, Expr): return x
+    return Expr(lambda df, c: pd.Series(float(x), index=df.index), str(x))
+
+def price(col='Close'):
+    return Expr(lambda df, c: df[col], col)
+
+def indicator(name, *params, col='Close'):
+    """مؤشر من مكتبة indicators (ذاكرة مشتركة) مع cache محلي للإطار لتفادي إعادة حساب البصمة"""
+    key = (name, col) + params
+    def fn(df, cache):
+        if key not in cache: cache[key] = INDICATORS[name](df, *params, col)
+        return cache[key]
+    return Expr(fn, f"{name.upper()}({','.join(str(p) for p in params)})")
+
+def sma(n, col='Close'): return indicator('sma', n, col=col)
+def ema(n, col='Close'): return indicator('ema', n, col=col)
+def rsi(n=14, col='Close'): return indicator('rsi', n, col=col)
+def macd(fast=12, slow=26): return indicator('macd', fast, slow)
+def macd_signal(fast=12, slow=26, sig=9): return indicator('macd_signal', fast, slow, sig)
+def tech_score(): return indicator('tech_score')
+
+def crosses_above(a, b):
+    a, b = _as_expr(a), _as_expr(b)
+    def fn(df, c):
+        x, y = a(df, c), b(df, c)
+        return (x > y) & (x.shift(1) <= y.shift(1))
+    return Rule(fn, f"{a.label} يخترق {b.label} صعوداً")
+
+def crosses_below(a, b):
+    a, b = _as_expr(a), _as_expr(b)
+    def fn(df, c):
+        x, y = a(df, c), b(df, c)
+        return (x < y) & (x.shift(1) >= y.shift(1))
+    return Rule(fn, f"{a.label} يكسر {b.label} هبوطاً")
+
+# ==============================
+# 📋 تعريف الاستراتيجية والسجل
+# ==============================
+
+class Strategy:
+    def __init__(self, name, entry, exit, description=""):
+        self.name = name
+        self.entry = entry
+        self.exit = exit
+        self.description = description
+        self.signals = self.compile()
+
+    def compile(self):
+        """تحويل القواعد إلى دالة واحدة: df -> Series (1 دخول، -1 خروج، 0 لا شيء). الخروج يتقدم على الدخول."""
+        entry, exit_ = self.entry, self.exit
+        def signal_fn(df, cache=None):
+            cache = {} if cache is None else cache
+            sig = np.where(exit_(df, cache), -1, np.where(entry(df, cache), 1, 0))
+            return pd.Series(sig, index=df.index, dtype='int8')
+        return signal_fn
+
+STRATEGIES = {}
+
+def register_strategy(name, entry, exit, description=""):
+    STRATEGIES[name] = Strategy(name, entry, exit, description)
+    return STRATEGIES[name]
+
+def get_strategy(name):
+    if name in STRATEGIES: return STRATEGIES[name]
+    # توافق مع الأسماء القديمة ('Trend' / 'Sniper')
+    for key, strat in STRATEGIES.items():
+        if key.split()[0] in str(name): return strat
+    return None
+
+def generate_signals(name, df, cache=None):
+    strat = get_strategy(name)
+    if strat is None or df is None: return None
+    return strat.signals(df, cache)
+
+def latest_signals(df):
+    """آخر إشارة لكل استراتيجية مسجلة على نفس الإطار (مع مشاركة المؤشرات)"""
+    if df is None or df.empty: return {}
+    cache = {}
+    return {name: int(s.signals(df, cache).iloc[-1]) for name, s in STRATEGIES.items()}
+
+# ==============================
+# 📚 الاستراتيجيات المعتمدة
+# ==============================
+
+register_strategy(
+    "Trend Follower",
+    entry=(price() > sma(50)) & (rsi(14) > 50),
+    exit=price() < sma(50),
+    description="تتبع الاتجاه: الشراء فوق متوسط 50 مع زخم إيجابي، والخروج عند كسره",
+)
+register_strategy(
+    "Sniper",
+    entry=crosses_above(price(), sma(20)),
+    exit=price() < sma(20),
+    description="القناص: الدخول لحظة اختراق متوسط 20 والخروج عند العودة تحته",
+)
+register_strategy(
+    "MACD Momentum",
+    entry=crosses_above(macd(), macd_signal()),
+    exit=crosses_below(macd(), macd_signal()),
+    description="زخم الماكد: تقاطع خط الماكد مع خط الإشارة",
+)
+register_strategy(
+    "AI Tech Score",
+    entry=tech_score() >= 4,
+    exit=tech_score() <= -2,
+    description="المستشار الذكي: الدخول عند نتيجة فنية قوية (VSA + داو + الشموع ≥ 4) والخروج عند السلبية",
+)
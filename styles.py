@@ -84,6 +84,8 @@ def apply_custom_css():
             transform: rotate(15deg); transition: all 0.4s ease; color: #1E293B; pointer-events: none;
         }
         .kpi-card:hover .kpi-icon-bg { transform: rotate(0deg) scale(1.2); opacity: 0.15; left: -5px; }
+        .ticker-up { border-color: #059669; box-shadow: 0 0 0 2px rgba(5,150,105,0.35); }
+        .ticker-down { border-color: #DC2626; box-shadow: 0 0 0 2px rgba(220,38,38,0.35); }
         .kpi-value { font-size: 1.8rem; font-weight: 900; color: #1E293B; direction: ltr; position: relative; z-index: 2; }
         .kpi-label { color: #64748B; font-size: 0.9rem; font-weight: 700; position: relative; z-index: 2; margin-bottom: 5px; }
 
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import indicators as ind
+from candlestick_patterns import evidence_score_series
+
+# ============================================================
+# 📈 النتيجة الفنية عبر كامل التاريخ (نسخ متجهة من مقيّمات ai_engine)
+# كل دالة تعطي لكل شمعة نفس النتيجة التي يعطيها المقيّم الأصلي
+# لو طُبّق على البيانات حتى تلك الشمعة (iloc[-1])
+# ============================================================
+
+def _zeros(df):
+    return pd.Series(0, index=df.index if df is not None else [], dtype='int64')
+
+def _min_bars(df, n):
+    """قناع موضعي يطابق شرط len(df) < n في النسخ النقطية"""
+    return np.arange(len(df)) >= n - 1
+
+def _candle_parts(df):
+    o, h, l, c = df['Open'], df['High'], df['Low'], df['Close']
+    body = (c - o).abs()
+    upper = h - np.maximum(c, o)
+    lower = np.minimum(c, o) - l
+    return o, h, l, c, body, upper, lower
+
+def vsa_score_series(df):
+    """مقابل _analyze_vsa_art_of_trading"""
+    if df is None or len(df) < 20: return _zeros(df)
+    o, h, l, c, body, upper, lower = _candle_parts(df)
+    vol = df['Volume']
+    avg_vol = ind.volume_avg(vol, 20)
+    spread = h - l
+    avg_spread = ind.sma(spread, 20)
+
+    effort = (vol > avg_vol * 1.5) & (spread < avg_spread * 0.8)
+    s = np.where(effort, np.where(c > c.shift(1), -2, 2), 0)
+    s = s + np.where((lower > body * 2) & (vol < avg_vol), 2, 0)
+    s = s + np.where((vol > avg_vol * 3) & (upper > body), -3, 0)
+    return pd.Series(np.where(_min_bars(df, 20), s, 0), index=df.index, dtype='int64')
+
+def dow_score_series(df):
+    """مقابل _analyze_dow_theory_murphy"""
+    if df is None or len(df) < 200: return _zeros(df)
+    c = df['Close']
+    sma_50, sma_200 = ind.sma(c, 50), ind.sma(c, 200)
+    s = np.where(c > sma_200, np.where(sma_50 > sma_200, 3, 1), -2)
+    rsi = ind.rsi(c, 14)
+    s = s + np.where((c > c.shift(9)) & (rsi < rsi.shift(9)), -1, 0)
+    return pd.Series(np.where(_min_bars(df, 200), s, 0), index=df.index, dtype='int64')
+
+def candlestick_score_series(df):
+    """مقابل _detect_candlestick_patterns"""
+    if df is None or len(df) < 5: return _zeros(df)
+    o, h, l, c, body, upper, lower = _candle_parts(df)
+    po, pc = o.shift(1), c.shift(1)
+    s = np.where((lower > body * 2) & (upper < body * 0.5), 1, 0)
+    s = s + np.where((c > o) & (pc < po) & (c > po) & (o < pc), 2, 0)
+    s = s + np.where((upper > body * 2) & (lower < body * 0.5), -1, 0)
+    s = s + evidence_score_series(df)[0].to_numpy()
+    return pd.Series(np.where(_min_bars(df, 5), s, 0), index=df.index, dtype='int64')
+
+def tech_score_series(df):
+    """النتيجة الفنية لكل شمعة: VSA + داو + الشموع"""
+    if df is None or df.empty: return pd.DataFrame(columns=['vsa', 'dow', 'candles', 'tech_score'])
+    out = pd.DataFrame({
+        'vsa': vsa_score_series(df),
+        'dow': dow_score_series(df),
+        'candles': candlestick_score_series(df),
+    })
+    out['tech_score'] = out.sum(axis=1)
+    return out
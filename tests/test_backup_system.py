@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+
+import pytest
+
+import backup_system
+
+# ============================================================
+# الأرشيف المتدفق: لا يبقى ملف ناقص عند الفشل، والتحقق والاحتفاظ بعد الكتابة
+# (اتصال وهمي: COPY يكتب CSV ثابتاً دون قاعدة بيانات)
+# ============================================================
+
+class _Cursor:
+    rowcount = 2
+
+    def __init__(self, fail_on=None): self.fail_on = fail_on
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def execute(self, sql, params=None): pass
+    def fetchone(self): return (None, 'ok')
+    def mogrify(self, sql, params): return sql.replace('%s', repr(params[0])).encode()
+
+    def copy_expert(self, sql, out):
+        if self.fail_on and self.fail_on in sql: raise RuntimeError("copy failed")
+        out.write("id,v\n1,a\n2,b\n")
+
+class _Conn:
+    def __init__(self, cursor): self._cursor = cursor
+    def cursor(self): return self._cursor
+    def rollback(self): pass
+
+def _use_db(monkeypatch, **kw):
+    @contextmanager
+    def get_db(): yield _Conn(_Cursor(**kw))
+    monkeypatch.setattr(backup_system, 'get_db', get_db)
+
+def test_backup_written_and_verified(monkeypatch, tmp_path):
+    _use_db(monkeypatch)
+    path, manifest = backup_system.generate_streaming_backup('ali', backup_dir=tmp_path)
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+    assert backup_system.verify_backup(path) == []
+    assert len(manifest['tables']) == len(backup_system.BACKUP_TABLES)
+
+def test_failed_copy_leaves_no_file(monkeypatch, tmp_path):
+    _use_db(monkeypatch, fail_on='watchlist')
+    with pytest.raises(RuntimeError):
+        backup_system.generate_streaming_backup('ali', backup_dir=tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+def test_prune_keeps_latest_per_user(tmp_path):
+    names = [f"Osoli_Backup_ali_2026-01-0{d}_10-00-00.zip" for d in range(1, 5)]
+    other = "Osoli_Backup_ali_x_2026-01-01_10-00-00.zip"
+    for n in names + [other]: (tmp_path / n).write_bytes(b"")
+    kept = backup_system.prune_backups('ali', tmp_path, keep=2)
+    assert [p.name for p in kept] == names[-2:]
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(names[-2:] + [other])
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+import indicators as ind
+
+# ============================================================
+# تعريفات المؤشرات مقابل صيغ مرجعية مكتوبة بحلقات بسيطة،
+# والذاكرة المشتركة
+# ============================================================
+
+@pytest.fixture
+def close():
+    rng = np.random.default_rng(7)
+    idx = pd.bdate_range("2022-01-03", periods=400)
+    return pd.Series(100 * np.cumprod(1 + rng.normal(0, 0.015, len(idx))), index=idx, name='Close')
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    ind.clear_cache()
+    yield
+    ind.clear_cache()
+
+def ref_sma(x, n):
+    return np.array([np.nan if i < n - 1 else x[i - n + 1:i + 1].mean() for i in range(len(x))])
+
+def ref_std(x, n):
+    return np.array([np.nan if i < n - 1 else x[i - n + 1:i + 1].std(ddof=1) for i in range(len(x))])
+
+def ref_ewm(x, alpha):
+    out, w = np.empty(len(x)), x[0]
+    for i, v in enumerate(x):
+        w = v if i == 0 else (1 - alpha) * w + alpha * v
+        out[i] = w
+    return out
+
+def ref_rsi(x, period):
+    delta = np.diff(x, prepend=np.nan)
+    delta[0] = 0.0
+    gain = ref_ewm(np.where(delta > 0, delta, 0.0), 1 / period)
+    loss = ref_ewm(np.where(delta < 0, -delta, 0.0), 1 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - 100 / (1 + gain / loss)
+
+def assert_close(actual, expected):
+    np.testing.assert_allclose(np.asarray(actual, dtype=float), expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+# ==============================
+# 📏 الدفعية مقابل الصيغ المرجعية
+# ==============================
+
+def test_sma_matches_reference(close):
+    assert_close(ind.sma(close, 20), ref_sma(close.to_numpy(), 20))
+
+def test_ema_matches_reference(close):
+    assert_close(ind.ema(close, 12), ref_ewm(close.to_numpy(), 2 / 13))
+
+def test_rsi_matches_reference(close):
+    out = ind.rsi(close, 14)
+    assert np.isnan(out.iloc[0])
+    assert_close(out.iloc[1:], ref_rsi(close.to_numpy(), 14)[1:])
+
+def test_macd_matches_reference(close):
+    x = close.to_numpy()
+    line = ref_ewm(x, 2 / 13) - ref_ewm(x, 2 / 27)
+    sig = ref_ewm(line, 2 / 10)
+    out = ind.macd(close)
+    assert_close(out['MACD'], line)
+    assert_close(out['Signal'], sig)
+    assert_close(out['Hist'], line - sig)
+
+def test_bollinger_matches_reference(close):
+    x = close.to_numpy()
+    mid, std = ref_sma(x, 20), ref_std(x, 20)
+    out = ind.bollinger(close, 20, 2)
+    assert_close(out['Mid'], mid)
+    assert_close(out['Upper'], mid + 2 * std)
+    assert_close(out['Lower'], mid - 2 * std)
+
+def test_panel_functions_match_per_symbol(close):
+    panel = pd.DataFrame({'A': close, 'B': close * 0.5 + 3})
+    assert_close(ind.sma(panel, 50)['B'], ref_sma(panel['B'].to_numpy(), 50))
+    assert_close(ind.panel_macd(panel)['MACD']['A'], ind.macd(close)['MACD'])
+
+# ==============================
+# 🧠 الذاكرة المشتركة
+# ==============================
+
+def test_memoized_result_is_shared(close):
+    first = ind.sma(close, 20)
+    assert ind.sma(close.copy(), 20) is first
+    assert ind.cache_info()['hits'] == 1
+
+def test_fingerprint_changes_with_values(close):
+    changed = close.copy()
+    changed.iloc[-1] += 1
+    assert ind.series_fingerprint(changed) != ind.series_fingerprint(close)
+    assert ind.sma(changed, 20) is not ind.sma(close, 20)
@@ -0,0 +1,37 @@
+import ast
+import json
+import os
+import subprocess
+import sys
+
+# ============================================================
+# شاشة الدخول لا تنتظر تحميل الواجهات: استيرادات app.py على مستوى
+# الملف (ما قبل login_system) لا تجلب yfinance / plotly / views
+# وتبقى ضمن ميزانية زمنية
+# ============================================================
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOGIN_IMPORT_BUDGET = 2.0   # ثوانٍ (القياس المحلي ~0.5 ثانية مع streamlit نفسه)
+HEAVY_MODULES = ['yfinance', 'plotly.express', 'views', 'scheduler', 'charts']
+
+def _login_imports():
+    """أسطر الاستيراد في أعلى app.py كما هي (الاستيرادات المؤجلة داخل if login_system() لا تُحسب)"""
+    with open(os.path.join(ROOT, 'app.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(n) for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom)))
+
+def test_login_path_skips_heavy_imports(tmp_path):
+    code = (
+        "import json, sys, time\n"
+        f"sys.path.insert(0, {ROOT!r})\n"
+        "t0 = time.perf_counter()\n"
+        f"{_login_imports()}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - t0, 'modules': sorted(sys.modules)}))\n"
+    )
+    # يعمل من مجلد مؤقت حتى لا تُقرأ أسرار المشروع (الاستيراد وحده لا يتصل بقاعدة البيانات)
+    out = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    loaded = [m for m in HEAVY_MODULES if m in result['modules']]
+    assert loaded == []
+    assert result['seconds'] < LOGIN_IMPORT_BUDGET
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from ratio_engine import compute_ratio_panel, latest_row
+
+# ============================================================
+# Piotroski: البند غير المتوفر لا يُحسب معياراً متوفراً،
+# والمقارنة لا تتم إلا مع الفترة المماثلة قبل عام
+# ============================================================
+
+FULL = {'revenue': 1000.0, 'gross_profit': 300.0, 'net_income': 100.0, 'total_assets': 2000.0, 'total_liabilities': 800.0,
+        'total_equity': 1200.0, 'operating_cash_flow': 150.0, 'current_assets': 600.0, 'current_liabilities': 300.0,
+        'long_term_debt': 400.0, 'shares_outstanding': 50.0}
+
+def _rows(dates, period_type='Annual', **fields):
+    return pd.DataFrame([{'symbol': '1111', 'date': d, 'period_type': period_type, **fields} for d in dates])
+
+def test_manual_entry_fields_only():
+    # الإدخال اليدوي يحفظ الإيرادات والربح والتدفق والأصول فقط
+    manual = {'revenue': 1000.0, 'net_income': 100.0, 'operating_cash_flow': 150.0, 'total_assets': 2000.0}
+    row = latest_row(compute_ratio_panel(_rows(['2023-12-31', '2024-12-31'], **manual)))
+    assert not row['f5'] and not row['f6'] and not row['f7'] and not row['f8']
+    assert row['f_available'] == 5   # f1 f2 f3 f4 f9
+
+def test_legacy_zero_fields_are_missing():
+    legacy = {**{k: 0.0 for k in FULL}, 'revenue': 1000.0, 'net_income': 100.0, 'total_assets': 2000.0}
+    row = latest_row(compute_ratio_panel(_rows(['2023-12-31', '2024-12-31'], **legacy)))
+    assert not row['f2'] and not row['f4'] and not row['f5']
+    assert row['f_available'] == 3   # f1 f3 f9
+
+def test_debt_free_company_passes_f5():
+    data = {**FULL, 'long_term_debt': 0.0}
+    row = latest_row(compute_ratio_panel(_rows(['2023-12-31', '2024-12-31'], **data)))
+    assert row['f5'] and row['f_available'] == 9
+
+def test_missing_quarter_is_not_compared():
+    # الربع الرابع 2023 ناقص: الإزاحة بأربعة صفوف من 2024-06-30 تصل إلى 2023-03-31 لا إلى نفس الربع
+    dates = ['2023-03-31', '2023-06-30', '2023-09-30', '2024-03-31', '2024-06-30']
+    last = compute_ratio_panel(_rows(dates, 'Quarterly', **FULL), 'Quarterly').iloc[-1]
+    assert last['f_available'] == 3   # f1 f2 f4 فقط (لا مقارنات)
+
+def test_consecutive_quarters_are_compared():
+    dates = ['2023-03-31', '2023-06-30', '2023-09-30', '2023-12-31', '2024-03-31']
+    last = compute_ratio_panel(_rows(dates, 'Quarterly', **FULL), 'Quarterly').iloc[-1]
+    assert last['f_available'] == 9
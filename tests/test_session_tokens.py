@@ -0,0 +1,33 @@
+import security
+
+# ============================================================
+# رموز الجلسة: التوقيع والانتهاء ونسخة المستخدم (الخروج يبطل الرموز السابقة)
+# ============================================================
+
+def _setup(monkeypatch, versions):
+    monkeypatch.setattr(security, '_session_key', lambda: b'test-key')
+    monkeypatch.setattr(security, 'db_token_version', lambda u: versions.get(u))
+
+def test_token_round_trip(monkeypatch):
+    versions = {'ali': 0}
+    _setup(monkeypatch, versions)
+    token = security.issue_token('ali')
+    assert security.verify_token(token, versions.get) == 'ali'
+
+def test_revoked_version_rejected(monkeypatch):
+    versions = {'ali': 0}
+    _setup(monkeypatch, versions)
+    token = security.issue_token('ali')
+    versions['ali'] += 1   # ما يفعله db_revoke_tokens عند الخروج
+    assert security.verify_token(token, versions.get) is None
+    assert security.verify_token(security.issue_token('ali'), versions.get) == 'ali'
+
+def test_tampered_or_expired_rejected(monkeypatch):
+    versions = {'ali': 0}
+    _setup(monkeypatch, versions)
+    token = security.issue_token('ali')
+    user, version, exp, sig = token.split('.')
+    assert security.verify_token(f"{user}.{version}.{int(exp) + 1}.{sig}", versions.get) is None
+    assert security.verify_token(security.issue_token('ali', days=-1), versions.get) is None
+    assert security.verify_token('bad-token', versions.get) is None
+    assert security.verify_token(None, versions.get) is None
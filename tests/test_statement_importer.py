@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+from statement_importer import resolve_import_dir, match_line_item, parse_number, parse_statement_file, _rows_from_table, _rows_from_text, _align_values
+
+# ============================================================
+# مطابقة البنود (المرادفات) واستخراج القيم من جداول القوائم
+# ============================================================
+
+@pytest.mark.parametrize("label, col", [
+    ("Total revenue", 'revenue'),
+    ("الإيرادات", 'revenue'),
+    ("صافي ربح السنة", 'net_income'),
+    ("إجمالي الموجودات", 'total_assets'),
+    ("Total current assets", 'current_assets'),
+    ("مجموع الموجودات المتداولة", 'current_assets'),
+    ("Total current liabilities", 'current_liabilities'),
+    ("الجزء غير المتداول من القروض", 'long_term_debt'),
+])
+def test_aliases_match(label, col):
+    assert match_line_item(label)[0] == col
+
+@pytest.mark.parametrize("label", [
+    "Total non-current assets",
+    "Total noncurrent assets",
+    "Total non-current liabilities",
+    "إجمالي الموجودات غير المتداولة",
+    "مجموع المطلوبات غير المتداولة",
+])
+def test_non_current_totals_are_not_current(label):
+    assert match_line_item(label)[0] not in ('current_assets', 'current_liabilities')
+
+def test_parse_number():
+    assert parse_number("(1,234)") == -1234
+    assert parse_number("1٬500٫5") == 1500.5
+    assert parse_number("-") is None and parse_number("") is None
+
+def test_note_column_dropped_by_header():
+    rows = _rows_from_table([
+        ['', 'إيضاح', '2024', '2023'],
+        ['الإيرادات', '5', '1,234,567', '1,100,000'],
+        ['مجموع الموجودات', '', '9,000', '8,000'],
+    ])
+    assert rows == [('الإيرادات', [1234567.0, 1100000.0]), ('مجموع الموجودات', [9000.0, 8000.0])]
+
+def test_note_reference_dropped_before_period_columns():
+    (label, values), = _rows_from_text("الإيرادات 5 1,234,567 1,100,000")
+    assert _align_values(values, 2) == [1234567.0, 1100000.0]
+    assert _align_values([1234.0, 5.0], 2) == [1234.0, 5.0]
+    assert _align_values([1.0, 2.0, 3.0, 4.0], 2) is None
+
+def test_excel_statement_with_note_column(tmp_path):
+    pytest.importorskip("openpyxl")
+    path = tmp_path / "2222_2024.xlsx"
+    pd.DataFrame([
+        ["قائمة الدخل (بآلاف الريالات)", None, None, None],
+        [None, "Note", "2024", "2023"],
+        ["Revenue", 5, 1200, 1100],
+        ["Net income", 6, 300, 250],
+        ["Total current assets", 7, 900, 800],
+        ["Total non-current assets", 8, 4000, 3900],
+    ]).to_excel(path, header=False, index=False)
+    res = parse_statement_file(str(path))
+    assert res['error'] == ''
+    by_date = {d: data for _, d, _, _, data in res['records']}
+    assert by_date['2024-12-31'] == {'revenue': 1.2e6, 'net_income': 3e5, 'current_assets': 9e5}
+    assert by_date['2023-12-31']['revenue'] == 1.1e6
+
+def test_import_dir_stays_under_base(tmp_path):
+    base = tmp_path / "statements"
+    (base / "2024").mkdir(parents=True)
+    (tmp_path / "other").mkdir()
+    (base / "escape").symlink_to(tmp_path / "other")
+    assert resolve_import_dir(str(base), "2024") == str((base / "2024").resolve())
+    assert resolve_import_dir(str(base), "") == str(base.resolve())
+    for bad in ["../other", "/etc", "escape", "missing"]:
+        assert resolve_import_dir(str(base), bad) is None
+    assert resolve_import_dir(None, "2024") is None
@@ -0,0 +1,84 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import indicators as ind
+import indicator_store
+
+# ============================================================
+# المؤشرات المتدفقة تطابق الدفعية رقماً برقم (500 شمعة، مع فجوات NaN)،
+# والحالة المحفوظة تُستكمل بالشموع الجديدة فقط ولا تُحفظ الشمعة الجزئية
+# ============================================================
+
+@pytest.fixture
+def bars():
+    rng = np.random.default_rng(11)
+    idx = pd.bdate_range("2023-01-02", periods=500)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.015, len(idx)))
+    return pd.DataFrame({'Close': close, 'Volume': rng.integers(10_000, 1_000_000, len(idx)).astype(float)}, index=idx)
+
+def assert_same(actual, expected):
+    np.testing.assert_array_equal(np.asarray(actual, dtype=float), np.asarray(expected, dtype=float))
+
+@pytest.mark.parametrize("stream, batch", [
+    (lambda: ind.StreamingSMA(20), lambda s: ind.sma(s, 20)),
+    (lambda: ind.StreamingSTD(20), lambda s: ind.rolling_std(s, 20)),
+    (lambda: ind.StreamingEMA(26), lambda s: ind.ema(s, 26)),
+    (lambda: ind.StreamingRSI(14), lambda s: ind.rsi(s, 14)),
+])
+@pytest.mark.parametrize("gaps", [False, True])
+def test_streaming_matches_batch(bars, stream, batch, gaps):
+    close = bars['Close'].copy()
+    if gaps: close.iloc[[30, 31, 200]] = np.nan
+    ind.clear_cache()
+    st = stream()
+    assert_same([st.update(v) for v in close], batch(close))
+
+def test_streaming_macd_and_bollinger_match_batch(bars):
+    close = bars['Close']
+    m, b = ind.StreamingMACD(), ind.StreamingBollinger(20, 2)
+    ms = pd.DataFrame([m.update(v) for v in close], index=close.index)
+    bs = pd.DataFrame([b.update(v) for v in close], index=close.index)
+    for col in ['MACD', 'Signal', 'Hist']: assert_same(ms[col], ind.macd(close)[col])
+    for col in ['Mid', 'Upper', 'Lower', 'STD']: assert_same(bs[col], ind.bollinger(close, 20, 2)[col])
+
+def test_indicator_set_state_roundtrip(bars):
+    full = ind.IndicatorSet().seed(bars)
+    resumed = ind.IndicatorSet.from_state(json.loads(json.dumps(ind.IndicatorSet().seed(bars.iloc[:300]).to_state())))
+    resumed.seed(bars.iloc[300:])
+    assert resumed.last_bar == full.last_bar
+    assert_same(list(resumed.values().values()), list(full.values().values()))
+    assert_same(full.values()['SMA_200'], ind.sma(bars['Close'], 200).iloc[-1])
+
+# ==============================
+# 💾 الحالة المحفوظة (indicator_store)
+# ==============================
+
+@pytest.fixture
+def store(monkeypatch):
+    saved = {}
+    monkeypatch.setattr(indicator_store, 'load_indicator_state',
+                        lambda s: ind.IndicatorSet.from_state(json.loads(saved[s])) if s in saved else None)
+    monkeypatch.setattr(indicator_store, 'save_indicator_state', lambda s, iset: saved.__setitem__(s, json.dumps(iset.to_state())))
+    monkeypatch.setattr(indicator_store, 'is_bar_complete', lambda d: True)
+    return saved
+
+def test_store_resumes_from_saved_bar(bars, store):
+    indicator_store.refresh_streaming_indicators('X', bars.iloc[:400])
+    values = indicator_store.refresh_streaming_indicators('X', bars)
+    assert json.loads(store['X'])['last_bar'] == bars.index[-1].strftime('%Y-%m-%d')
+    assert_same(list(values.values()), list(ind.IndicatorSet().seed(bars).values().values()))
+
+def test_store_rebuilds_after_revised_close(bars, store):
+    indicator_store.refresh_streaming_indicators('X', bars.iloc[:400])
+    revised = bars.copy()
+    revised['Close'] *= 0.98   # تعديل توزيعات: كل الأسعار السابقة تتغير
+    values = indicator_store.refresh_streaming_indicators('X', revised)
+    assert_same(list(values.values()), list(ind.IndicatorSet().seed(revised).values().values()))
+
+def test_partial_bar_is_not_persisted(bars, store, monkeypatch):
+    last = bars.index[-1]
+    monkeypatch.setattr(indicator_store, 'is_bar_complete', lambda d: pd.Timestamp(d) < last)
+    values = indicator_store.refresh_streaming_indicators('X', bars)
+    assert json.loads(store['X'])['last_bar'] == bars.index[-2].strftime('%Y-%m-%d')
+    assert_same(values['SMA_20'], ind.sma(bars['Close'], 20).iloc[-1])
@@ -1,35 +1,23 @@
+import time
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from datetime import date
 from config import DEFAULT_COLORS
-from components import render_kpi, render_custom_table, render_ticker_card, safe_fmt
+from components import render_kpi, render_custom_table, ticker_card_html, safe_fmt, session_result, invalidate_session_results
 from analytics import calculate_portfolio_metrics, update_prices, generate_equity_curve
-from database import execute_query, fetch_table
-from market_data import get_static_info, get_tasi_data, get_chart_history, fetch_batch_data
-from data_source import get_company_details 
+from database import execute_query, fetch_user_table, current_user, query_count
+from market_data import get_static_info, get_tasi_data, get_chart_history, fetch_batch_data, quote_key
+from data_source import get_company_details, search_symbols, SECTORS, SECTOR_INDEX
+from profiler import span, profiled_run, is_admin, PROFILE_LOG
 
-# استيراد الوحدات مع حماية
-try:
-    from charts import render_technical_chart
-    from backtester import run_backtest
-    from financial_analysis import render_financial_dashboard_ui, get_fundamental_ratios, get_thesis, save_thesis
-    from classical_analysis import render_classical_analysis
-except ImportError:
-    def render_technical_chart(*a): st.warning("وحدة الرسوم البيانية غير متوفرة")
-    def run_backtest(*a): st.warning("وحدة الاختبار غير متوفرة"); return None
-    def render_financial_dashboard_ui(*a): st.warning("التحليل المالي غير متوفر")
-    def get_fundamental_ratios(*a): return {"Score": 0, "Rating": "N/A"}
-    def get_thesis(*a): return {}
-    def save_thesis(*a): pass
-    def render_classical_analysis(*a): st.warning("التحليل الكلاسيكي غير متوفر")
+# الوحدات الثقيلة (plotly، التحليل المالي، الرسوم، المختبر) تُستورد داخل الصفحات التي تستخدمها
 
 # --- 1. Navigation Bar ---
 def render_navbar():
     buttons = [
         ('🏠 الرئيسية','home'), ('⚡ مضاربة','spec'), ('💎 استثمار','invest'), 
         ('💓 نبض','pulse'), ('📜 صكوك','sukuk'), ('🔍 تحليل','analysis'), 
-        ('🧪 المختبر','backtest'), ('💰 السيولة','cash'), ('🔄 تحديث','update')
+        ('🧭 الماسح','screener'), ('🧪 المختبر','backtest'), ('💰 السيولة','cash'), ('🔄 تحديث','update')
     ]
     
     cols = st.columns(len(buttons) + 1)
@@ -49,11 +37,12 @@ def render_navbar():
             st.markdown("---")
             if st.button("🚪 خروج", use_container_width=True): 
                 try: from security import logout; logout()
-                except: st.session_state.clear(); st.rerun()
+                except ImportError: st.session_state.clear(); st.rerun()
     st.markdown("---")
 
 # --- 2. Dashboard ---
 def view_dashboard(fin):
+    import plotly.express as px
     try: tp, tc = get_tasi_data()
     except: tp, tc = 0, 0
     ar = "🔼" if tc >= 0 else "🔽"
@@ -190,18 +179,7 @@ def view_portfolio(fin, key):
             op['day_change'] = op.apply(lambda r: ((r['current_price'] - r['prev_close']) / r['prev_close'] * 100) if r['prev_close'] > 0 else 0, axis=1)
             op['weight'] = (op['market_value'] / total_market * 100).fillna(0)
 
-            c_sort, _ = st.columns([1, 3])
-            sort_options = ["الرمز", "الشركة", "القطاع", "تاريخ الشراء", "الكمية", "التكلفة", "السعر الحالي", "القيمة السوقية (الوزن)", "الربح والخسارة", "نسبة الربح", "التغير اليومي"]
-            sort_by = c_sort.selectbox(f"فرز {ts} حسب:", sort_options, key=f"sort_op_{key}")
-            
-            if sort_by == "الربح والخسارة": op = op.sort_values(by='gain', ascending=False)
-            elif sort_by == "القيمة السوقية (الوزن)": op = op.sort_values(by='market_value', ascending=False)
-            elif sort_by == "التغير اليومي": op = op.sort_values(by='day_change', ascending=False)
-            elif sort_by == "نسبة الربح": op = op.sort_values(by='gain_pct', ascending=False)
-            elif sort_by == "الشركة": op = op.sort_values(by='company_name')
-            elif sort_by == "القطاع": op = op.sort_values(by='sector')
-            elif sort_by == "التكلفة": op = op.sort_values(by='total_cost', ascending=False)
-            else: op = op.sort_values(by='date', ascending=False)
+            op = op.sort_values(by='date', ascending=False)   # الترتيب الافتراضي؛ بقية الترتيب من عناصر الجدول
             
             cols = [
                 ('company_name', 'اسم الشركة', 'text'), ('sector', 'القطاع', 'text'),
@@ -215,7 +193,7 @@ def view_portfolio(fin, key):
                 ('day_change', 'نسبة التغير اليومي', 'percent')
             ]
             
-            render_custom_table(op, cols)
+            render_custom_table(op, cols, key=f"{key}_open")
             
             c_act1, c_act2 = st.columns(2)
             
@@ -229,8 +207,8 @@ def view_portfolio(fin, key):
                             p = st.number_input("سعر البيع")
                             d = st.date_input("تاريخ")
                             if st.form_submit_button("تأكيد"):
-                                execute_query("UPDATE Trades SET status='Close', exit_price=%s, exit_date=%s WHERE id=%s", (p, str(d), tid))
-                                st.success("تم البيع"); st.cache_data.clear(); st.rerun()
+                                execute_query("UPDATE Trades SET status='Close', exit_price=%s, exit_date=%s WHERE id=%s AND owner=%s", (p, str(d), tid, current_user()))
+                                st.success("تم البيع"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
             
             with c_act2:
                 with st.expander("✏️ تعديل صفقة (تصحيح خطأ)"):
@@ -244,23 +222,17 @@ def view_portfolio(fin, key):
                             np = st.number_input("سعر الشراء", value=float(curr['entry_price']))
                             nd = st.date_input("تاريخ", pd.to_datetime(curr['date']))
                             if st.form_submit_button("حفظ"):
-                                execute_query("UPDATE Trades SET quantity=%s, entry_price=%s, date=%s WHERE id=%s", (nq, np, str(nd), tid))
-                                st.success("تم التعديل"); st.cache_data.clear(); st.rerun()
+                                execute_query("UPDATE Trades SET quantity=%s, entry_price=%s, date=%s WHERE id=%s AND owner=%s", (nq, np, str(nd), tid, current_user()))
+                                st.success("تم التعديل"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
         else:
             st.info("لا توجد صفقات قائمة حالياً")
 
     with t2:
         if not cl.empty:
-            c_sort, _ = st.columns([1, 3])
-            sort_by = c_sort.selectbox(f"فرز {ts} (أرشيف) حسب:", ["التاريخ (الأحدث)", "الربح (الأعلى)", "قيمة البيع (الأعلى)"], key=f"sort_cl_{key}")
-            
-            if "الربح" in sort_by: cl = cl.sort_values(by='gain', ascending=False)
-            elif "قيمة البيع" in sort_by: cl = cl.sort_values(by='market_value', ascending=False)
-            else: cl = cl.sort_values(by='exit_date', ascending=False)
-
+            cl = cl.sort_values(by='exit_date', ascending=False)
             render_custom_table(cl, [('company_name', 'الشركة', 'text'), ('symbol', 'الرمز', 'text'), 
                                      ('gain', 'الربح', 'colorful'), ('gain_pct', '%', 'percent'), 
-                                     ('exit_date', 'تاريخ البيع', 'date')])
+                                     ('exit_date', 'تاريخ البيع', 'date')], key=f"{key}_closed")
         else:
             st.info("الأرشيف فارغ")
 
@@ -309,12 +281,7 @@ def view_sukuk_portfolio(fin):
             # اضافة السعر الحالي
             op['current_price'] = op['entry_price'] 
             
-            c_sort, _ = st.columns([1, 3])
-            sort_by = c_sort.selectbox("فرز الصكوك حسب:", ["التاريخ (الأحدث)", "القيمة (الأعلى)", "الاسم"], key="sort_sukuk")
-            
-            if "القيمة" in sort_by: op = op.sort_values(by='total_cost', ascending=False)
-            elif "الاسم" in sort_by: op = op.sort_values(by='company_name')
-            else: op = op.sort_values(by='date', ascending=False)
+            op = op.sort_values(by='date', ascending=False)
 
             cols = [
                 ('company_name', 'اسم الصك', 'text'), 
@@ -324,7 +291,7 @@ def view_sukuk_portfolio(fin):
                 ('total_cost', 'الاجمالي', 'money'),
                 ('months_held', 'المده (شهر)', 'text')
             ]
-            render_custom_table(op, cols)
+            render_custom_table(op, cols, key="sukuk_open")
             
             c_act1, c_act2 = st.columns(2)
             with c_act1:
@@ -343,8 +310,8 @@ def view_sukuk_portfolio(fin):
                                 qty = float(curr_sell['quantity'])
                                 if qty > 0:
                                     unit_exit_price = total_exit_amount / qty
-                                    execute_query("UPDATE Trades SET status='Close', exit_price=%s, exit_date=%s WHERE id=%s", (unit_exit_price, str(exit_date), tid_sell))
-                                    st.success("تم الحفظ"); st.cache_data.clear(); st.rerun()
+                                    execute_query("UPDATE Trades SET status='Close', exit_price=%s, exit_date=%s WHERE id=%s AND owner=%s", (unit_exit_price, str(exit_date), tid_sell, current_user()))
+                                    st.success("تم الحفظ"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
                                 else: st.error("خطأ: الكمية صفر")
 
             with c_act2:
@@ -363,8 +330,8 @@ def view_sukuk_portfolio(fin):
                             n_prc = c_s2.number_input("قيمة الصك", value=float(curr_s['entry_price']))
                             n_date = st.date_input("تاريخ الشراء", pd.to_datetime(curr_s['date']))
                             if st.form_submit_button("حفظ التصحيح"):
-                                execute_query("UPDATE Trades SET symbol=%s, company_name=%s, quantity=%s, entry_price=%s, date=%s WHERE id=%s", (n_name, n_name, n_qty, n_prc, str(n_date), sukuk_id))
-                                st.success("تم التعديل"); st.cache_data.clear(); st.rerun()
+                                execute_query("UPDATE Trades SET symbol=%s, company_name=%s, quantity=%s, entry_price=%s, date=%s WHERE id=%s AND owner=%s", (n_name, n_name, n_qty, n_prc, str(n_date), sukuk_id, current_user()))
+                                st.success("تم التعديل"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
         else:
             st.info("لا توجد صكوك قائمة حالياً")
 
@@ -374,11 +341,7 @@ def view_sukuk_portfolio(fin):
             cl['company_name'] = cl['company_name'].fillna(cl['symbol'])
             cl['realized_return'] = cl['market_value'] - cl['total_cost']
             
-            c_sort, _ = st.columns([1, 3])
-            sort_by_cl = c_sort.selectbox("فرز الأرشيف حسب:", ["تاريخ البيع (الأحدث)", "الربح (الأعلى)"], key="sort_sukuk_cl")
-            
-            if "الربح" in sort_by_cl: cl = cl.sort_values(by='realized_return', ascending=False)
-            else: cl = cl.sort_values(by='exit_date', ascending=False)
+            cl = cl.sort_values(by='exit_date', ascending=False)
 
             cols_cl = [
                 ('company_name', 'اسم الصك', 'text'), 
@@ -387,15 +350,14 @@ def view_sukuk_portfolio(fin):
                 ('realized_return', 'الربح المحقق', 'colorful'),
                 ('exit_date', 'تاريخ البيع', 'date')
             ]
-            render_custom_table(cl, cols_cl)
+            render_custom_table(cl, cols_cl, key="sukuk_closed")
         else:
             st.info("أرشيف الصكوك فارغ")
 
 # --- 5. Cash Log View ---
 # --- 5. Cash Log View (Updated with Edit Feature) ---
-def view_cash_log():
+def view_cash_log(fin):
     st.header("💰 السيولة والسجلات المالية")
-    fin = calculate_portfolio_metrics()
     
     # جلب البيانات
     deposits = fin.get('deposits', pd.DataFrame())
@@ -425,12 +387,12 @@ def view_cash_log():
                 d = st.date_input("التاريخ", date.today())
                 n = st.text_input("ملاحظة")
                 if st.form_submit_button("حفظ"):
-                    execute_query("INSERT INTO Deposits (date, amount, note) VALUES (%s,%s,%s)", (str(d), a, n))
-                    st.success("تم"); st.cache_data.clear(); st.rerun()
+                    execute_query("INSERT INTO Deposits (date, amount, note, owner) VALUES (%s,%s,%s,%s)", (str(d), a, n, current_user()))
+                    st.success("تم"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
         
         # ب: العرض والتعديل
         if not deposits.empty:
-            render_custom_table(deposits.sort_values('date', ascending=False), cols_base)
+            render_custom_table(deposits.sort_values('date', ascending=False), cols_base, key="deposits")
             
             st.markdown("---")
             # ✅ قسم التعديل الجديد للإيداعات
@@ -448,8 +410,8 @@ def view_cash_log():
                         nn = st.text_input("ملاحظة", value=str(curr['note']) if curr['note'] else "")
                         
                         if st.form_submit_button("حفظ التعديلات"):
-                            execute_query("UPDATE Deposits SET amount=%s, date=%s, note=%s WHERE id=%s", (na, str(nd), nn, tid))
-                            st.success("تم التعديل بنجاح"); st.cache_data.clear(); st.rerun()
+                            execute_query("UPDATE Deposits SET amount=%s, date=%s, note=%s WHERE id=%s AND owner=%s", (na, str(nd), nn, tid, current_user()))
+                            st.success("تم التعديل بنجاح"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
 
     # --- 2. تبويب السحوبات ---
     with t2:
@@ -460,12 +422,12 @@ def view_cash_log():
                 d = st.date_input("التاريخ", date.today())
                 n = st.text_input("ملاحظة")
                 if st.form_submit_button("حفظ"):
-                    execute_query("INSERT INTO Withdrawals (date, amount, note) VALUES (%s,%s,%s)", (str(d), a, n))
-                    st.success("تم"); st.cache_data.clear(); st.rerun()
+                    execute_query("INSERT INTO Withdrawals (date, amount, note, owner) VALUES (%s,%s,%s,%s)", (str(d), a, n, current_user()))
+                    st.success("تم"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
         
         # ب: العرض والتعديل
         if not withdrawals.empty:
-            render_custom_table(withdrawals.sort_values('date', ascending=False), cols_base)
+            render_custom_table(withdrawals.sort_values('date', ascending=False), cols_base, key="withdrawals")
             
             st.markdown("---")
             # ✅ قسم التعديل الجديد للسحوبات
@@ -482,8 +444,8 @@ def view_cash_log():
                         nn = st.text_input("ملاحظة", value=str(curr['note']) if curr['note'] else "")
                         
                         if st.form_submit_button("حفظ التعديلات"):
-                            execute_query("UPDATE Withdrawals SET amount=%s, date=%s, note=%s WHERE id=%s", (na, str(nd), nn, tid))
-                            st.success("تم التعديل بنجاح"); st.cache_data.clear(); st.rerun()
+                            execute_query("UPDATE Withdrawals SET amount=%s, date=%s, note=%s WHERE id=%s AND owner=%s", (na, str(nd), nn, tid, current_user()))
+                            st.success("تم التعديل بنجاح"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
 
     # --- 3. تبويب العوائد ---
     with t3:
@@ -494,12 +456,12 @@ def view_cash_log():
                 a = st.number_input("المبلغ", min_value=0.0, step=10.0)
                 d = st.date_input("التاريخ", date.today())
                 if st.form_submit_button("حفظ"):
-                    execute_query("INSERT INTO ReturnsGrants (date, symbol, amount) VALUES (%s,%s,%s)", (str(d), s, a))
-                    st.success("تم"); st.cache_data.clear(); st.rerun()
+                    execute_query("INSERT INTO ReturnsGrants (date, symbol, amount, owner) VALUES (%s,%s,%s,%s)", (str(d), s, a, current_user()))
+                    st.success("تم"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
         
         # ب: العرض والتعديل
         if not returns.empty:
-            render_custom_table(returns.sort_values('date', ascending=False), cols_base)
+            render_custom_table(returns.sort_values('date', ascending=False), cols_base, key="returns")
             
             st.markdown("---")
             # ✅ قسم التعديل الجديد للعوائد
@@ -516,23 +478,27 @@ def view_cash_log():
                         nd = st.date_input("التاريخ الصحيح", pd.to_datetime(curr['date']))
                         
                         if st.form_submit_button("حفظ التعديلات"):
-                            execute_query("UPDATE ReturnsGrants SET symbol=%s, amount=%s, date=%s WHERE id=%s", (ns, na, str(nd), tid))
-                            st.success("تم التعديل بنجاح"); st.cache_data.clear(); st.rerun()
+                            execute_query("UPDATE ReturnsGrants SET symbol=%s, amount=%s, date=%s WHERE id=%s AND owner=%s", (ns, na, str(nd), tid, current_user()))
+                            st.success("تم التعديل بنجاح"); calculate_portfolio_metrics.clear(current_user()); st.rerun()
 
 
 # --- Other Views ---
-def view_analysis(fin):
+ANALYSIS_SECTIONS = {'ai': "🤖 المستشار الذكي", 'financial': "💰 مالي", 'technical': "📈 فني",
+                     'classical': "🏛️ كلاسيكي", 'thesis': "📝 أطروحة"}
+
+def view_analysis(trades):
     st.header("🔬 التحليل الشامل")
-    trades = fin['all_trades']
-    
-    from database import fetch_table
-    wl = fetch_table("Watchlist")
+    wl = fetch_user_table("Watchlist")
     syms = list(set(trades['symbol'].unique().tolist() + wl['symbol'].unique().tolist())) if not trades.empty else []
     
-    c1, c2 = st.columns([1, 2])
-    ns = c1.text_input("بحث")
-    options = [ns] + syms if ns else syms
-    sym = c2.selectbox("اختر", options) if options else None
+    c0, c1, c2 = st.columns([1, 1, 2])
+    sector = c0.selectbox("القطاع", ["الكل"] + SECTORS, key="analysis_sector")
+    sector = None if sector == "الكل" else sector
+    ns = c1.text_input("بحث", placeholder="الرمز أو اسم الشركة")
+    if ns: options = search_symbols(ns, sector) or [ns]
+    elif sector: options = SECTOR_INDEX[sector]
+    else: options = syms
+    sym = c2.selectbox("اختر", options, format_func=lambda x: f"{x} · {get_company_details(x)[0]}") if options else None
     
     if sym:
         n, s = get_company_details(sym)
@@ -542,13 +508,18 @@ def view_analysis(fin):
         try: from ai_engine import generate_ai_report
         except ImportError: generate_ai_report = None
 
-        # التبويبات (المستشار الذكي هو الأول)
-        tabs = st.tabs(["🤖 المستشار الذكي", "💰 مالي", "📈 فني", "🏛️ كلاسيكي", "📝 أطروحة"])
-        
+        # قسم واحد يُحسب في كل مرة (التبويبات تنفذ كلها عند كل تحديث للصفحة)،
+        # ونتائج الأقسام محفوظة في الجلسة لكل سهم فلا يعاد حسابها عند الرجوع إليها
+        section = st.radio("القسم", list(ANALYSIS_SECTIONS), horizontal=True, key="analysis_section",
+                           format_func=ANALYSIS_SECTIONS.get, label_visibility="collapsed")
+
         # 1. المستشار الذكي (AI Report)
-        with tabs[0]:
+        if section == 'ai':
             if generate_ai_report:
-                report = generate_ai_report(sym)
+                refresh = st.button("🔄 إعادة التحليل", key=f"ai_refresh_{sym}")
+                if refresh: invalidate_session_results(sym)
+                report = session_result((sym, 'ai'), lambda: generate_ai_report(sym, refresh=refresh), refresh)
+                if report.get('from_cache'): st.caption(f"⚡ تقرير محفوظ (آخر شمعة: {report.get('last_bar', '-')})")
                 
                 # عنوان التوصية الكبير
                 st.markdown(f"""
@@ -566,21 +537,49 @@ def view_analysis(fin):
                 with c_ai2:
                     st.subheader("النقاط المالية")
                     for r in report['fund_reasons']: st.write(f"• {r}")
+
+                # محتوى الموسّع يُنفَّذ حتى وهو مطوي، لذلك يُحسب عند الطلب فقط
+                if st.toggle("📈 تاريخ النتيجة الفنية", key=f"show_scores_{sym}"):
+                    from tech_scores import tech_score_series
+                    scores = session_result((sym, 'tech_scores'), lambda: tech_score_series(get_chart_history(sym, period='2y')))
+                    if not scores.empty:
+                        scores = scores.assign(**{'متوسط 20': scores['tech_score'].rolling(20).mean()})
+                        st.line_chart(scores[['tech_score', 'متوسط 20']], height=250)
+
+                if st.toggle("🕯️ أدلة النماذج اليابانية", key=f"show_patterns_{sym}"):
+                    from candlestick_patterns import pattern_forward_stats
+                    horizon = st.radio("الأفق (شموع)", [1, 5, 10], index=1, horizontal=True, key=f"pat_h_{sym}")
+                    stats = session_result((sym, 'patterns', horizon),
+                                           lambda: pattern_forward_stats(get_chart_history(sym, period='2y'), horizons=(horizon,)))
+                    stats = stats[stats['count'] > 0].sort_values('t_stat', key=abs, ascending=False)
+                    st.dataframe(stats[['label', 'count', 'mean_return_pct', 'hit_rate_pct', 't_stat']].rename(columns={
+                        'label': 'النموذج', 'count': 'المرات', 'mean_return_pct': 'متوسط العائد %',
+                        'hit_rate_pct': 'نسبة النجاح %', 't_stat': 't'}).round(2), hide_index=True, use_container_width=True)
                     
             else:
                 st.warning("محرك الذكاء الاصطناعي غير متوفر (تأكد من وجود ملف ai_engine.py)")
 
         # 2. المالي
-        with tabs[1]: render_financial_dashboard_ui(sym)
+        elif section == 'financial':
+            from financial_analysis import render_financial_dashboard_ui
+            render_financial_dashboard_ui(sym, _session_artifact(sym, 'fundamentals'))
             
         # 3. الفني
-        with tabs[2]: render_technical_chart(sym)
+        elif section == 'technical':
+            from charts import render_technical_chart, build_technical_view
+            # المفتاح يتضمن آخر شمعة (التاريخ والإغلاق) حتى يُعاد البناء مع كل شمعة جديدة أو تحديث للشمعة الجزئية
+            hist = get_chart_history(sym, '2y')
+            bar = (str(hist.index[-1])[:10], float(hist['Close'].iloc[-1])) if hist is not None and not hist.empty else None
+            render_technical_chart(sym, view=session_result((sym, 'technical', bar), lambda: build_technical_view(sym)))
             
         # 4. الكلاسيكي
-        with tabs[3]: render_classical_analysis(sym)
+        elif section == 'classical':
+            from classical_analysis import render_classical_analysis
+            render_classical_analysis(sym, _session_artifact(sym, 'classical'))
             
         # 5. الأطروحة
-        with tabs[4]:
+        elif section == 'thesis':
+            from financial_analysis import get_thesis, save_thesis
             th = get_thesis(sym)
             curr_text = th['thesis_text'] if th else ""
             with st.form("save_thesis_form"):
@@ -591,22 +590,141 @@ def view_analysis(fin):
 
 
 
-def view_backtester_ui(fin):
+def _session_artifact(sym, kind):
+    """
+    مخرج الجدولة للجلسة: الحديث يُحفظ حتى الإغلاق التالي؛ القديم لا يُحفظ بل يُقرأ
+    من القاعدة في كل عرض حتى يجهز تحديثه في الخلفية
+    """
+    from scheduler import get_artifact, last_session_close
+    key = (sym, kind, last_session_close())
+    cached = st.session_state.get('session_results', {})
+    if key in cached: return cached[key]
+    payload, fresh = get_artifact(sym, kind, with_status=True)
+    return session_result(key, lambda: payload) if fresh else payload
+
+def view_backtester_ui(trades):
+    from backtester import run_backtest
+    from strategies import STRATEGIES
     st.header("🧪 المختبر"); c1,c2,c3 = st.columns(3)
-    sym = c1.selectbox("السهم", ["1120.SR"] + fin['all_trades']['symbol'].unique().tolist())
-    strat = c2.selectbox("خطة", ["Trend Follower", "Sniper"]); cap = c3.number_input("مبلغ", 100000)
+    sym = c1.selectbox("السهم", ["1120.SR"] + (trades['symbol'].unique().tolist() if not trades.empty else []))
+    strat = c2.selectbox("خطة", list(STRATEGIES) or ["Trend Follower", "Sniper"]); cap = c3.number_input("مبلغ", 100000)
+    if strat in STRATEGIES: st.caption(STRATEGIES[strat].description)
     if st.button("بدء"):
-        res = run_backtest(get_chart_history(sym, "2y"), strat, cap)
-        if res: st.metric("العائد", f"{res['return_pct']:.2f}%"); st.line_chart(res['df']['Portfolio_Value']); st.dataframe(res['trades_log'])
+        with span('run_backtest'): st.session_state['bt_result'] = run_backtest(get_chart_history(sym, "2y"), strat, cap)
+        st.session_state['bt_capital'] = cap
+    res = st.session_state.get('bt_result')
+    if res:
+        st.metric("العائد", f"{res['return_pct']:.2f}%"); st.line_chart(res['df']['Portfolio_Value']); st.dataframe(res['trades_log'])
+        render_monte_carlo_panel(res, st.session_state.get('bt_capital', cap))
+
+MC_SEED = 42   # بذرة ثابتة: نفس الإعدادات تعطي نفس النسب المئوية
+
+def render_monte_carlo_panel(res, cap):
+    import plotly.express as px
+    with st.expander("🎲 اختبار المتانة (مونت كارلو)"):
+        from monte_carlo import run_monte_carlo
+        m1, m2, m3 = st.columns(3)
+        method = m1.selectbox("طريقة المعاينة", ["block", "bootstrap"], format_func=lambda x: "كتل متتالية" if x == 'block' else "عشوائي بسيط")
+        source = m2.selectbox("المصدر", ["daily", "trades"], format_func=lambda x: "العوائد اليومية" if x == 'daily' else "سجل الصفقات")
+        n_paths = m3.number_input("عدد المسارات", 1000, 50000, 10000, step=1000)
+        # جسم المُوسِّع يُنفذ حتى وهو مطوي: المحاكاة عند الطلب فقط، ونتيجتها محفوظة لنفس (الاختبار، الإعدادات)
+        run_key = (int(pd.util.hash_pandas_object(res['df']['Portfolio_Value']).sum()), int(n_paths), method, source, cap)
+        if st.button("🎲 تشغيل المحاكاة"):
+            with span('run_monte_carlo'):
+                st.session_state['mc_result'] = (run_key, run_monte_carlo(res, cap, n_paths=int(n_paths), method=method, source=source, seed=MC_SEED))
+        stored = st.session_state.get('mc_result')
+        if not stored or stored[0] != run_key: st.caption("اضغط تشغيل المحاكاة لحساب النتائج بالإعدادات الحالية"); return
+        mc = stored[1]
+        if not mc: st.info("لا توجد عوائد كافية للمحاكاة"); return
+        k1, k2, k3 = st.columns(3)
+        with k1: render_kpi("احتمال الإفلاس (-50%)", f"{mc['prob_ruin']*100:.1f}%", "danger" if mc['prob_ruin'] > 0.05 else "success", "☠️")
+        with k2: render_kpi("احتمال الخسارة", f"{mc['prob_loss']*100:.1f}%", "danger" if mc['prob_loss'] > 0.5 else "neutral", "📉")
+        with k3: render_kpi("القيمة النهائية (الوسيط)", safe_fmt(mc['percentiles'].loc['P50', 'final_value']), "blue", "🎯")
+        st.dataframe(mc['percentiles'], use_container_width=True)
+        fig = px.histogram(x=mc['final_values'], nbins=60, labels={'x': 'القيمة النهائية'})
+        fig.add_vline(x=res['final_value'], line_dash="dash", line_color="red")
+        fig.update_layout(height=300, margin=dict(t=10, b=0, l=0, r=0), yaxis_title="عدد المسارات")
+        st.plotly_chart(fig, use_container_width=True)
+
+def view_screener():
+    st.header("🧭 الماسح الذكي للسوق")
+    from screener import run_market_screener, rank_results, SORT_KEYS, SCREENER_PERIOD
+    c1, c2 = st.columns([1, 3])
+    if c1.button("🚀 تشغيل الماسح على كامل السوق", type="primary"):
+        bar = st.progress(0.0, text="جاري التقييم...")
+        ranking, meta = run_market_screener(progress_cb=lambda d, t: bar.progress(d / t, text=f"تم تقييم {d} من {t}"))
+        bar.empty()
+        st.session_state['screener_result'] = (ranking, meta)
+    if c1.button("🗃️ تحديث لقطات EPS / القيمة الدفترية"):
+        from fundamentals_store import refresh_stale_snapshots
+        from data_source import TADAWUL_DB
+        with st.spinner("جاري تحديث اللقطات المنتهية..."):
+            done, failed = refresh_stale_snapshots(sorted(TADAWUL_DB))
+        c2.caption(f"🗃️ تم تحديث {len(done)} لقطة | تعذر {len(failed)}")
+
+    # اتساع القطاعات من نفس لوحة الأسعار التي يحملها الماسح (طلب تنزيل واحد مخزن)
+    if st.toggle("📊 اتساع السوق حسب القطاع", key="show_breadth"):
+        from market_panel import market_snapshot, sector_breadth
+        with span('sector_breadth'): breadth = sector_breadth(market_snapshot(period=SCREENER_PERIOD))
+        if breadth.empty: st.warning("تعذر تحميل بيانات السوق")
+        else:
+            st.dataframe(breadth, use_container_width=True, column_config={
+                'count': 'عدد الأسهم', 'pct_above_sma50': st.column_config.NumberColumn('% فوق متوسط 50', format="%.0f%%"),
+                'pct_above_sma200': st.column_config.NumberColumn('% فوق متوسط 200', format="%.0f%%"),
+                'median_rsi': st.column_config.NumberColumn('وسيط RSI', format="%.1f"),
+                'median_vol_ratio': st.column_config.NumberColumn('وسيط نسبة الحجم', format="%.2f")})
+
+    if 'screener_result' not in st.session_state:
+        st.info("يقيّم الماسح كل أسهم السوق بمحرك المستشار الذكي (VSA، داو، الشموع، المالية)."); return
+    ranking, meta = st.session_state['screener_result']
+    c2.caption(f"⏱️ {meta['elapsed']:.1f} ثانية | {len(ranking)} سهم | تعذر تقييم {len(meta['failed'])}")
+    if ranking.empty: st.warning("لا توجد نتائج"); return
+
+    f1, f2 = st.columns(2)
+    by = f1.selectbox("الترتيب حسب", list(SORT_KEYS), format_func=SORT_KEYS.get)
+    sectors = f2.multiselect("القطاع", sorted(ranking['sector'].unique()))
+    view = rank_results(ranking, by)
+    if sectors: view = view[view['sector'].isin(sectors)]
+    st.dataframe(view, use_container_width=True, hide_index=True, column_config={
+        'symbol': 'الرمز', 'name': 'الشركة', 'sector': 'القطاع', 'price': st.column_config.NumberColumn('السعر', format="%.2f"),
+        'total_score': 'الكلية', 'tech_score': 'الفنية', 'fund_score': 'المالية', 'recommendation': 'التوصية', 'trend': 'الاتجاه'})
+
+PULSE_PAGE_SIZE = 24
+PULSE_COLUMNS = 4
 
 def render_pulse_dashboard():
-    st.header("💓 نبض السوق"); trades = fetch_table("Trades"); wl = fetch_table("Watchlist")
-    syms = list(set(trades['symbol'].unique().tolist() + wl['symbol'].unique().tolist())) if not trades.empty else []
+    st.header("💓 نبض السوق"); trades = fetch_user_table("Trades"); wl = fetch_user_table("Watchlist")
+    syms = sorted(set(trades['symbol'].unique().tolist() + wl['symbol'].unique().tolist())) if not trades.empty else []
     if not syms: st.info("فارغة"); return
-    data = fetch_batch_data(syms); cols = st.columns(4)
-    for i, (s, info) in enumerate(data.items()):
-        chg = ((info['price']-info['prev_close'])/info['prev_close'])*100 if info['prev_close']>0 else 0
-        with cols[i%4]: render_ticker_card(s, "سهم", info['price'], chg)
+
+    c1, c2, c3 = st.columns([1, 1, 2])
+    live = c1.toggle("🔴 تحديث مباشر", key="pulse_live")
+    every = c2.selectbox("كل (ثانية)", [15, 30, 60], index=1, key="pulse_every", disabled=not live)
+    pages = max(1, -(-len(syms) // PULSE_PAGE_SIZE))
+    page = c3.number_input(f"الصفحة (من {pages})", 1, pages, 1, key="pulse_page") if pages > 1 else 1
+    page_syms = syms[(page - 1) * PULSE_PAGE_SIZE: page * PULSE_PAGE_SIZE]
+
+    # الشبكة وحدها تُعاد كل every ثانية في الوضع المباشر دون إعادة تشغيل الصفحة
+    st.fragment(_render_pulse_grid, run_every=every if live else None)(page_syms)
+
+def _render_pulse_grid(syms):
+    """بطاقات الصفحة الحالية من المخزن المشترك للأسعار؛ لا يُعاد بناء HTML إلا للبطاقات التي تغير سعرها"""
+    data = fetch_batch_data(syms, max_age=15)
+    cards = st.session_state.setdefault('pulse_cards', {})   # الرمز ← (السعر، التغير، الإبراز، HTML)
+    cols = st.columns(PULSE_COLUMNS)
+    for i, s in enumerate(syms):
+        info = data.get(quote_key(s))
+        if not info: continue
+        price = info['price']
+        chg = ((price-info['prev_close'])/info['prev_close'])*100 if info['prev_close']>0 else 0
+        prev = cards.get(s)
+        if prev is None or prev[:2] != (price, chg):
+            moved = 0 if prev is None or price == prev[0] else (1 if price > prev[0] else -1)
+            cards[s] = (price, chg, moved, ticker_card_html(s, get_company_details(s)[0], price, chg, moved))
+        elif prev[2]:   # الإبراز لتحديث واحد فقط
+            cards[s] = (price, chg, 0, ticker_card_html(s, get_company_details(s)[0], price, chg))
+        with cols[i % PULSE_COLUMNS]: st.markdown(cards[s][3], unsafe_allow_html=True)
+    st.caption(f"آخر تحديث: {pd.Timestamp.now():%H:%M:%S}")
 
 def view_add_trade():
     st.header("➕ إضافة صفقة"); 
@@ -616,33 +734,171 @@ def view_add_trade():
         if st.form_submit_button("حفظ"):
             at = "Sukuk" if t=="صكوك" else "Stock"
             nm, sec = get_company_details(s)
-            execute_query("INSERT INTO Trades (symbol, company_name, sector, asset_type, date, quantity, entry_price, strategy, status) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,'Open')", (s,nm,sec,at,str(d),q,p,t))
-            st.success(f"تمت إضافة {nm}"); st.cache_data.clear()
+            execute_query("INSERT INTO Trades (symbol, company_name, sector, asset_type, date, quantity, entry_price, strategy, status, owner) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,'Open',%s)", (s,nm,sec,at,str(d),q,p,t,current_user()))
+            st.success(f"تمت إضافة {nm}"); calculate_portfolio_metrics.clear(current_user())
 
 def view_tools(): st.header("🛠️ أدوات"); st.info("الزكاة")
 
 def view_settings():
     st.header("⚙️ إعدادات")
     st.info("الاستيراد")
+    if is_admin():
+        from database import count_unowned_rows
+        unowned = count_unowned_rows()
+        if unowned:
+            st.warning("صفوف بلا مالك لم تُسند بعد (اضبط LEGACY_OWNER في الأسرار ثم أعد التشغيل): "
+                       + "، ".join(f"{t}: {n}" for t, n in unowned.items()))
     
     # --- كود النسخ الاحتياطي يجب أن يكون هنا (داخل الدالة) ---
     from analytics import create_smart_backup
+    from config import BACKUP_KEEP
 
     st.markdown("---")
     st.subheader("📦 النسخ الاحتياطي")
     
+    fmt = st.radio("الصيغة", ['zip', 'excel'], horizontal=True, key="backup_fmt",
+                   format_func=lambda x: "ZIP (CSV مضغوط + تحقق)" if x == 'zip' else "Excel (للقراءة)")
     if st.button("💾 إنشاء نسخة احتياطية الآن", key="btn_backup"):
         with st.spinner("جاري إنشاء الملف..."):
-            file_data, file_name = create_smart_backup()
+            file_data, file_name = create_smart_backup(fmt)
             
         if file_data:
             st.success("تم إنشاء النسخة بنجاح!")
-            st.download_button(
-                label="📥 اضغط لتحميل الملف",
-                data=file_data,
-                file_name=file_name,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            if fmt == 'zip':
+                st.caption(f"محفوظة على الخادم بعد التحقق من sha256 (يُحتفظ بآخر {BACKUP_KEEP} نسخ): {file_data}")
+                file_data = open(file_data, 'rb')   # مقبض ملف بدل نسخة bytes إضافية في الذاكرة
+            try:
+                st.download_button(
+                    label="📥 اضغط لتحميل الملف",
+                    data=file_data,
+                    file_name=file_name,
+                    mime="application/zip" if fmt == 'zip' else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+            finally:
+                if fmt == 'zip': file_data.close()
+
+    st.markdown("---")
+    st.subheader("🔄 مزامنة القوائم المالية")
+    from bulk_sync import SCOPES, scope_symbols, bulk_sync_financials
+    c1, c2 = st.columns([2, 1])
+    scope = c1.radio("النطاق", list(SCOPES), format_func=SCOPES.get, horizontal=True, key="bulk_sync_scope")
+    rate = c2.number_input("طلب/ثانية", 0.5, 10.0, 2.0, 0.5, key="bulk_sync_rate")
+    if st.button("⚡ بدء المزامنة الجماعية", key="btn_bulk_sync"):
+        symbols = scope_symbols(scope)
+        if not symbols: st.warning("لا توجد رموز في هذا النطاق")
+        else:
+            bar = st.progress(0.0, text="جاري المزامنة...")
+            report = bulk_sync_financials(symbols, rate_per_sec=rate,
+                                          progress_cb=lambda d, t, s: bar.progress(d / t, text=f"{d} من {t} ({s})"))
+            bar.empty()
+            st.session_state['bulk_sync_report'] = report
+    if 'bulk_sync_report' in st.session_state:
+        report = st.session_state['bulk_sync_report']
+        counts = report['status'].value_counts()
+        k1, k2, k3 = st.columns(3)
+        k1.metric("✅ تمت", int(counts.get('synced', 0)))
+        k2.metric("⚪ بلا بيانات", int(counts.get('empty', 0)))
+        k3.metric("❌ فشلت", int(counts.get('error', 0)))
+        st.dataframe(report, hide_index=True, use_container_width=True, column_config={
+            'symbol': 'الرمز', 'name': 'الشركة', 'status': 'الحالة', 'records': 'السجلات',
+            'attempts': 'المحاولات', 'seconds': 'الزمن (ث)', 'error': 'الخطأ'})
+
+    st.markdown("---")
+    st.subheader("📑 استيراد قوائم مالية (PDF / Excel)")
+    st.caption("اسم الملف يبدأ برمز الشركة، مثال: 2222_2024.pdf")
+    from statement_importer import import_statement_files, list_statement_files, resolve_import_dir
+    files = st.file_uploader("الملفات", type=['pdf', 'xlsx', 'xls'], accept_multiple_files=True, key="stmt_files")
+    # القراءة من الخادم للمشرفين فقط، وداخل المجلد المحدد في STATEMENTS_DIR فقط (القوائم جدول مشترك)
+    try: base_dir = st.secrets.get("STATEMENTS_DIR")
+    except Exception: base_dir = None
+    folder = st.text_input(f"أو مجلد فرعي داخل {base_dir} على الخادم", key="stmt_dir") if base_dir and is_admin() else ""
+    min_conf = st.slider("أدنى ثقة للحفظ %", 0, 100, 40, key="stmt_min_conf")
+    if st.button("📥 استيراد", key="btn_stmt_import"):
+        import os, tempfile
+        with tempfile.TemporaryDirectory(prefix="osoul_import_") as tmp:   # الملفات المرفوعة تُحذف بعد التحليل
+            paths = []
+            for f in files or []:
+                path = os.path.join(tmp, os.path.basename(f.name))
+                with open(path, 'wb') as out: out.write(f.getbuffer())
+                paths.append(path)
+            if folder:
+                server_dir = resolve_import_dir(base_dir, folder) if is_admin() else None
+                if server_dir: paths += list_statement_files(server_dir)
+                else: st.error("المجلد غير موجود أو خارج المجلد المسموح")
+            if not paths: st.warning("لا توجد ملفات")
+            else:
+                bar = st.progress(0.0, text="جاري التحليل...")
+                report, saved = import_statement_files(paths, min_confidence=min_conf / 100,
+                                                       progress_cb=lambda d, t, f: bar.progress(d / t, text=f"{d} من {t} ({f})"))
+                bar.empty()
+                st.session_state['stmt_import_report'] = (report, saved)
+    if 'stmt_import_report' in st.session_state:
+        report, saved = st.session_state['stmt_import_report']
+        st.success(f"تم حفظ {saved} سجل من {len(report)} ملف")
+        st.dataframe(report, hide_index=True, use_container_width=True, column_config={
+            'file': 'الملف', 'symbol': 'الرمز', 'period_type': 'الفترة', 'periods': 'التواريخ', 'fields': 'البنود',
+            'confidence': st.column_config.ProgressColumn('الثقة', format="%.0f%%", min_value=0, max_value=100),
+            'seconds': 'الزمن (ث)', 'status': 'الحالة', 'error': 'الخطأ'})
+
+    st.markdown("---")
+    st.subheader("⏱️ الجدولة الخلفية")
+    from scheduler import get_scheduler, enqueue_portfolio
+    sched = get_scheduler()
+    status = sched.status()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("في الانتظار", status['pending'])
+    c2.metric("قيد التنفيذ", len(status['running']))
+    c3.metric("منجزة", status['done'])
+    if status['last_close_run']: st.caption(f"آخر تشغيل بعد الإغلاق: {status['last_close_run']:%Y-%m-%d %H:%M}")
+    if st.button("🔄 تجهيز تحليلات المحفظة الآن", key="btn_sched_run"):
+        st.success(f"أضيفت {enqueue_portfolio(sched)} مهمة للطابور")
+    if status['errors']:
+        with st.expander(f"أخطاء ({len(status['errors'])})"):
+            st.dataframe(pd.DataFrame(status['errors'], columns=['الوقت', 'المهمة', 'الرمز', 'الخطأ']), hide_index=True)
+
+    if is_admin():
+        st.markdown("---")
+        st.subheader("🔬 محلل الأداء")
+        c1, c2 = st.columns(2)
+        # بدون key: قيمة مفتاح الأداة تُحذف من الجلسة في الصفحات التي لا تعرضها
+        st.session_state['profiler_on'] = c1.toggle("تفعيل المحلل (مخطط أسفل كل صفحة)", value=st.session_state.get('profiler_on', False))
+        st.session_state['profiler_jsonl'] = c2.toggle(f"حفظ السجلات في {PROFILE_LOG}", value=st.session_state.get('profiler_jsonl', False))
+
+    st.markdown("---")
+    st.subheader("📊 أداء الصفحات (هذه الجلسة)")
+    stats = st.session_state.get('page_stats', {})
+    if stats:
+        st.dataframe(pd.DataFrame([
+            {'الصفحة': pg, 'مرات العرض': len(v), 'آخر زمن (ث)': round(v[-1][0], 3),
+             'متوسط الزمن (ث)': round(sum(t for t, _ in v) / len(v), 3), 'طلبات القاعدة': v[-1][1]}
+            for pg, v in stats.items()]), hide_index=True, use_container_width=True)
+
+# --- Router ---
+# البيانات التي تحتاجها كل صفحة تُعلن هنا وتُحمّل عند الطلب فقط
+DATA_LOADERS = {
+    'fin': lambda: calculate_portfolio_metrics(current_user()),
+    'trades': lambda: fetch_user_table("Trades"),
+}
+
+PAGES = {
+    'home': (view_dashboard, ['fin']),
+    'spec': (lambda fin: view_portfolio(fin, 'spec'), ['fin']),
+    'invest': (lambda fin: view_portfolio(fin, 'invest'), ['fin']),
+    'sukuk': (view_sukuk_portfolio, ['fin']),
+    'cash': (view_cash_log, ['fin']),
+    'pulse': (render_pulse_dashboard, []),
+    'analysis': (view_analysis, ['trades']),
+    'backtest': (view_backtester_ui, ['trades']),
+    'screener': (view_screener, []),
+    'tools': (view_tools, []),
+    'settings': (view_settings, []),
+    'add': (view_add_trade, []),
+}
+PAGE_STATS_KEEP = 20
+
+def _record_page_stats(pg, seconds, queries):
+    stats = st.session_state.setdefault('page_stats', {})
+    stats[pg] = (stats.get(pg, []) + [(seconds, queries)])[-PAGE_STATS_KEEP:]
 
 def router():
     if 'page' not in st.session_state:
@@ -654,17 +910,13 @@ def router():
     
     render_navbar()
     pg = st.session_state.page
-    fin = calculate_portfolio_metrics()
-    if pg == 'home': view_dashboard(fin)
-    elif pg == 'pulse': render_pulse_dashboard()
-    elif pg in ['spec', 'invest']: view_portfolio(fin, pg)
-    elif pg == 'sukuk': view_sukuk_portfolio(fin)
-    elif pg == 'cash': view_cash_log()
-    elif pg == 'analysis': view_analysis(fin)
-    elif pg == 'backtest': view_backtester_ui(fin)
-    elif pg == 'tools': view_tools()
-    elif pg == 'settings': view_settings()
-    elif pg == 'add': view_add_trade()
-    elif pg == 'update':
+    if pg == 'update':
         with st.spinner("تحديث..."): update_prices()
         st.session_state.page='home'; st.rerun()
+    if pg not in PAGES: pg = 'home'
+
+    view, needs = PAGES[pg]
+    with profiled_run(pg):
+        t0, q0 = time.perf_counter(), query_count()
+        view(*[DATA_LOADERS[n]() for n in needs])
+        _record_page_stats(pg, time.perf_counter() - t0, query_count() - q0)